@@ -230,6 +230,8 @@ def main():
                 'log_dir':   log_dir,
                 'username':  sickbeard.WEB_USERNAME,
                 'password':  sickbeard.WEB_PASSWORD,
+                'thread_pool': sickbeard.WEB_THREAD_POOL,
+                'socket_queue_size': sickbeard.WEB_SOCKET_QUEUE,
         })
     except IOError:
         logger.log(u"Unable to start web server, is something else running on port %d?" % startPort, logger.ERROR)
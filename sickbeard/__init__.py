@@ -25,15 +25,17 @@ import datetime
 import socket
 import os, sys, subprocess, re
 import urllib
+import StringIO
 
-from threading import Lock
+from threading import Lock, Timer
 
 # apparently py2exe won't build these unless they're imported somewhere
 from sickbeard import providers, metadata
 from providers import ezrss, tvtorrents, nzbs_org, nzbmatrix, tvbinz, nzbsrus, newznab, womble, newzbin
 
-from sickbeard import searchCurrent, searchBacklog, showUpdater, versionChecker, properFinder, autoPostProcesser
-from sickbeard import helpers, db, exceptions, show_queue, search_queue, scheduler
+from sickbeard import searchCurrent, searchBacklog, showUpdater, versionChecker, properFinder, autoPostProcesser, dirWatcher
+from sickbeard import helpers, db, exceptions, show_queue, search_queue, notify_queue, image_cache_updater, scheduler
+from sickbeard import search_limits
 from sickbeard import logger
 
 from sickbeard.common import *
@@ -51,6 +53,13 @@ PID = None
 CFG = None
 CONFIG_FILE = None
 
+# save_config_later waits this many seconds so a burst of changes is written out once
+CONFIG_SAVE_DELAY = 5
+
+CONFIG_LOCK = Lock()
+_configSaveTimer = None
+_savedConfig = None
+
 PROG_DIR = '.'
 MY_FULLNAME = None
 MY_NAME = None
@@ -67,6 +76,9 @@ showQueueScheduler = None
 searchQueueScheduler = None
 properFinderScheduler = None
 autoPostProcesserScheduler = None
+dirWatcherScheduler = None
+notifyQueueScheduler = None
+imageCacheScheduler = None
 
 showList = None
 loadingShowList = None
@@ -83,6 +95,7 @@ INIT_LOCK = Lock()
 __INITIALIZED__ = False
 
 LOG_DIR = None
+DEBUG_LOGGING = None
 
 WEB_PORT = None
 WEB_LOG = None
@@ -91,6 +104,8 @@ WEB_USERNAME = None
 WEB_PASSWORD = None
 WEB_HOST = None
 WEB_IPV6 = None
+WEB_THREAD_POOL = None
+WEB_SOCKET_QUEUE = None
 
 LAUNCH_BROWSER = None
 CACHE_DIR = None
@@ -132,6 +147,11 @@ DOWNLOAD_PROPERS = None
 
 SEARCH_FREQUENCY = None
 BACKLOG_SEARCH_FREQUENCY = 21
+BACKLOG_MODE = None
+
+PROVIDER_REQUESTS_PER_MINUTE = None
+PROVIDER_DAILY_BUDGET = None
+SEARCH_CACHE_TTL = None
 
 MIN_SEARCH_FREQUENCY = 10
 
@@ -148,8 +168,10 @@ TORRENT_DIR = None
 RENAME_EPISODES = False
 PROCESS_AUTOMATICALLY = False
 KEEP_PROCESSED_DIR = False
+USE_HARDLINKS = False
 MOVE_ASSOCIATED_FILES = False
 TV_DOWNLOAD_DIR = None
+USE_DIR_WATCHER = False
 
 SHOW_TVBINZ = False
 TVBINZ = False
@@ -175,6 +197,8 @@ NEWZBIN = False
 NEWZBIN_USERNAME = None
 NEWZBIN_PASSWORD = None
 
+NEWZNAB_BATCH_SEARCH = True
+
 SAB_USERNAME = None
 SAB_PASSWORD = None
 SAB_APIKEY = None
@@ -336,7 +360,8 @@ def initialize(consoleLogging=True):
 
     with INIT_LOCK:
 
-        global LOG_DIR, WEB_PORT, WEB_LOG, WEB_ROOT, WEB_USERNAME, WEB_PASSWORD, WEB_HOST, WEB_IPV6, \
+        global LOG_DIR, DEBUG_LOGGING, WEB_PORT, WEB_LOG, WEB_ROOT, WEB_USERNAME, WEB_PASSWORD, WEB_HOST, WEB_IPV6, \
+                WEB_THREAD_POOL, WEB_SOCKET_QUEUE, \
                 USE_NZBS, USE_TORRENTS, NZB_METHOD, NZB_DIR, TVBINZ, TVBINZ_UID, TVBINZ_HASH, DOWNLOAD_PROPERS, \
                 SAB_USERNAME, SAB_PASSWORD, SAB_APIKEY, SAB_CATEGORY, SAB_HOST, \
                 NZBGET_PASSWORD, NZBGET_CATEGORY, NZBGET_HOST, currentSearchScheduler, backlogSearchScheduler, \
@@ -347,6 +372,7 @@ def initialize(consoleLogging=True):
                 showUpdateScheduler, __INITIALIZED__, LAUNCH_BROWSER, showList, loadingShowList, \
                 NZBS, NZBS_UID, NZBS_HASH, EZRSS, TVTORRENTS, TVTORRENTS_DIGEST, TVTORRENTS_HASH, TORRENT_DIR, USENET_RETENTION, SOCKET_TIMEOUT, \
                 SEARCH_FREQUENCY, DEFAULT_SEARCH_FREQUENCY, BACKLOG_SEARCH_FREQUENCY, \
+                BACKLOG_MODE, PROVIDER_REQUESTS_PER_MINUTE, PROVIDER_DAILY_BUDGET, SEARCH_CACHE_TTL, NEWZNAB_BATCH_SEARCH, \
                 QUALITY_DEFAULT, SEASON_FOLDERS_FORMAT, SEASON_FOLDERS_DEFAULT, STATUS_DEFAULT, \
                 GROWL_NOTIFY_ONSNATCH, GROWL_NOTIFY_ONDOWNLOAD, TWITTER_NOTIFY_ONSNATCH, TWITTER_NOTIFY_ONDOWNLOAD, \
                 USE_GROWL, GROWL_HOST, GROWL_PASSWORD, USE_PROWL, PROWL_NOTIFY_ONSNATCH, PROWL_NOTIFY_ONDOWNLOAD, PROWL_API, PROWL_PRIORITY, PROG_DIR, NZBMATRIX, NZBMATRIX_USERNAME, \
@@ -362,7 +388,9 @@ def initialize(consoleLogging=True):
                 USE_LIBNOTIFY, LIBNOTIFY_NOTIFY_ONSNATCH, LIBNOTIFY_NOTIFY_ONDOWNLOAD, USE_NMJ, NMJ_HOST, NMJ_DATABASE, NMJ_MOUNT, \
                 USE_BANNER, USE_LISTVIEW, METADATA_XBMC, METADATA_MEDIABROWSER, METADATA_PS3, metadata_provider_dict, \
                 NEWZBIN, NEWZBIN_USERNAME, NEWZBIN_PASSWORD, GIT_PATH, MOVE_ASSOCIATED_FILES, \
-                COMING_EPS_LAYOUT, COMING_EPS_SORT, COMING_EPS_DISPLAY_PAUSED, METADATA_WDTV
+                COMING_EPS_LAYOUT, COMING_EPS_SORT, COMING_EPS_DISPLAY_PAUSED, METADATA_WDTV, \
+                USE_DIR_WATCHER, dirWatcherScheduler, USE_HARDLINKS, notifyQueueScheduler, \
+                imageCacheScheduler
 
         if __INITIALIZED__:
             return False
@@ -383,6 +411,8 @@ def initialize(consoleLogging=True):
         CheckSection('NMJ')
 
         LOG_DIR = check_setting_str(CFG, 'General', 'log_dir', 'Logs')
+        DEBUG_LOGGING = bool(check_setting_int(CFG, 'General', 'debug_logging', 1))
+        logger.setDebugLogging(DEBUG_LOGGING)
         if not helpers.makeDir(LOG_DIR):
             logger.log(u"!!! No log folder, logging to screen only!", logger.ERROR)
 
@@ -400,6 +430,11 @@ def initialize(consoleLogging=True):
         WEB_LOG = bool(check_setting_int(CFG, 'General', 'web_log', 0))
         WEB_USERNAME = check_setting_str(CFG, 'General', 'web_username', '')
         WEB_PASSWORD = check_setting_str(CFG, 'General', 'web_password', '')
+
+        # a page full of show images asks for a lot of them at once so use more than cherrypy's 10 threads and 5 queued connections
+        WEB_THREAD_POOL = max(check_setting_int(CFG, 'General', 'web_thread_pool', 20), 1)
+        WEB_SOCKET_QUEUE = max(check_setting_int(CFG, 'General', 'web_socket_queue', 30), 1)
+
         LAUNCH_BROWSER = bool(check_setting_int(CFG, 'General', 'launch_browser', 1))
 
         CACHE_DIR = check_setting_str(CFG, 'General', 'cache_dir', 'cache')
@@ -465,6 +500,15 @@ def initialize(consoleLogging=True):
         if SEARCH_FREQUENCY < MIN_SEARCH_FREQUENCY:
             SEARCH_FREQUENCY = MIN_SEARCH_FREQUENCY
 
+        BACKLOG_MODE = check_setting_str(CFG, 'General', 'backlog_mode', search_limits.BACKLOG_BURST)
+        if BACKLOG_MODE not in (search_limits.BACKLOG_BURST, search_limits.BACKLOG_SPREAD):
+            BACKLOG_MODE = search_limits.BACKLOG_BURST
+
+        PROVIDER_REQUESTS_PER_MINUTE = max(check_setting_int(CFG, 'General', 'provider_requests_per_minute', 0), 0)
+        PROVIDER_DAILY_BUDGET = max(check_setting_int(CFG, 'General', 'provider_daily_budget', 0), 0)
+
+        SEARCH_CACHE_TTL = max(check_setting_int(CFG, 'General', 'search_cache_ttl', 60), 0)
+
         NZB_DIR = check_setting_str(CFG, 'Blackhole', 'nzb_dir', '')
         TORRENT_DIR = check_setting_str(CFG, 'Blackhole', 'torrent_dir', '')
 
@@ -472,7 +516,9 @@ def initialize(consoleLogging=True):
         PROCESS_AUTOMATICALLY = check_setting_int(CFG, 'General', 'process_automatically', 0)
         RENAME_EPISODES = check_setting_int(CFG, 'General', 'rename_episodes', 1)
         KEEP_PROCESSED_DIR = check_setting_int(CFG, 'General', 'keep_processed_dir', 1)
+        USE_HARDLINKS = bool(check_setting_int(CFG, 'General', 'use_hardlinks', 0))
         MOVE_ASSOCIATED_FILES = check_setting_int(CFG, 'General', 'move_associated_files', 0)
+        USE_DIR_WATCHER = bool(check_setting_int(CFG, 'General', 'use_dir_watcher', 0))
 
         EZRSS = bool(check_setting_int(CFG, 'General', 'use_torrent', 0))
         if not EZRSS:
@@ -632,6 +678,7 @@ def initialize(consoleLogging=True):
         COMING_EPS_SORT = check_setting_str(CFG, 'GUI', 'coming_eps_sort', 'date')
 
         newznabData = check_setting_str(CFG, 'Newznab', 'newznab_data', '')
+        NEWZNAB_BATCH_SEARCH = bool(check_setting_int(CFG, 'Newznab', 'newznab_batch_search', 1))
         newznabProviderList = providers.getNewznabProviderList(newznabData)
 
         providerList = providers.makeProviderList()
@@ -680,6 +727,17 @@ def initialize(consoleLogging=True):
                                                threadName="SEARCHQUEUE",
                                                silent=True)
 
+        notifyQueueScheduler = scheduler.Scheduler(notify_queue.NotifyQueue(),
+                                               cycleTime=datetime.timedelta(seconds=1),
+                                               threadName="NOTIFYQUEUE",
+                                               silent=True)
+
+        imageCacheScheduler = scheduler.Scheduler(image_cache_updater.ImageCacheUpdater(),
+                                               cycleTime=datetime.timedelta(hours=1),
+                                               threadName="IMAGECACHE",
+                                               runImmediately=True,
+                                               silent=True)
+
         properFinderInstance = properFinder.ProperFinder()
         properFinderScheduler = scheduler.Scheduler(properFinderInstance,
                                                      cycleTime=properFinderInstance.updateInterval,
@@ -691,6 +749,12 @@ def initialize(consoleLogging=True):
                                                      threadName="POSTPROCESSER",
                                                      runImmediately=True)
 
+        dirWatcherScheduler = scheduler.Scheduler(dirWatcher.DirWatcher(),
+                                                     cycleTime=datetime.timedelta(seconds=3),
+                                                     threadName="DIRWATCHER",
+                                                     runImmediately=True,
+                                                     silent=True)
+
 
         showList = []
         loadingShowList = {}
@@ -702,7 +766,8 @@ def start():
 
     global __INITIALIZED__, currentSearchScheduler, backlogSearchScheduler, \
             showUpdateScheduler, versionCheckScheduler, showQueueScheduler, \
-            properFinderScheduler, autoPostProcesserScheduler, searchQueueScheduler
+            properFinderScheduler, autoPostProcesserScheduler, searchQueueScheduler, \
+            dirWatcherScheduler, notifyQueueScheduler, imageCacheScheduler
 
     with INIT_LOCK:
 
@@ -726,16 +791,26 @@ def start():
             # start the search queue checker
             searchQueueScheduler.thread.start()
 
+            # start the notification queue
+            notifyQueueScheduler.thread.start()
+
+            # start the image cache filler
+            imageCacheScheduler.thread.start()
+
             # start the queue checker
             properFinderScheduler.thread.start()
 
             # start the proper finder
             autoPostProcesserScheduler.thread.start()
 
+            # start the folder watcher
+            dirWatcherScheduler.thread.start()
+
 def halt ():
 
     global __INITIALIZED__, currentSearchScheduler, backlogSearchScheduler, showUpdateScheduler, \
-            showQueueScheduler, properFinderScheduler, autoPostProcesserScheduler, searchQueueScheduler
+            showQueueScheduler, properFinderScheduler, autoPostProcesserScheduler, searchQueueScheduler, \
+            dirWatcherScheduler, notifyQueueScheduler, imageCacheScheduler
 
     with INIT_LOCK:
 
@@ -787,6 +862,20 @@ def halt ():
             except:
                 pass
 
+            notifyQueueScheduler.abort = True
+            logger.log(u"Waiting for the NOTIFYQUEUE thread to exit")
+            try:
+                notifyQueueScheduler.thread.join(10)
+            except:
+                pass
+
+            imageCacheScheduler.abort = True
+            logger.log(u"Waiting for the IMAGECACHE thread to exit")
+            try:
+                imageCacheScheduler.thread.join(10)
+            except:
+                pass
+
             autoPostProcesserScheduler.abort = True
             logger.log(u"Waiting for the POSTPROCESSER thread to exit")
             try:
@@ -794,6 +883,13 @@ def halt ():
             except:
                 pass
 
+            dirWatcherScheduler.abort = True
+            logger.log(u"Waiting for the DIRWATCHER thread to exit")
+            try:
+                dirWatcherScheduler.thread.join(10)
+            except:
+                pass
+
             properFinderScheduler.abort = True
             logger.log(u"Waiting for the PROPERFINDER thread to exit")
             try:
@@ -820,6 +916,9 @@ def saveAll():
     for show in showList:
         show.saveToDB()
 
+    # save the provider usage counts that haven't been written yet
+    search_limits.flushUsage()
+
     # save config
     logger.log(u"Saving config file to disk")
     save_config()
@@ -865,7 +964,7 @@ def invoke_command(to_call, *args, **kwargs):
     def delegate():
         to_call(*args, **kwargs)
     sickbeard.invoked_command = delegate
-    logger.log(u"Placed invoked command: "+repr(sickbeard.invoked_command)+" for "+repr(to_call)+" with "+repr(args)+" and "+repr(kwargs), logger.DEBUG)
+    logger.log(u"Placed invoked command: %r for %r with %r and %r", logger.DEBUG, sickbeard.invoked_command, to_call, args, kwargs)
 
 def invoke_restart(soft=True):
     invoke_command(sickbeard.restart, soft=soft)
@@ -889,13 +988,86 @@ def restart(soft=True):
 
 
 
+def save_config_later():
+    """
+    Saves the config in CONFIG_SAVE_DELAY seconds along with anything else changed before then. For
+    settings that get flipped from the UI all the time.
+    """
+
+    global _configSaveTimer
+
+    with CONFIG_LOCK:
+        if _configSaveTimer:
+            return
+
+        _configSaveTimer = Timer(CONFIG_SAVE_DELAY, save_config)
+        _configSaveTimer.setDaemon(True)
+        _configSaveTimer.start()
+
 def save_config():
+    """
+    Writes the config file if anything in it has changed. It's written to a temp file which is then
+    renamed over the old one so it can never be left half written.
+    """
+
+    global _configSaveTimer, _savedConfig
+
+    with CONFIG_LOCK:
+
+        # whatever was waiting to be saved is going out now
+        if _configSaveTimer:
+            _configSaveTimer.cancel()
+            _configSaveTimer = None
+
+        new_config = _build_config()
+
+        new_data = StringIO.StringIO()
+        new_config.write(new_data)
+        new_data = new_data.getvalue()
+
+        try:
+            config_file = open(CONFIG_FILE, 'rb')
+            old_data = config_file.read()
+            config_file.close()
+        except IOError:
+            old_data = None
+
+        if new_data == old_data:
+            logger.log(u"Config file hasn't changed, not saving it", logger.DEBUG)
+            _savedConfig = new_config.dict()
+            return
+
+        if _savedConfig:
+            changed = []
+            for cur_section in new_config:
+                for cur_key in new_config[cur_section]:
+                    if _savedConfig.get(cur_section, {}).get(cur_key) != new_config[cur_section][cur_key]:
+                        changed.append(cur_section+'/'+cur_key)
+            logger.log(u"Saving config file, changed settings: "+', '.join(changed), logger.DEBUG)
+
+        temp_file = CONFIG_FILE + '.tmp'
+
+        config_file = open(temp_file, 'wb')
+        config_file.write(new_data)
+        config_file.flush()
+        os.fsync(config_file.fileno())
+        config_file.close()
+
+        # windows won't rename over an existing file
+        if os.name == 'nt' and os.path.isfile(CONFIG_FILE):
+            os.remove(CONFIG_FILE)
+
+        os.rename(temp_file, CONFIG_FILE)
+
+        _savedConfig = new_config.dict()
+
+def _build_config():
 
     new_config = ConfigObj()
-    new_config.filename = sickbeard.CONFIG_FILE
 
     new_config['General'] = {}
     new_config['General']['log_dir'] = LOG_DIR
+    new_config['General']['debug_logging'] = int(DEBUG_LOGGING)
     new_config['General']['web_port'] = WEB_PORT
     new_config['General']['web_host'] = WEB_HOST
     new_config['General']['web_ipv6'] = WEB_IPV6
@@ -903,11 +1075,17 @@ def save_config():
     new_config['General']['web_root'] = WEB_ROOT
     new_config['General']['web_username'] = WEB_USERNAME
     new_config['General']['web_password'] = WEB_PASSWORD
+    new_config['General']['web_thread_pool'] = int(WEB_THREAD_POOL)
+    new_config['General']['web_socket_queue'] = int(WEB_SOCKET_QUEUE)
     new_config['General']['use_nzbs'] = int(USE_NZBS)
     new_config['General']['use_torrents'] = int(USE_TORRENTS)
     new_config['General']['nzb_method'] = NZB_METHOD
     new_config['General']['usenet_retention'] = int(USENET_RETENTION)
     new_config['General']['search_frequency'] = int(SEARCH_FREQUENCY)
+    new_config['General']['backlog_mode'] = BACKLOG_MODE
+    new_config['General']['provider_requests_per_minute'] = int(PROVIDER_REQUESTS_PER_MINUTE)
+    new_config['General']['provider_daily_budget'] = int(PROVIDER_DAILY_BUDGET)
+    new_config['General']['search_cache_ttl'] = int(SEARCH_CACHE_TTL)
     new_config['General']['download_propers'] = int(DOWNLOAD_PROPERS)
     new_config['General']['quality_default'] = int(QUALITY_DEFAULT)
     new_config['General']['status_default'] = int(STATUS_DEFAULT)
@@ -936,8 +1114,10 @@ def save_config():
     new_config['General']['root_dirs'] = ROOT_DIRS if ROOT_DIRS else ''
     new_config['General']['tv_download_dir'] = TV_DOWNLOAD_DIR
     new_config['General']['keep_processed_dir'] = int(KEEP_PROCESSED_DIR)
+    new_config['General']['use_hardlinks'] = int(USE_HARDLINKS)
     new_config['General']['move_associated_files'] = int(MOVE_ASSOCIATED_FILES)
     new_config['General']['process_automatically'] = int(PROCESS_AUTOMATICALLY)
+    new_config['General']['use_dir_watcher'] = int(USE_DIR_WATCHER)
     new_config['General']['rename_episodes'] = int(RENAME_EPISODES)
     
     new_config['General']['extra_scripts'] = '|'.join(EXTRA_SCRIPTS)
@@ -1058,13 +1238,14 @@ def save_config():
 
     new_config['Newznab'] = {}
     new_config['Newznab']['newznab_data'] = '!!!'.join([x.configStr() for x in newznabProviderList])
+    new_config['Newznab']['newznab_batch_search'] = int(NEWZNAB_BATCH_SEARCH)
 
     new_config['GUI'] = {}
     new_config['GUI']['coming_eps_layout'] = COMING_EPS_LAYOUT
     new_config['GUI']['coming_eps_display_paused'] = int(COMING_EPS_DISPLAY_PAUSED)
     new_config['GUI']['coming_eps_sort'] = COMING_EPS_SORT
 
-    new_config.write()
+    return new_config
 
 
 def launchBrowser(startPort=None):
@@ -16,6 +16,8 @@
 # You should have received a copy of the GNU General Public License
 # along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
 
+from __future__ import with_statement
+
 import sickbeard
 from sickbeard import helpers
 from sickbeard import logger
@@ -46,4 +48,5 @@ class PostProcesser():
                                  [os.path.abspath(sickbeard.TV_DOWNLOAD_DIR),
                                   ek.ek(os.path.join, os.path.abspath(sickbeard.TV_DOWNLOAD_DIR), '%')])
 
-        processTV.processDir(sickbeard.TV_DOWNLOAD_DIR)
+        with processTV.processLock:
+            processTV.processDir(sickbeard.TV_DOWNLOAD_DIR)
@@ -88,6 +88,9 @@ class SearchResult:
         # quality of the release
         self.quality = -1
 
+        # size of the release in bytes, -1 if we don't know it
+        self.size = -1
+
         # release name
         self.name = ""
 
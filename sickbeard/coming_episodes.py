@@ -0,0 +1,105 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+
+from sickbeard import db
+from sickbeard.common import Quality, UNKNOWN, UNAIRED, WANTED, SKIPPED
+
+# statuses of the episodes shown for the coming week, ie. everything we don't already have or don't care about
+COMING_STATUSES = [UNKNOWN, UNAIRED, WANTED, SKIPPED] + Quality.SNATCHED_PROPER
+
+# wanted episodes which aired this many days ago are still shown
+RECENT_DAYS = 3
+
+_columns = "tv_episodes.*, tv_shows.*, tv_shows.status AS show_status"
+
+_sorts = {'date': "airdate, show_name, season, episode",
+          'show': "show_name, airdate, season, episode",
+          'network': "network, airdate, show_name, season, episode",
+          }
+
+def _nextWeek():
+    return (datetime.date.today() + datetime.timedelta(days=7)).toordinal()
+
+def refreshShow(showid):
+    """
+    Looks up the first airdate on or after next week for a show again. Must be called whenever an
+    episode of the show is added or removed or has its airdate or status changed.
+    """
+
+    myDB = db.DBConnection()
+    myDB.action("DELETE FROM next_airings WHERE showid = ?", [showid])
+    myDB.action("INSERT INTO next_airings (showid, airdate) "
+                "SELECT tvdb_id, (SELECT MIN(airdate) FROM tv_episodes WHERE showid = tvdb_id AND airdate >= ?) FROM tv_shows "
+                "WHERE tvdb_id = ?", [_nextWeek(), showid])
+
+def updateNextAirings():
+    """
+    Fills in the first airdate on or after next week for any show that doesn't have one yet or
+    whose stored one has been passed. Each one is a single lookup on the (showid, airdate) index.
+    This runs with the regular search rather than when the page is shown, so viewing the page
+    never writes to the DB.
+    """
+
+    next_week = _nextWeek()
+
+    myDB = db.DBConnection()
+    myDB.action("DELETE FROM next_airings WHERE airdate < ?", [next_week])
+
+    myDB.action("INSERT INTO next_airings (showid, airdate) "
+                "SELECT tvdb_id, (SELECT MIN(airdate) FROM tv_episodes WHERE showid = tvdb_id AND airdate >= ?) FROM tv_shows "
+                "WHERE tvdb_id NOT IN (SELECT showid FROM next_airings)", [next_week])
+
+def getComingEpisodes(sort='date'):
+    """
+    Returns the episodes for the coming episodes page, sorted by 'date', 'show' or 'network':
+
+    - episodes airing in the next week that we don't have yet
+    - for shows with nothing in the next week, the episodes on the next day they air after that
+    - wanted episodes which aired in the last few days
+    """
+
+    today = datetime.date.today().toordinal()
+    next_week = _nextWeek()
+    recently = (datetime.date.today() - datetime.timedelta(days=RECENT_DAYS)).toordinal()
+
+    myDB = db.DBConnection()
+
+    comingList = ",".join(["?"] * len(COMING_STATUSES))
+    haveList = ",".join(["?"] * len(Quality.DOWNLOADED + Quality.SNATCHED))
+
+    sql = "SELECT "+_columns+" FROM tv_episodes, tv_shows " \
+          "WHERE tv_shows.tvdb_id = tv_episodes.showid AND tv_episodes.status IN ("+comingList+") AND airdate >= ? AND airdate < ? AND season != 0 " \
+          "UNION ALL " \
+          "SELECT "+_columns+" FROM next_airings, tv_episodes, tv_shows " \
+          "WHERE tv_episodes.showid = next_airings.showid AND tv_episodes.airdate = next_airings.airdate AND tv_shows.tvdb_id = next_airings.showid " \
+          "AND next_airings.airdate >= ? " \
+          "AND season != 0 AND tv_episodes.status NOT IN ("+haveList+") " \
+          "AND NOT EXISTS (SELECT 1 FROM tv_episodes week_eps WHERE week_eps.showid = next_airings.showid AND week_eps.airdate >= ? AND week_eps.airdate < ? " \
+          "AND week_eps.season != 0 AND week_eps.status IN ("+comingList+")) " \
+          "UNION ALL " \
+          "SELECT "+_columns+" FROM tv_episodes, tv_shows " \
+          "WHERE tv_shows.tvdb_id = tv_episodes.showid AND tv_episodes.status = ? AND airdate >= ? AND airdate < ? AND season != 0 " \
+          "ORDER BY "+_sorts.get(sort, _sorts['date'])
+
+    args = COMING_STATUSES + [today, next_week] + \
+           [next_week] + Quality.DOWNLOADED + Quality.SNATCHED + [today, next_week] + COMING_STATUSES + \
+           [WANTED, recently, today]
+
+    return myDB.select(sql, args)
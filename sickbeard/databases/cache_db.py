@@ -42,3 +42,55 @@ class AddSceneExceptions(InitialSchema):
 
     def execute(self):
         self.connection.action("CREATE TABLE scene_exceptions (exception_id INTEGER PRIMARY KEY, tvdb_id INTEGER KEY, show_name TEXT)")
+
+class AddSceneExceptionSearchNames(AddSceneExceptions):
+    def test(self):
+        return self.hasColumn("scene_exceptions", "search_name")
+
+    def execute(self):
+        from sickbeard import sceneHelpers
+
+        self.addColumn("scene_exceptions", "search_name", "TEXT", "")
+
+        for cur_exception in self.connection.select("SELECT exception_id, show_name FROM scene_exceptions"):
+            self.connection.action("UPDATE scene_exceptions SET search_name = ? WHERE exception_id = ?", [sceneHelpers.exception_search_name(cur_exception["show_name"]), cur_exception["exception_id"]])
+
+        self.connection.action("CREATE INDEX idx_scene_exceptions_search_name ON scene_exceptions (search_name)")
+
+class AddProviderUsage(AddSceneExceptionSearchNames):
+    def test(self):
+        return self.hasTable("provider_usage")
+
+    def execute(self):
+        self.connection.action("CREATE TABLE provider_usage (provider TEXT, day NUMERIC, requests NUMERIC, throttled NUMERIC, skipped NUMERIC, wait_time NUMERIC, PRIMARY KEY (provider, day))")
+
+class AddSearchCache(AddProviderUsage):
+    def test(self):
+        return self.hasTable("search_cache")
+
+    def execute(self):
+        self.connection.action("CREATE TABLE search_cache (provider TEXT, params TEXT, time NUMERIC, items TEXT, PRIMARY KEY (provider, params))")
+        self.addColumn("provider_usage", "cache_hits")
+        self.addColumn("provider_usage", "cache_misses")
+
+class AddPropers(AddSearchCache):
+    def test(self):
+        return self.hasTable("propers")
+
+    def execute(self):
+        self.connection.action("CREATE TABLE propers (provider TEXT, name TEXT, url TEXT, tvdbid NUMERIC, season NUMERIC, episodes TEXT, quality NUMERIC, time NUMERIC, PRIMARY KEY (provider, name))")
+        self.connection.action("CREATE INDEX idx_propers_time ON propers (time)")
+
+class AddTVRageCache(AddPropers):
+    def test(self):
+        return self.hasTable("tvrage_cache")
+
+    def execute(self):
+        self.connection.action("CREATE TABLE tvrage_cache (tvdb_id INTEGER PRIMARY KEY, tvr_id NUMERIC, tvr_name TEXT, last_attempt NUMERIC, failures NUMERIC)")
+
+class AddImageMisses(AddTVRageCache):
+    def test(self):
+        return self.hasTable("image_misses")
+
+    def execute(self):
+        self.connection.action("CREATE TABLE image_misses (tvdb_id INTEGER, img_type NUMERIC, last_attempt NUMERIC, failures NUMERIC, PRIMARY KEY (tvdb_id, img_type))")
@@ -384,3 +384,37 @@ class SetNzbTorrentSettings(PopulateRootDirs):
         sickbeard.save_config()
         
         self.incDBVersion()
+
+class AddHistoryIndexes(SetNzbTorrentSettings):
+
+    def test(self):
+        return self.checkDBVersion() >= 9
+
+    def execute(self):
+
+        from sickbeard import history
+
+        self.addColumn("history", "resource_key", "TEXT", "")
+
+        for cur_item in self.connection.select("SELECT rowid, resource FROM history"):
+            self.connection.action("UPDATE history SET resource_key = ? WHERE rowid = ?", [history.resourceKey(cur_item["resource"]), cur_item["rowid"]])
+
+        self.connection.action("CREATE INDEX idx_history_date ON history (date)")
+        self.connection.action("CREATE INDEX idx_history_episode ON history (showid, season, episode)")
+        self.connection.action("CREATE INDEX idx_history_resource_key ON history (resource_key)")
+
+        self.incDBVersion()
+
+class AddComingEpisodesIndexes(AddHistoryIndexes):
+
+    def test(self):
+        return self.checkDBVersion() >= 10
+
+    def execute(self):
+
+        self.connection.action("CREATE INDEX idx_tv_episodes_status_airdate ON tv_episodes (status, airdate)")
+
+        # the first airdate after the coming week for each show, kept up to date by coming_episodes
+        self.connection.action("CREATE TABLE next_airings (showid INTEGER PRIMARY KEY, airdate NUMERIC)")
+
+        self.incDBVersion()
@@ -51,10 +51,10 @@ class DBConnection:
 			while attempt < 5:
 				try:
 					if args == None:
-						logger.log(self.dbFileName+": "+query, logger.DEBUG)
+						logger.log("%s: %s", logger.DEBUG, self.dbFileName, query)
 						sqlResult = self.connection.execute(query)
 					else:
-						logger.log(self.dbFileName+": "+query+" with args "+str(args), logger.DEBUG)
+						logger.log("%s: %s with args %s", logger.DEBUG, self.dbFileName, query, args)
 						sqlResult = self.connection.execute(query, args)
 					self.connection.commit()
 					# get out of the connection attempt loop since we were successful
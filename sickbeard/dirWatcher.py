@@ -0,0 +1,552 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import with_statement
+
+import os
+import os.path
+import time
+import errno
+import select
+import struct
+import threading
+
+import sickbeard
+
+from sickbeard import logger, exceptions, processTV
+from sickbeard import encodingKludge as ek
+
+# inotify is only available on linux, everywhere else we poll
+try:
+    import ctypes
+    import ctypes.util
+    _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    _libc.inotify_init
+    _libc.inotify_add_watch
+    _libc.inotify_rm_watch
+except (ImportError, OSError, AttributeError):
+    _libc = None
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | \
+             IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+# how long a download has to sit unchanged before we touch it
+SETTLE_TIME = 10
+
+# when polling, how often to stat the show dirs (the download dir is checked every run)
+SHOW_POLL_INTERVAL = 60
+
+DOWNLOAD = 'download'
+SHOW = 'show'
+
+# show dir -> [number of post-processing jobs writing to it, time the last one finished]
+_own_changes = {}
+_own_changes_lock = threading.Lock()
+
+def startOwnChanges(show_dir):
+    """
+    Called by the post processor before it writes to a show dir, so the changes it makes there
+    don't get the show refreshed. Must be followed by endOwnChanges.
+    """
+
+    show_dir = ek.ek(os.path.normpath, show_dir)
+
+    with _own_changes_lock:
+        _own_changes.setdefault(show_dir, [0, 0])[0] += 1
+
+def endOwnChanges(show_dir):
+
+    show_dir = ek.ek(os.path.normpath, show_dir)
+
+    with _own_changes_lock:
+        _own_changes[show_dir][0] -= 1
+        _own_changes[show_dir][1] = time.time()
+
+def _own_changes_since(show_dir, since):
+    """
+    Returns True if we've been writing to show_dir at any point since the given time. Changes seen
+    in it since then are taken to be ours.
+    """
+
+    with _own_changes_lock:
+        if show_dir not in _own_changes:
+            return False
+
+        (num_active, last_finished) = _own_changes[show_dir]
+
+        if not num_active and last_finished < since:
+            del _own_changes[show_dir]
+            return False
+
+        return True
+
+def _encode(path):
+    if type(path) == unicode:
+        return path.encode(sickbeard.SYS_ENCODING)
+    return path
+
+class InotifyWatches:
+    """
+    A thin ctypes wrapper around the linux inotify API. Raises OSError if inotify can't be used.
+    """
+
+    def __init__(self):
+
+        if not _libc:
+            raise OSError(errno.ENOSYS, "inotify is not available on this system")
+
+        self.fd = _libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+
+        self.wd_to_path = {}
+        self.path_to_wd = {}
+
+    def add(self, path):
+        if path in self.path_to_wd:
+            return
+
+        wd = _libc.inotify_add_watch(self.fd, _encode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), "Unable to watch "+path)
+
+        self.wd_to_path[wd] = path
+        self.path_to_wd[path] = wd
+
+    def remove(self, path):
+        if path not in self.path_to_wd:
+            return
+
+        wd = self.path_to_wd.pop(path)
+        del self.wd_to_path[wd]
+        _libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self):
+        """
+        Returns a list of (path, mask) tuples for everything that happened since the last read,
+        or None if the kernel queue overflowed and events were lost.
+        """
+
+        events = []
+
+        while select.select([self.fd], [], [], 0)[0]:
+
+            data = os.read(self.fd, 65536)
+            offset = 0
+
+            while offset + _EVENT_HEADER.size <= len(data):
+                (wd, mask, cookie, length) = _EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset+_EVENT_HEADER.size:offset+_EVENT_HEADER.size+length].rstrip('\0')
+                offset += _EVENT_HEADER.size + length
+
+                if mask & IN_Q_OVERFLOW:
+                    return None
+
+                if wd not in self.wd_to_path:
+                    continue
+
+                if mask & IN_IGNORED:
+                    path = self.wd_to_path.pop(wd)
+                    del self.path_to_wd[path]
+                    continue
+
+                path = self.wd_to_path[wd]
+                if name:
+                    path = ek.ek(os.path.join, path, ek.fixStupidEncodings(name))
+
+                events.append((path, mask))
+
+        return events
+
+    def close(self):
+        os.close(self.fd)
+        self.wd_to_path = {}
+        self.path_to_wd = {}
+
+
+class DirWatcher():
+    """
+    Watches the TV download dir and every show dir for changes. New downloads are post-processed
+    once they stop changing and show dirs that were changed get a refresh queued for just that show.
+    Changes made by our own post-processing are ignored, it has already updated the episodes.
+    """
+
+    def __init__(self):
+        self.amActive = False
+
+        self.inotify = None
+        self.use_polling = False
+
+        self.download_dir = None
+        self.show_dirs = {}
+
+        # (type, path) -> [time of last change, last signature]
+        self.pending = {}
+
+        # when the inotify events were last read
+        self.last_read = time.time()
+
+        # polling state
+        self.download_snapshot = None
+        self.show_snapshot = {}
+        self.last_show_poll = 0
+
+    def run(self):
+
+        if not sickbeard.USE_DIR_WATCHER:
+            self._stop()
+            return
+
+        self.amActive = True
+
+        try:
+            self._update_targets()
+
+            if self.inotify:
+                self._read_events()
+            else:
+                self._poll()
+
+            self._dispatch()
+        finally:
+            self.amActive = False
+
+    def _stop(self):
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
+
+        self.download_dir = None
+        self.show_dirs = {}
+        self.pending = {}
+        self.download_snapshot = None
+        self.show_snapshot = {}
+
+    def _get_download_dir(self):
+
+        if not sickbeard.PROCESS_AUTOMATICALLY or not sickbeard.TV_DOWNLOAD_DIR:
+            return None
+
+        if not ek.ek(os.path.isabs, sickbeard.TV_DOWNLOAD_DIR) or not ek.ek(os.path.isdir, sickbeard.TV_DOWNLOAD_DIR):
+            return None
+
+        return ek.ek(os.path.normpath, sickbeard.TV_DOWNLOAD_DIR)
+
+    def _update_targets(self):
+        """
+        Works out which dirs should be watched and (re)builds the watches if that changed since last time.
+        """
+
+        download_dir = self._get_download_dir()
+
+        show_dirs = {}
+        for curShow in sickbeard.showList:
+            show_dirs[ek.ek(os.path.normpath, curShow._location)] = curShow
+
+        if download_dir == self.download_dir and show_dirs == self.show_dirs:
+            return
+
+        self.download_dir = download_dir
+        self.show_dirs = show_dirs
+
+        # forget anything pending for dirs we no longer care about
+        for key in self.pending.keys():
+            if key[0] == SHOW and key[1] not in self.show_dirs:
+                del self.pending[key]
+            elif key[0] == DOWNLOAD and not self._in_download_dir(key[1]):
+                del self.pending[key]
+
+        if self.use_polling:
+            self._reset_polling()
+            return
+
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
+
+        try:
+            self.inotify = InotifyWatches()
+
+            if self.download_dir:
+                self._watch_tree(self.download_dir)
+
+            for cur_dir in self.show_dirs:
+                self._watch_tree(cur_dir, 1)
+
+            logger.log(u"Watching "+str(len(self.inotify.path_to_wd))+" folders for changes", logger.DEBUG)
+
+        except OSError, e:
+            logger.log(u"Unable to use inotify to watch folders, falling back to polling: "+str(e).decode('utf-8'), logger.MESSAGE)
+            if self.inotify:
+                self.inotify.close()
+                self.inotify = None
+            self.use_polling = True
+            self._reset_polling()
+
+    def _watch_tree(self, dir, max_depth=None):
+        """
+        Adds a watch to dir and all the folders under it, going at most max_depth levels down.
+        """
+
+        try:
+            self.inotify.add(dir)
+        except OSError, e:
+            # missing or unreadable folders are skipped, anything else (like running out of watches) is fatal
+            if e.errno in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return
+            raise
+
+        if max_depth == 0:
+            return
+
+        try:
+            file_list = ek.ek(os.listdir, dir)
+        except OSError:
+            return
+
+        for cur_file in file_list:
+            cur_path = ek.ek(os.path.join, dir, cur_file)
+            if ek.ek(os.path.isdir, cur_path):
+                self._watch_tree(cur_path, None if max_depth == None else max_depth - 1)
+
+    def _in_download_dir(self, path):
+        return self.download_dir != None and path.startswith(self.download_dir + os.sep)
+
+    def _get_key(self, path):
+        """
+        Maps a changed path to the thing that needs to be done about it: the top level item in the
+        download dir that contains it or the show dir that contains it.
+        """
+
+        if self._in_download_dir(path):
+            top_level = path[len(self.download_dir)+1:].split(os.sep)[0]
+            return (DOWNLOAD, ek.ek(os.path.join, self.download_dir, top_level))
+
+        # show dirs are only watched a couple levels deep so this is a short walk up the tree
+        cur_path = path
+        while True:
+            if cur_path in self.show_dirs:
+                return (SHOW, cur_path)
+            parent = ek.ek(os.path.dirname, cur_path)
+            if parent == cur_path:
+                return None
+            cur_path = parent
+
+    def _touch(self, key):
+        if key not in self.pending:
+            self.pending[key] = [time.time(), None]
+        else:
+            self.pending[key][0] = time.time()
+
+    def _read_events(self):
+
+        last_read = self.last_read
+        self.last_read = time.time()
+
+        try:
+            events = self.inotify.read()
+        except OSError, e:
+            logger.log(u"Error reading inotify events, falling back to polling: "+str(e).decode('utf-8'), logger.ERROR)
+            self.inotify.close()
+            self.inotify = None
+            self.use_polling = True
+            self._reset_polling()
+            return
+
+        # we lost events so the only safe thing to do is rebuild everything
+        if events == None:
+            logger.log(u"Too many file system events at once, rebuilding the folder watches", logger.DEBUG)
+            self.download_dir = None
+            self.show_dirs = {}
+            self._update_targets()
+            return
+
+        for (path, mask) in events:
+
+            key = self._get_key(path)
+            if not key:
+                continue
+
+            # new folders need watches of their own so we see what's written inside them
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    if key[0] == DOWNLOAD:
+                        self._watch_tree(path)
+                    else:
+                        self.inotify.add(path)
+                except OSError, e:
+                    logger.log(u"Unable to watch new folder "+path+": "+str(e).decode('utf-8'), logger.DEBUG)
+
+            # the download was moved away or deleted, there's nothing to process anymore
+            if key[0] == DOWNLOAD and path == key[1] and mask & (IN_DELETE | IN_MOVED_FROM):
+                if key in self.pending:
+                    del self.pending[key]
+                continue
+
+            if key[0] == SHOW and _own_changes_since(key[1], last_read):
+                continue
+
+            self._touch(key)
+
+    def _reset_polling(self):
+        self.download_snapshot = None
+        self.show_snapshot = {}
+        self.last_show_poll = 0
+
+    def _stat_signature(self, path):
+        try:
+            stat = ek.ek(os.stat, path)
+            return (stat.st_size, stat.st_mtime)
+        except OSError:
+            return None
+
+    def _poll(self):
+
+        if self.download_dir:
+
+            cur_snapshot = {}
+            try:
+                file_list = ek.ek(os.listdir, self.download_dir)
+            except OSError:
+                file_list = []
+
+            for cur_file in file_list:
+                cur_path = ek.ek(os.path.join, self.download_dir, cur_file)
+                cur_snapshot[cur_path] = self._stat_signature(cur_path)
+
+            # the first look is just a baseline, existing downloads are the regular post processor's job
+            if self.download_snapshot != None:
+                for cur_path in cur_snapshot:
+                    if self.download_snapshot.get(cur_path) != cur_snapshot[cur_path]:
+                        self._touch((DOWNLOAD, cur_path))
+
+            self.download_snapshot = cur_snapshot
+
+        if time.time() - self.last_show_poll < SHOW_POLL_INTERVAL:
+            return
+
+        last_show_poll = self.last_show_poll
+        self.last_show_poll = time.time()
+
+        for cur_dir in self.show_dirs:
+
+            cur_signature = [self._stat_signature(cur_dir)]
+            try:
+                for cur_file in ek.ek(os.listdir, cur_dir):
+                    cur_path = ek.ek(os.path.join, cur_dir, cur_file)
+                    if ek.ek(os.path.isdir, cur_path):
+                        cur_signature.append(self._stat_signature(cur_path))
+            except OSError:
+                continue
+
+            if cur_dir in self.show_snapshot and self.show_snapshot[cur_dir] != cur_signature \
+                    and not _own_changes_since(cur_dir, last_show_poll):
+                self._touch((SHOW, cur_dir))
+
+            self.show_snapshot[cur_dir] = cur_signature
+
+    def _download_signature(self, path):
+        """
+        Returns something that changes whenever any file in the download does, so we can tell when
+        the downloader is done writing to it.
+        """
+
+        if not ek.ek(os.path.isdir, path):
+            return self._stat_signature(path)
+
+        signature = []
+        for (dir, dir_names, file_names) in ek.ek(os.walk, path):
+            for cur_file in file_names:
+                cur_path = ek.ek(os.path.join, dir, cur_file)
+                signature.append((cur_path, self._stat_signature(cur_path)))
+
+        signature.sort()
+
+        return signature
+
+    def _dispatch(self):
+
+        now = time.time()
+
+        for key in self.pending.keys():
+
+            (last_change, last_signature) = self.pending[key]
+
+            if now - last_change < SETTLE_TIME:
+                continue
+
+            if key[0] == DOWNLOAD:
+
+                if not ek.ek(os.path.exists, key[1]):
+                    del self.pending[key]
+                    continue
+
+                # make sure nothing is still being written before we move it out from under the downloader
+                cur_signature = self._download_signature(key[1])
+                if cur_signature != last_signature:
+                    self.pending[key] = [now, cur_signature]
+                    continue
+
+                del self.pending[key]
+                self._process_download(key[1])
+
+            else:
+                del self.pending[key]
+                self._refresh_show(self.show_dirs.get(key[1]))
+
+    def _process_download(self, path):
+
+        logger.log(u"Found a new download in "+path+", post-processing it")
+
+        with processTV.processLock:
+            if ek.ek(os.path.isdir, path):
+                processTV.processDir(path)
+            else:
+                processTV.processFile(path)
+
+    def _refresh_show(self, show):
+
+        if not show:
+            return
+
+        show_queue = sickbeard.showQueueScheduler.action
+
+        if show_queue.isInRefreshQueue(show) or show_queue.isBeingRefreshed(show):
+            return
+
+        logger.log(u"Files changed in the show dir for "+show.name+", queueing a refresh", logger.DEBUG)
+
+        try:
+            show_queue.refreshShow(show)
+        except exceptions.CantRefreshException, e:
+            logger.log(u"Unable to refresh "+show.name+": "+str(e), logger.DEBUG)
@@ -0,0 +1,255 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import with_statement
+
+import datetime
+import threading
+
+from sickbeard import db
+from sickbeard.common import Quality, Overview, ARCHIVED, IGNORED
+
+# airdate keys used in the per-show counts, anything bigger is the airdate of an episode that hasn't aired yet
+AIRED = 0
+NEVER_AIRED = 1
+
+_downloaded = Quality.DOWNLOADED + [ARCHIVED]
+_snatched = Quality.SNATCHED + Quality.SNATCHED_PROPER
+
+class EpisodeStats:
+    """
+    Keeps per-show episode counts in memory so the web pages don't have to count the whole
+    tv_episodes table every time they're shown. Everything is loaded from the DB the first time
+    it's needed and after that each episode save updates the counts for just that episode.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+
+        # the date the airdate keys below were worked out for
+        self.today = None
+
+        # showid -> {(season, episode): (status, has_location, airdate key)}
+        self.episodes = {}
+
+        # showid -> {status: count}, for every episode
+        self.statusCounts = {}
+
+        # showid -> {(status, has_location, airdate key): count}, only for non-special episodes
+        self.airCounts = {}
+
+    def _airKey(self, airdate):
+        if airdate == NEVER_AIRED:
+            return NEVER_AIRED
+        if airdate <= self.today:
+            return AIRED
+        return airdate
+
+    def _add(self, showid, season, episode, entry, amount):
+
+        status = entry[0]
+
+        statusCounts = self.statusCounts.setdefault(showid, {})
+        statusCounts[status] = statusCounts.get(status, 0) + amount
+        if not statusCounts[status]:
+            del statusCounts[status]
+
+        if season == 0 or episode == 0:
+            return
+
+        airCounts = self.airCounts.setdefault(showid, {})
+        airCounts[entry] = airCounts.get(entry, 0) + amount
+        if not airCounts[entry]:
+            del airCounts[entry]
+
+    def _set(self, showid, season, episode, status, airdate, location):
+
+        entry = (status, bool(location), self._airKey(airdate))
+
+        showEpisodes = self.episodes.setdefault(showid, {})
+        if (season, episode) in showEpisodes:
+            self._add(showid, season, episode, showEpisodes[(season, episode)], -1)
+
+        showEpisodes[(season, episode)] = entry
+        self._add(showid, season, episode, entry, 1)
+
+    def _remove(self, showid, season, episode):
+
+        showEpisodes = self.episodes.get(showid, {})
+        if (season, episode) in showEpisodes:
+            self._add(showid, season, episode, showEpisodes[(season, episode)], -1)
+            del showEpisodes[(season, episode)]
+
+    def _removeShow(self, showid):
+        for curDict in (self.episodes, self.statusCounts, self.airCounts):
+            if showid in curDict:
+                del curDict[showid]
+
+    def _loadShows(self, showid=None):
+
+        myDB = db.DBConnection()
+
+        if showid == None:
+            sqlResults = myDB.select("SELECT showid, season, episode, status, airdate, location FROM tv_episodes")
+        else:
+            sqlResults = myDB.select("SELECT showid, season, episode, status, airdate, location FROM tv_episodes WHERE showid = ?", [showid])
+
+        for curResult in sqlResults:
+            self._set(int(curResult["showid"]), int(curResult["season"]), int(curResult["episode"]), int(curResult["status"]), int(curResult["airdate"]), curResult["location"])
+
+    def _check(self):
+        """
+        Loads everything if it hasn't been yet and moves episodes that have aired since the last
+        time into the aired counts. Must be called with the lock held.
+        """
+
+        today = datetime.date.today().toordinal()
+
+        if not self.loaded:
+            self.today = today
+            self._loadShows()
+            self.loaded = True
+            return
+
+        if today == self.today:
+            return
+
+        self.today = today
+
+        for showid in self.episodes:
+            for (curKey, curEntry) in self.episodes[showid].items():
+                if curEntry[2] > NEVER_AIRED and curEntry[2] <= today:
+                    self._add(showid, curKey[0], curKey[1], curEntry, -1)
+                    self.episodes[showid][curKey] = (curEntry[0], curEntry[1], AIRED)
+                    self._add(showid, curKey[0], curKey[1], self.episodes[showid][curKey], 1)
+
+    def updateEpisode(self, showid, season, episode, status, airdate, location):
+        with self.lock:
+            # if nothing has been loaded yet then the DB already has the new info
+            if self.loaded:
+                self._check()
+                self._set(int(showid), int(season), int(episode), int(status), airdate, location)
+
+    def removeEpisode(self, showid, season, episode):
+        with self.lock:
+            if self.loaded:
+                self._remove(int(showid), int(season), int(episode))
+
+    def removeShow(self, showid):
+        with self.lock:
+            self._removeShow(int(showid))
+
+    def reloadShow(self, showid):
+        """
+        Reads the episodes for one show from the DB again, for when they were changed with a query
+        instead of by saving TVEpisode objects.
+        """
+
+        with self.lock:
+            if self.loaded:
+                self._removeShow(int(showid))
+                self._loadShows(int(showid))
+
+    def statusCountsForShow(self, showid):
+        with self.lock:
+            self._check()
+            return dict(self.statusCounts.get(int(showid), {}))
+
+    def airCountsForShows(self):
+        with self.lock:
+            self._check()
+            return dict([(x, dict(self.airCounts[x])) for x in self.airCounts])
+
+stats = EpisodeStats()
+
+def updateEpisode(showid, season, episode, status, airdate, location):
+    stats.updateEpisode(showid, season, episode, status, airdate, location)
+
+def removeEpisode(showid, season, episode):
+    stats.removeEpisode(showid, season, episode)
+
+def removeShow(showid):
+    stats.removeShow(showid)
+
+def reloadShow(showid):
+    stats.reloadShow(showid)
+
+def _progress(airCounts):
+
+    downloaded = 0
+    total = 0
+
+    for ((status, hasLocation, airKey), count) in airCounts.items():
+
+        if airKey > NEVER_AIRED:
+            continue
+
+        if status in _downloaded or (status in _snatched and hasLocation):
+            downloaded += count
+
+        if status != IGNORED and (airKey != NEVER_AIRED or status in _downloaded + _snatched):
+            total += count
+
+    return (downloaded, total)
+
+def showProgress():
+    """
+    Returns a dict of showid -> (downloaded, total) for the progress bars on the home page.
+    Only episodes which have aired are counted and specials are left out.
+    """
+
+    return dict([(showid, _progress(airCounts)) for (showid, airCounts) in stats.airCountsForShows().items()])
+
+def episodeTotals():
+    """
+    Returns the (downloaded, total) episode counts shown in the footer of every page.
+    """
+
+    numDLEpisodes = 0
+    numEpisodes = 0
+
+    for airCounts in stats.airCountsForShows().values():
+        numEpisodes += _progress(airCounts)[1]
+        numDLEpisodes += sum([count for ((status, hasLocation, airKey), count) in airCounts.items() if airKey <= NEVER_AIRED and status in _downloaded])
+
+    return (numDLEpisodes, numEpisodes)
+
+def statusOverviews(show):
+    """
+    Returns a dict of status -> Overview category for every status the show's episodes have.
+    """
+
+    return dict([(status, show.getOverview(status)) for status in stats.statusCountsForShow(show.tvdbid)])
+
+def overviewCounts(show):
+    """
+    Returns a dict of Overview category -> number of episodes of the show in it.
+    """
+
+    epCounts = {}
+    epCounts[Overview.SKIPPED] = 0
+    epCounts[Overview.WANTED] = 0
+    epCounts[Overview.QUAL] = 0
+    epCounts[Overview.GOOD] = 0
+    epCounts[Overview.UNAIRED] = 0
+
+    for (status, count) in stats.statusCountsForShow(show.tvdbid).items():
+        epCounts[show.getOverview(status)] += count
+
+    return epCounts
@@ -0,0 +1,197 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import os.path
+import sys
+import time
+import errno
+import shutil
+
+from sickbeard import logger
+from sickbeard import encodingKludge as ek
+
+# copy this much at a time, a multiple of any sane page/block size
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# the kernel copy calls are only usable between regular files on linux
+_copy_file_range = None
+_sendfile = None
+
+if sys.platform.startswith('linux'):
+    try:
+        import ctypes
+        import ctypes.util
+
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+
+        if hasattr(_libc, 'copy_file_range'):
+            _copy_file_range = _libc.copy_file_range
+            _copy_file_range.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t, ctypes.c_uint]
+            _copy_file_range.restype = ctypes.c_ssize_t
+
+        if hasattr(_libc, 'sendfile64'):
+            _sendfile = _libc.sendfile64
+        elif hasattr(_libc, 'sendfile'):
+            _sendfile = _libc.sendfile
+
+        if _sendfile:
+            _sendfile.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t]
+            _sendfile.restype = ctypes.c_ssize_t
+
+    except (ImportError, OSError, AttributeError):
+        _copy_file_range = None
+        _sendfile = None
+
+# errors which mean the kernel can't do this kind of copy, so try the next method instead
+_UNSUPPORTED_ERRORS = (errno.EINVAL, errno.ENOSYS, errno.EXDEV, errno.EBADF, errno.EOPNOTSUPP, errno.EPERM)
+
+class TransferResult:
+    """
+    What happened during a file transfer, used to report throughput.
+    """
+
+    def __init__(self, method, size, seconds):
+        self.method = method
+        self.size = size
+        self.seconds = seconds
+
+def _kernel_copy(copy_func, src_fd, dest_fd, size):
+    """
+    Copies using one of the kernel copy calls. Returns False if the call isn't supported for these
+    files and nothing was copied, raises OSError for real errors.
+    """
+
+    copied = 0
+
+    while copied < size:
+
+        if copy_func == _copy_file_range:
+            result = copy_func(src_fd, None, dest_fd, None, min(CHUNK_SIZE, size - copied), 0)
+        else:
+            result = copy_func(dest_fd, src_fd, None, min(CHUNK_SIZE, size - copied))
+
+        if result < 0:
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            if copied == 0 and err in _UNSUPPORTED_ERRORS:
+                return False
+            raise OSError(err, os.strerror(err))
+
+        if result == 0:
+            # some filesystems (FUSE, NFS, across devices) just copy nothing instead of failing
+            if copied == 0:
+                return False
+
+            # the source got shorter while we were copying it, the size check will catch it
+            break
+
+        copied += result
+
+    return True
+
+def _chunked_copy(src_fd, dest_fd):
+
+    while True:
+        data = os.read(src_fd, CHUNK_SIZE)
+        if not data:
+            break
+
+        # os.write can do partial writes
+        while data:
+            written = os.write(dest_fd, data)
+            data = data[written:]
+
+def copyFile(srcFile, destFile, hardlink=False):
+    """
+    Copies srcFile to destFile using the fastest method available and makes sure the full file
+    made it. If hardlink is True and both paths are on the same filesystem the new file is just
+    hardlinked to the old one instead.
+
+    Returns a TransferResult.
+    """
+
+    start_time = time.time()
+
+    if hardlink and hasattr(os, 'link'):
+        try:
+            if ek.ek(os.stat, srcFile).st_dev == ek.ek(os.stat, ek.ek(os.path.dirname, destFile)).st_dev:
+                ek.ek(os.link, srcFile, destFile)
+                return TransferResult('hardlink', ek.ek(os.path.getsize, destFile), time.time() - start_time)
+        except OSError, e:
+            logger.log(u"Unable to hardlink "+srcFile+" to "+destFile+", copying it instead: "+str(e).decode('utf-8'), logger.DEBUG)
+
+    src = ek.ek(open, srcFile, 'rb')
+    try:
+        dest = ek.ek(open, destFile, 'wb')
+        try:
+            src_fd = src.fileno()
+            dest_fd = dest.fileno()
+
+            size = os.fstat(src_fd).st_size
+
+            method = None
+            for (cur_method, cur_func) in (('copy_file_range', _copy_file_range), ('sendfile', _sendfile)):
+                if cur_func and _kernel_copy(cur_func, src_fd, dest_fd, size):
+                    method = cur_method
+                    break
+
+            if not method:
+                method = 'chunked copy'
+                _chunked_copy(src_fd, dest_fd)
+
+            dest_size = os.fstat(dest_fd).st_size
+        finally:
+            dest.close()
+    finally:
+        src.close()
+
+    if dest_size != size:
+        try:
+            ek.ek(os.unlink, destFile)
+        except OSError:
+            pass
+        raise IOError(errno.EIO, "Copied file "+destFile+" is "+str(dest_size)+" bytes but should be "+str(size))
+
+    try:
+        ek.ek(shutil.copymode, srcFile, destFile)
+    except OSError:
+        pass
+
+    return TransferResult(method, size, time.time() - start_time)
+
+def moveFile(srcFile, destFile):
+    """
+    Moves srcFile to destFile, renaming it if possible or else copying it and removing the original.
+
+    Returns a TransferResult.
+    """
+
+    start_time = time.time()
+
+    try:
+        ek.ek(os.rename, srcFile, destFile)
+        return TransferResult('rename', ek.ek(os.path.getsize, destFile), time.time() - start_time)
+    except OSError:
+        pass
+
+    result = copyFile(srcFile, destFile)
+    ek.ek(os.unlink, srcFile)
+
+    return result
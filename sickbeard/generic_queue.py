@@ -21,6 +21,7 @@ import threading
 
 import sickbeard
 from sickbeard import logger
+from sickbeard import resource_versions
 
 class QueuePriorities:
     LOW = 10
@@ -52,6 +53,7 @@ class GenericQueue(object):
 
     def add_item(self, item):
         self.queue.append(item)
+        resource_versions.bump(resource_versions.QUEUE)
 
     def run(self):
 
@@ -62,6 +64,7 @@ class GenericQueue(object):
             if self.currentItem != None:
                 self.currentItem.finish()
                 self.currentItem = None
+                resource_versions.bump(resource_versions.QUEUE)
 
             # if there's something in the queue then run it in a thread and take it out of the queue
             if len(self.queue) > 0:
@@ -85,6 +88,8 @@ class GenericQueue(object):
                 # take it out of the queue
                 del self.queue[0]
 
+                resource_versions.bump(resource_versions.QUEUE)
+
 class QueueItem:
     def __init__(self, name, action_id = 0):
         self.name = name
@@ -16,6 +16,7 @@
 # You should have received a copy of the GNU General Public License
 # along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
 
+from __future__ import with_statement
 
 import StringIO, zlib, gzip
 import os.path, os
@@ -23,6 +24,9 @@ import stat
 import urllib, urllib2
 import re
 import shutil
+import threading
+import traceback
+import urlparse
 
 import sickbeard
 
@@ -31,6 +35,7 @@ from sickbeard import logger, classes
 from sickbeard.common import *
 
 from sickbeard import db
+from sickbeard import fileTransfer
 from sickbeard import encodingKludge as ek
 
 from lib.tvdb_api import tvdb_api, tvdb_exceptions
@@ -110,16 +115,20 @@ def sanitizeFileName (name):
     return name
 
 
-def getURL (url, headers=[]):
-    """
-    Returns a byte-string retrieved from the url provider.
-    """
+def _openURL (url, headers=[]):
 
     opener = urllib2.build_opener()
     opener.addheaders = [('User-Agent', USER_AGENT), ('Accept-Encoding', 'gzip,deflate')]
     for cur_header in headers:
         opener.addheaders.append(cur_header)
-    usock = opener.open(url)
+    return opener.open(url)
+
+def getURL (url, headers=[]):
+    """
+    Returns a byte-string retrieved from the url provider.
+    """
+
+    usock = _openURL(url, headers)
     url = usock.geturl()
 
     encoding = usock.info().get("Content-Encoding")
@@ -138,6 +147,133 @@ def getURL (url, headers=[]):
 
     return result
 
+class URLStream:
+    """
+    A file-like object which reads a url a bit at a time, decompressing it as it goes if need be.
+    """
+
+    def __init__(self, usock):
+        self.usock = usock
+
+        encoding = usock.info().get("Content-Encoding")
+
+        if encoding in ('gzip', 'x-gzip'):
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            self.decompressor = zlib.decompressobj()
+        else:
+            self.decompressor = None
+
+    def read(self, size=16384):
+
+        if not self.decompressor:
+            return self.usock.read(size)
+
+        # keep going until there's something to give back, an empty string means we're done
+        while True:
+            data = self.usock.read(size)
+            if not data:
+                return self.decompressor.flush()
+
+            data = self.decompressor.decompress(data)
+            if data:
+                return data
+
+    def close(self):
+        self.usock.close()
+
+def getURLStream (url, headers=[]):
+    """
+    Returns a URLStream for reading the url without holding all of it in memory. It has to be
+    closed when you're done with it.
+    """
+
+    return URLStream(_openURL(url, headers))
+
+class DownloadPool:
+    """
+    Runs jobs on a few threads, keeping the number running against each host under a limit. Jobs
+    can add more jobs while they run.
+    """
+
+    def __init__(self, num_threads, max_per_host):
+        self.num_threads = num_threads
+        self.max_per_host = max_per_host
+
+        self.jobs = []
+        self.active = {}
+        self.num_active = 0
+        self.condition = threading.Condition()
+
+    def add(self, url, func, *args):
+        """
+        Queues func(*args), which will talk to the host in url.
+        """
+
+        host = urlparse.urlparse(url)[1]
+
+        with self.condition:
+            self.jobs.append((host, func, args))
+            self.condition.notify()
+
+    def _next_job(self):
+        """
+        Waits for a job whose host isn't at its limit and takes it off the list. Returns None once
+        there are no jobs left and none running that could add more.
+        """
+
+        with self.condition:
+            while True:
+                for job in self.jobs:
+                    if self.active.get(job[0], 0) < self.max_per_host:
+                        self.jobs.remove(job)
+                        self.active[job[0]] = self.active.get(job[0], 0) + 1
+                        self.num_active += 1
+                        return job
+
+                if not self.num_active:
+                    return None
+
+                self.condition.wait()
+
+    def _finish_job(self, host):
+        with self.condition:
+            self.active[host] -= 1
+            self.num_active -= 1
+            self.condition.notifyAll()
+
+    def _worker(self):
+
+        while True:
+            job = self._next_job()
+            if not job:
+                return
+
+            (host, func, args) = job
+
+            try:
+                func(*args)
+            except Exception, e:
+                logger.log(u"Exception while running a job for "+host+": "+str(e).decode('utf-8'), logger.ERROR)
+                logger.log(traceback.format_exc(), logger.DEBUG)
+
+            self._finish_job(host)
+
+    def run(self):
+        """
+        Runs all the jobs and returns when they're done.
+        """
+
+        threads = []
+
+        for i in range(self.num_threads):
+            cur_thread = threading.Thread(None, self._worker, threading.currentThread().getName()+"-"+str(i+1))
+            cur_thread.start()
+            threads.append(cur_thread)
+
+        for cur_thread in threads:
+            cur_thread.join()
+
 def findCertainShow (showList, tvdbid):
     results = filter(lambda x: x.tvdbid == tvdbid, showList)
     if len(results) == 0:
@@ -380,20 +516,27 @@ def listMediaFiles(dir):
 
     return files
 
-def copyFile(srcFile, destFile):
-    ek.ek(shutil.copyfile, srcFile, destFile)
-    try:
-        ek.ek(shutil.copymode, srcFile, destFile)
-    except OSError:
-        pass
+def copyFile(srcFile, destFile, hardlink=False):
+    return fileTransfer.copyFile(srcFile, destFile, hardlink)
 
 def moveFile(srcFile, destFile):
-    try:
-        ek.ek(os.rename, srcFile, destFile)
+    result = fileTransfer.moveFile(srcFile, destFile)
+    if result.method == 'rename':
         fixSetGroupID(destFile)
-    except OSError:
-        copyFile(srcFile, destFile)
-        ek.ek(os.unlink, srcFile)
+    return result
+
+def transferSpeed(result):
+    '''
+    >>> transferSpeed(fileTransfer.TransferResult('sendfile', 2**20, 2))
+    '1.0 MB in 2.0 seconds (512.0 KB/s) using sendfile'
+    >>> transferSpeed(fileTransfer.TransferResult('rename', 2**20, 0.001))
+    'rename'
+    '''
+    if result.method in ('rename', 'hardlink'):
+        return result.method
+
+    return "%s in %.1f seconds (%s/s) using %s" % (sizeof_fmt(result.size), result.seconds,
+                                                 sizeof_fmt(result.size / max(result.seconds, 0.001)), result.method)
 
 def rename_file(old_path, new_name):
 
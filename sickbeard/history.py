@@ -19,20 +19,101 @@
 import db
 import sqlite3
 import datetime
+import re
 
 from sickbeard import logger
+from sickbeard import resource_versions
 from sickbeard.common import *
 from sickbeard import providers
 
 dateFormat = "%Y%m%d%H%M%S"
 
+# number of items shown on each page of the history
+PAGE_SIZE = 100
+
+def resourceKey(resource):
+    """
+    Returns the form of a release name that history items are looked up by, so that case and the
+    separators used don't matter.
+
+    >>> resourceKey('Show.Name.S01E02.HDTV.XviD-GRP')
+    'show.name.s01e02.hdtv.xvid.grp'
+    >>> resourceKey('Show Name_S01E02 HDTV XviD-GRP')
+    'show.name.s01e02.hdtv.xvid.grp'
+    """
+
+    if not resource:
+        return ''
+
+    return re.sub("[\.\-\ _]", ".", resource).lower()
+
 def _logHistoryItem(action, showid, season, episode, quality, resource, provider):
 
     logDate = datetime.datetime.today().strftime(dateFormat)
 
     myDB = db.DBConnection()
-    myDB.action("INSERT INTO history (action, date, showid, season, episode, quality, resource, provider) VALUES (?,?,?,?,?,?,?,?)",
-                [action, logDate, showid, season, episode, quality, resource, provider])
+    myDB.action("INSERT INTO history (action, date, showid, season, episode, quality, resource, provider, resource_key) VALUES (?,?,?,?,?,?,?,?,?)",
+                [action, logDate, showid, season, episode, quality, resource, provider, resourceKey(resource)])
+
+    resource_versions.bump(resource_versions.HISTORY)
+
+def getHistory(limit=PAGE_SIZE, before=None, showid=None, actions=None, provider=None):
+    """
+    Returns a page of history items, newest first, along with the show name of each.
+
+    limit: the most items to return
+    before: the key returned for the previous page, only items older than it are returned
+    showid: only return items for this show
+    actions: only return items with one of these actions
+    provider: only return items from this provider
+
+    Returns a (results, next_key) tuple, next_key is None if there are no older items.
+    """
+
+    # a negative LIMIT means no limit to SQLite and 0 would leave no item to take the key from
+    if limit < 1:
+        limit = 1
+
+    conditions = ["h.showid = s.tvdb_id"]
+    args = []
+
+    # the key is the date and rowid of the last item on the previous page
+    if before:
+        try:
+            before_date, before_id = [int(x) for x in before.split('-')]
+            conditions.append("(h.date < ? OR (h.date = ? AND h.rowid < ?))")
+            args += [before_date, before_date, before_id]
+        except ValueError:
+            logger.log(u"Invalid history page key "+before+", starting from the newest item", logger.DEBUG)
+
+    if showid:
+        conditions.append("h.showid = ?")
+        args.append(int(showid))
+
+    if actions:
+        conditions.append("h.action IN ("+",".join(["?"] * len(actions))+")")
+        args += actions
+
+    if provider:
+        conditions.append("h.provider = ?")
+        args.append(provider)
+
+    myDB = db.DBConnection()
+    sqlResults = myDB.select("SELECT h.rowid AS history_id, h.*, show_name FROM history h, tv_shows s WHERE "+" AND ".join(conditions)+" ORDER BY h.date DESC, h.rowid DESC LIMIT ?", args + [limit + 1])
+
+    if len(sqlResults) <= limit:
+        return (sqlResults, None)
+
+    sqlResults = sqlResults[:limit]
+    return (sqlResults, str(sqlResults[-1]["date"])+"-"+str(sqlResults[-1]["history_id"]))
+
+def findByResource(resource):
+    """
+    Returns the history items for the given release name, newest first.
+    """
+
+    myDB = db.DBConnection()
+    return myDB.select("SELECT * FROM history WHERE resource_key = ? ORDER BY date DESC", [resourceKey(resource)])
 
 
 def logSnatch(searchResult):
@@ -16,8 +16,12 @@
 # You should have received a copy of the GNU General Public License
 # along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import os.path
 import sys
+import glob
+import thread
+import threading
 import traceback
 
 import sickbeard
@@ -30,10 +34,25 @@ from sickbeard.metadata.generic import GenericMetadata
 from lib.hachoir_parser import createParser
 from lib.hachoir_metadata import extractMetadata
 
+# held while old thumbnails are removed so two requests can't remove each other's new ones
+_thumbnail_lock = threading.Lock()
+
 class ImageCache:
     
     def __init__(self):
         pass
+
+    BANNER = 1
+    POSTER = 2
+
+    # the sizes the web interface shows each type of image at
+    THUMBNAIL_SIZES = {BANNER: (600, 112),
+                       POSTER: (136, 200),
+                       }
+
+    _type_names = {BANNER: 'banner',
+                   POSTER: 'poster',
+                   }
     
     def _cache_dir(self):
         """
@@ -79,9 +98,142 @@ class ImageCache:
         logger.log(u"Checking if file "+str(banner_path)+" exists", logger.DEBUG)
         return ek.ek(os.path.isfile, banner_path)
 
-    BANNER = 1
-    POSTER = 2
-    
+    def image_path(self, tvdb_id, img_type):
+        """
+        Returns the path to the cached image of the given type (BANNER or POSTER) for a tvdb id
+        """
+        if img_type == self.POSTER:
+            return self.poster_path(tvdb_id)
+        return self.banner_path(tvdb_id)
+
+    def _temp_path(self, path):
+        """
+        Returns a temp file name next to path which no other thread will be using
+        """
+        return path + '.' + str(os.getpid()) + '.' + str(thread.get_ident()) + '.tmp'
+
+    def _thumbnail_dir(self):
+        return ek.ek(os.path.join, self._cache_dir(), 'thumbnails')
+
+    def _thumbnail_prefix(self, tvdb_id, img_type):
+        (width, height) = self.THUMBNAIL_SIZES[img_type]
+        return str(tvdb_id) + '.' + self._type_names[img_type] + '.' + str(width) + 'x' + str(height) + '.'
+
+    def thumbnail_path(self, tvdb_id, img_type, mtime):
+        """
+        Builds up the path to a resized copy of a cached image. The mtime of the full size image is
+        part of the name so replacing the image gives the thumbnail a new name too.
+
+        returns: a full path to the thumbnail file
+
+        tvdb_id: ID of the show to use in the file name
+        img_type: BANNER or POSTER
+        mtime: modification time of the full size cached image
+        """
+        thumbnail_file_name = self._thumbnail_prefix(tvdb_id, img_type) + str(int(mtime)) + '.jpg'
+        return ek.ek(os.path.join, self._thumbnail_dir(), thumbnail_file_name)
+
+    def image_version(self, tvdb_id, img_type):
+        """
+        Returns the modification time of the cached image of the given type, or None if there isn't one
+        """
+        try:
+            return int(ek.ek(os.path.getmtime, self.image_path(tvdb_id, img_type)))
+        except OSError:
+            return None
+
+    def _remove_old_thumbnails(self, tvdb_id, img_type, mtime):
+        """
+        Removes the thumbnails made from versions of the image older than mtime. Temp files and
+        thumbnails of the current or a newer version are left alone.
+        """
+
+        prefix = self._thumbnail_prefix(tvdb_id, img_type)
+
+        with _thumbnail_lock:
+            for old_file in ek.ek(glob.glob, ek.ek(os.path.join, self._thumbnail_dir(), prefix+'*.jpg')):
+                try:
+                    old_mtime = int(ek.ek(os.path.basename, old_file)[len(prefix):-len('.jpg')])
+                except ValueError:
+                    continue
+
+                if old_mtime >= mtime:
+                    continue
+
+                try:
+                    ek.ek(os.remove, old_file)
+                except OSError:
+                    pass
+
+    def make_thumbnail(self, tvdb_id, img_type):
+        """
+        Makes the resized copy of a cached image if it doesn't exist yet and removes any made from an
+        older version of the image.
+
+        returns: the path to the thumbnail, or None if the image isn't cached or couldn't be resized
+
+        tvdb_id: ID of the show the image belongs to
+        img_type: BANNER or POSTER
+        """
+
+        mtime = self.image_version(tvdb_id, img_type)
+        if mtime == None:
+            return None
+
+        thumbnail_path = self.thumbnail_path(tvdb_id, img_type, mtime)
+        if ek.ek(os.path.isfile, thumbnail_path):
+            return thumbnail_path
+
+        try:
+            from PIL import Image
+        except ImportError: # PIL isn't installed
+            return None
+
+        if not ek.ek(os.path.isdir, self._thumbnail_dir()):
+            try:
+                ek.ek(os.makedirs, self._thumbnail_dir())
+            except OSError:
+                # another thread may have just made it
+                if not ek.ek(os.path.isdir, self._thumbnail_dir()):
+                    raise
+
+        image_path = self.image_path(tvdb_id, img_type)
+        logger.log(u"Making a thumbnail of "+image_path, logger.DEBUG)
+
+        # write to a temp file first so a half written thumbnail is never served
+        temp_path = self._temp_path(thumbnail_path)
+
+        try:
+            im = Image.open(image_path)
+            if im.mode not in ('RGB', 'L'): # Convert GIFs and transparent PNGs to RGB
+                im = im.convert('RGB')
+            im.thumbnail(self.THUMBNAIL_SIZES[img_type], Image.ANTIALIAS)
+            im.save(temp_path, 'JPEG')
+            ek.ek(os.rename, temp_path, thumbnail_path)
+        except Exception, e:
+            logger.log(u"Unable to make a thumbnail of "+image_path+": "+str(e).decode('utf-8'), logger.WARNING)
+            try:
+                ek.ek(os.remove, temp_path)
+            except OSError:
+                pass
+            if ek.ek(os.path.isfile, thumbnail_path):
+                return thumbnail_path
+            return None
+
+        # only once the new one is in place, so there's always a thumbnail to serve
+        self._remove_old_thumbnails(tvdb_id, img_type, mtime)
+
+        return thumbnail_path
+
+    def delete_images(self, tvdb_id):
+        """
+        Removes all the cached images and thumbnails for the given tvdb id
+        """
+        for cur_dir in (self._cache_dir(), self._thumbnail_dir()):
+            for cache_file in ek.ek(glob.glob, ek.ek(os.path.join, cur_dir, str(tvdb_id)+'.*')):
+                logger.log(u"Deleting cache file "+cache_file)
+                ek.ek(os.remove, cache_file)
+
     def which_type(self, path):
         """
         Analyzes the image provided and attempts to determine whether it is a poster or banner.
@@ -145,6 +297,8 @@ class ImageCache:
 
         logger.log(u"Copying from "+image_path+" to "+dest_path)
         helpers.copyFile(image_path, dest_path)
+
+        self.make_thumbnail(tvdb_id, img_type)
         
         return True
 
@@ -175,6 +329,9 @@ class ImageCache:
         img_data = metadata_generator._retrieve_show_image(img_type_name, show_obj)
         result = metadata_generator._write_image(img_data, dest_path)
 
+        if result:
+            self.make_thumbnail(show_obj.tvdbid, img_type)
+
         return result
     
     def fill_cache(self, show_obj):
@@ -194,8 +351,31 @@ class ImageCache:
         
         if not need_images[self.POSTER] and not need_images[self.BANNER]:
             logger.log(u"No new cache images needed, not retrieving new ones")
+            # images cached by older versions won't have thumbnails yet
+            for cur_image_type in [self.POSTER, self.BANNER]:
+                self.make_thumbnail(show_obj.tvdbid, cur_image_type)
             return
         
+        self.cache_images_from_show_dir(show_obj, need_images)
+                    
+        # download from TVDB for missing ones
+        for cur_image_type in [self.POSTER, self.BANNER]:
+            logger.log(u"Seeing if we still need an image of type "+str(cur_image_type)+": "+str(need_images[cur_image_type]), logger.DEBUG)
+            if cur_image_type in need_images and need_images[cur_image_type]:
+                self._cache_image_from_tvdb(show_obj, cur_image_type)
+        
+
+        logger.log(u"Done cache check")
+
+    def cache_images_from_show_dir(self, show_obj, need_images):
+        """
+        Caches any of the needed images that can be found in the show dir.
+
+        show_obj: TVShow object to cache images for
+        need_images: dict of BANNER/POSTER -> bool saying if that type is needed, the types that get
+                     cached are set to False
+        """
+
         # check the show dir for images and use them
         try:
             for cur_provider in sickbeard.metadata_provider_dict.values():
@@ -216,12 +396,50 @@ class ImageCache:
                         need_images[cur_file_type] = False
         except exceptions.ShowDirNotFoundException, e:
             logger.log(u"Unable to search for images in show dir because it doesn't exist", logger.WARNING)
-                    
-        # download from TVDB for missing ones
-        for cur_image_type in [self.POSTER, self.BANNER]:
-            logger.log(u"Seeing if we still need an image of type "+str(cur_image_type)+": "+str(need_images[cur_image_type]), logger.DEBUG)
-            if cur_image_type in need_images and need_images[cur_image_type]:
-                self._cache_image_from_tvdb(show_obj, cur_image_type)
-        
 
-        logger.log(u"Done cache check")
+    def save_image(self, image_data, tvdb_id, img_type):
+        """
+        Writes downloaded image data to the cache. The data goes to a temp file which is renamed into
+        place so nothing ever sees half an image.
+
+        returns: bool representing success
+
+        image_data: the image file contents
+        tvdb_id: id of the show this image belongs to
+        img_type: BANNER or POSTER
+        """
+
+        dest_path = self.image_path(tvdb_id, img_type)
+
+        if not ek.ek(os.path.isdir, self._cache_dir()):
+            try:
+                ek.ek(os.makedirs, self._cache_dir())
+            except OSError:
+                if not ek.ek(os.path.isdir, self._cache_dir()):
+                    raise
+
+        temp_path = self._temp_path(dest_path)
+
+        try:
+            temp_file = ek.ek(open, temp_path, 'wb')
+            try:
+                temp_file.write(image_data)
+            finally:
+                temp_file.close()
+
+            # windows can't rename over an existing file, and if it's there someone else already cached it
+            if ek.ek(os.path.isfile, dest_path):
+                ek.ek(os.remove, temp_path)
+            else:
+                ek.ek(os.rename, temp_path, dest_path)
+        except (IOError, OSError), e:
+            logger.log(u"Unable to write image to "+dest_path+": "+str(e).decode('utf-8'), logger.ERROR)
+            try:
+                ek.ek(os.remove, temp_path)
+            except OSError:
+                pass
+            return False
+
+        self.make_thumbnail(tvdb_id, img_type)
+
+        return True
@@ -0,0 +1,227 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import with_statement
+
+import threading
+import time
+
+import sickbeard
+
+from sickbeard import logger, ui, db, helpers
+from sickbeard import image_cache
+from sickbeard.metadata import helpers as metadata_helpers
+
+from lib.tvdb_api import tvdb_api
+
+try:
+    import xml.etree.cElementTree as etree
+except ImportError:
+    import xml.etree.ElementTree as etree
+
+# lookups and downloads are spread over this many threads
+DOWNLOAD_THREADS = 8
+
+# but no more than this many of them go to any one host at once
+MAX_HOST_DOWNLOADS = 2
+
+# after an image can't be found on TVDB we wait this long before asking again, doubling every time
+RETRY_HOURS = 12
+MAX_RETRY_DAYS = 28
+
+def _getMisses():
+    """
+    Returns a dict of (TVDB ID, image type) -> image_misses row.
+    """
+
+    myDB = db.DBConnection("cache.db")
+    return dict([((int(x["tvdb_id"]), int(x["img_type"])), x) for x in myDB.select("SELECT * FROM image_misses")])
+
+def _retryTime(missRow):
+    """
+    Returns the time after which an image that couldn't be found can be looked for again.
+    """
+
+    wait = min(RETRY_HOURS * 3600 * 2 ** (int(missRow["failures"]) - 1), MAX_RETRY_DAYS * 86400)
+    return int(missRow["last_attempt"]) + wait
+
+def _saveMiss(tvdbid, img_type):
+
+    myDB = db.DBConnection("cache.db")
+    sqlResults = myDB.select("SELECT failures FROM image_misses WHERE tvdb_id = ? AND img_type = ?", [tvdbid, img_type])
+
+    if sqlResults:
+        failures = int(sqlResults[0]["failures"]) + 1
+    else:
+        failures = 1
+
+    myDB.upsert("image_misses",
+                {'last_attempt': int(time.time()), 'failures': failures},
+                {'tvdb_id': tvdbid, 'img_type': img_type})
+
+def _clearMiss(tvdbid, img_type):
+
+    myDB = db.DBConnection("cache.db")
+    myDB.action("DELETE FROM image_misses WHERE tvdb_id = ? AND img_type = ?", [tvdbid, img_type])
+
+class ImageCacheUpdater:
+    """
+    Fills in the missing cached posters and banners for all shows at once. Images in the show dirs
+    are copied, the rest are downloaded in parallel using the artwork URLs from each show's TVDB
+    series record, without fetching the full episode list and banner list like fill_cache does.
+    Images TVDB doesn't have aren't asked for again until their retry time.
+    """
+
+    def __init__(self):
+        self.amActive = False
+
+        self.name = "Image Cache"
+        self.lock = threading.Lock()
+        self.total = 0
+        self.finished = 0
+
+    def numTotal(self):
+        return self.total
+
+    def numFinished(self):
+        return self.finished
+
+    def numRemaining(self):
+        return self.total - self.finished
+
+    def nextName(self):
+        return self.name
+
+    def percentComplete(self):
+        if self.total == 0:
+            return 100
+        return int(float(self.finished)/float(self.total)*100)
+
+    def _done(self, num=1):
+        with self.lock:
+            self.finished += num
+
+    def _missing_images(self, cache_obj):
+        """
+        Returns a list of (show, [image types]) for every show missing a cached image, after using
+        whatever's in the show dirs and leaving out the ones which recently couldn't be found.
+        """
+
+        results = []
+        misses = _getMisses()
+        cur_time = time.time()
+
+        for cur_show in sickbeard.showList:
+
+            need_images = {cache_obj.POSTER: not cache_obj.has_poster(cur_show.tvdbid),
+                           cache_obj.BANNER: not cache_obj.has_banner(cur_show.tvdbid),
+                           }
+
+            if not need_images[cache_obj.POSTER] and not need_images[cache_obj.BANNER]:
+                continue
+
+            cache_obj.cache_images_from_show_dir(cur_show, need_images)
+
+            cur_types = [x for x in (cache_obj.POSTER, cache_obj.BANNER) if need_images[x]
+                         and not ((cur_show.tvdbid, x) in misses and cur_time < _retryTime(misses[(cur_show.tvdbid, x)]))]
+            if cur_types:
+                results.append((cur_show, cur_types))
+
+        return results
+
+    def _lookup_show(self, pool, tvdb_config, cache_obj, show_obj, img_types):
+        """
+        Gets the show's series record from TVDB and queues a download for each image it's missing.
+        """
+
+        tvdb_lang = show_obj.lang or 'en'
+
+        # just the series record, it has the URL of the main poster and banner in it
+        try:
+            series_xml = etree.fromstring(helpers.getURL(tvdb_config['url_seriesInfo'] % (show_obj.tvdbid, tvdb_lang)))
+            series_info = series_xml.findall("Series")[0]
+        except (IOError, SyntaxError, IndexError), e:
+            logger.log(u"Unable to look up show "+str(show_obj.tvdbid)+" on TVDB, not downloading images: "+str(e).decode('utf-8'), logger.ERROR)
+            for cur_type in img_types:
+                _saveMiss(show_obj.tvdbid, cur_type)
+            self._done(len(img_types))
+            return
+
+        for cur_type in img_types:
+
+            if cur_type == cache_obj.POSTER:
+                image_field = 'poster'
+            else:
+                image_field = 'banner'
+
+            image_name = series_info.findtext(image_field)
+
+            if not image_name:
+                logger.log(u"TVDB has no "+image_field+" for show "+str(show_obj.tvdbid), logger.DEBUG)
+                _saveMiss(show_obj.tvdbid, cur_type)
+                self._done()
+                continue
+
+            image_url = tvdb_config['url_artworkPrefix'] % image_name
+            pool.add(image_url, self._download_image, cache_obj, show_obj, cur_type, image_url)
+
+    def _download_image(self, cache_obj, show_obj, img_type, image_url):
+
+        try:
+            image_data = metadata_helpers.getShowImage(image_url)
+
+            if image_data and cache_obj.save_image(image_data, show_obj.tvdbid, img_type):
+                _clearMiss(show_obj.tvdbid, img_type)
+            else:
+                _saveMiss(show_obj.tvdbid, img_type)
+        finally:
+            self._done()
+
+    def run(self):
+
+        self.amActive = True
+
+        try:
+            cache_obj = image_cache.ImageCache()
+
+            missing = self._missing_images(cache_obj)
+            if not missing:
+                return
+
+            with self.lock:
+                self.total = sum([len(x[1]) for x in missing])
+                self.finished = 0
+
+            logger.log(u"Downloading "+str(self.total)+" missing images for "+str(len(missing))+" shows")
+
+            if self not in ui.ProgressIndicators.getIndicator('imageCache'):
+                ui.ProgressIndicators.setIndicator('imageCache', self)
+
+            # only the URLs are taken from the TVDB object, the lookups themselves are plain requests
+            # so they can safely run on several threads
+            tvdb_config = tvdb_api.Tvdb(**sickbeard.TVDB_API_PARMS).config
+
+            pool = helpers.DownloadPool(DOWNLOAD_THREADS, MAX_HOST_DOWNLOADS)
+            for (cur_show, cur_types) in missing:
+                pool.add(tvdb_config['url_seriesInfo'], self._lookup_show, pool, tvdb_config, cache_obj, cur_show, cur_types)
+            pool.run()
+
+            logger.log(u"Done filling the image cache")
+
+        finally:
+            self.amActive = False
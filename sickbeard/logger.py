@@ -20,6 +20,7 @@ from __future__ import with_statement
 
 import os.path
 import threading
+import time
 
 import logging
 import logging.handlers
@@ -42,8 +43,163 @@ reverseNames = {u'ERROR': ERROR,
 
 logFile = ''
 
+# the log is rotated once it gets this big and this many old ones are kept
+LOG_SIZE = 25000000
+LOG_BACKUP_COUNT = 5
+
+# how much of the log is read at a time when reading it backwards
+READ_BLOCK_SIZE = 64 * 1024
+
+# the most recent messages are kept in memory so the UI doesn't have to read the log file
+LOG_BUFFER_SIZE = 5000
+
+# only the messages of this many threads are indexed by thread at once
+LOG_BUFFER_THREADS = 50
+
+# messages below this level are thrown away before they're even formatted
+minLevel = DEBUG
+
 log_lock = threading.Lock()
 
+class LogRecord:
+    """
+    A single log message as it's kept in the log buffer.
+    """
+
+    def __init__(self, record_id, level, thread, message):
+        self.record_id = record_id
+        self.time = time.time()
+        self.level = level
+        self.thread = thread
+        self.message = message
+
+    def levelName(self):
+        return logging.getLevelName(self.level)
+
+    def __unicode__(self):
+        # same format as the log file
+        return time.strftime('%b-%d %H:%M:%S', time.localtime(self.time)).decode(sickbeard.SYS_ENCODING or 'utf-8', 'replace') + \
+               u" " + self.levelName().ljust(8) + u" " + self.thread + u" :: " + self.message
+
+    def toDict(self):
+        return {'id': self.record_id,
+                'time': self.time,
+                'level': self.levelName(),
+                'thread': self.thread,
+                'message': self.message}
+
+class _Ring:
+    """
+    A list which only keeps the newest size items.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.items = []
+
+    def append(self, item):
+        self.items.append(item)
+
+        # trim in bulk so appending stays cheap
+        if len(self.items) >= self.size * 2:
+            del self.items[:-self.size]
+
+    def newest(self):
+        """
+        Returns the items from newest to oldest.
+        """
+        return reversed(self.items[-self.size:])
+
+class LogBuffer:
+    """
+    Keeps the most recent log records in memory, indexed by level and by thread.
+    """
+
+    def __init__(self, size=LOG_BUFFER_SIZE):
+        self.lock = threading.Lock()
+        self.size = size
+        self.next_id = 0
+
+        self.records = _Ring(size)
+        self.by_level = {}
+        self.by_thread = {}
+
+    def add(self, level, thread, message):
+
+        with self.lock:
+            record = LogRecord(self.next_id, level, thread, message)
+            self.next_id += 1
+
+            self.records.append(record)
+
+            if level not in self.by_level:
+                self.by_level[level] = _Ring(self.size)
+            self.by_level[level].append(record)
+
+            if thread not in self.by_thread:
+                # forget about the thread that's been quiet the longest
+                if len(self.by_thread) >= LOG_BUFFER_THREADS:
+                    oldest = min(self.by_thread, key=lambda x: self.by_thread[x].items[-1].record_id)
+                    del self.by_thread[oldest]
+                self.by_thread[thread] = _Ring(self.size)
+            self.by_thread[thread].append(record)
+
+    def get(self, minLevel=DEBUG, thread=None, limit=100, after=None):
+        """
+        Returns up to limit records at minLevel or above, newest first.
+
+        thread: only return records from this thread
+        after: only return records newer than this record id
+        """
+
+        with self.lock:
+
+            oldest_id = self.next_id - self.size
+
+            if thread:
+                if thread not in self.by_thread:
+                    return []
+                sources = [self.by_thread[thread].newest()]
+            else:
+                sources = [self.by_level[x].newest() for x in self.by_level if x >= minLevel]
+
+            results = []
+            for cur_source in sources:
+
+                # each source is newest first so after limit matches nothing older in it can make the cut
+                num_found = 0
+                for cur_record in cur_source:
+                    if num_found >= limit or cur_record.record_id < oldest_id or (after != None and cur_record.record_id <= after):
+                        break
+                    if cur_record.level < minLevel:
+                        continue
+                    results.append(cur_record)
+                    num_found += 1
+
+        results.sort(key=lambda x: x.record_id, reverse=True)
+        return results[:limit]
+
+logBuffer = LogBuffer()
+
+def setDebugLogging(enabled):
+    """
+    Turns DEBUG messages on or off.
+    """
+
+    global minLevel
+
+    if enabled:
+        minLevel = DEBUG
+    else:
+        minLevel = MESSAGE
+
+def isEnabledFor(logLevel):
+    """
+    Lets callers skip building expensive messages which would just be thrown away.
+    """
+
+    return logLevel >= minLevel
+
 def initLogging(consoleLogging=True):
     global logFile
 
@@ -51,8 +207,8 @@ def initLogging(consoleLogging=True):
 
     fileHandler = logging.handlers.RotatingFileHandler(
                   logFile,
-                  maxBytes=25000000,
-                  backupCount=5)
+                  maxBytes=LOG_SIZE,
+                  backupCount=LOG_BACKUP_COUNT)
 
     fileHandler.setLevel(logging.DEBUG)
     fileHandler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-8s %(message)s', '%b-%d %H:%M:%S'))
@@ -73,15 +229,28 @@ def initLogging(consoleLogging=True):
 
     logging.getLogger('sickbeard').setLevel(logging.DEBUG)
 
-def log(toLog, logLevel=MESSAGE):
+def log(toLog, logLevel=MESSAGE, *args):
+    """
+    Logs toLog at the given level. If args are given the message is toLog % args, which is only
+    worked out if the message is actually going to be logged.
+    """
+
+    if logLevel < minLevel:
+        return
+
+    if args:
+        toLog = toLog % args
+
+    meThread = threading.currentThread().getName()
+
+    logBuffer.add(logLevel, meThread, toLog)
+
+    message = meThread + u" :: " + toLog
+
+    outLine = message.encode('utf-8')
 
     with log_lock:
 
-        meThread = threading.currentThread().getName()
-        message = meThread + u" :: " + toLog
-    
-        outLine = message.encode('utf-8')
-    
         sbLogger = logging.getLogger('sickbeard')
 
         try:
@@ -99,4 +268,61 @@ def log(toLog, logLevel=MESSAGE):
             else:
                 sbLogger.log(logLevel, outLine)
         except ValueError, e:
-            pass
\ No newline at end of file
+            pass
+
+def _readBackwards(fileName):
+    """
+    Yields the lines of a file from the last one to the first, without the line endings. Only reads
+    as much of the end of the file as is needed for the lines that are used.
+    """
+
+    logFileObj = open(fileName, 'rb')
+
+    try:
+        logFileObj.seek(0, os.SEEK_END)
+        pos = logFileObj.tell()
+
+        # the (partial) line at the start of the last block read
+        remainder = ''
+        atEnd = True
+
+        while pos > 0:
+            readSize = min(READ_BLOCK_SIZE, pos)
+            pos -= readSize
+
+            logFileObj.seek(pos)
+            lines = (logFileObj.read(readSize) + remainder).split('\n')
+
+            # the first line might continue in the block before this one
+            remainder = lines.pop(0)
+
+            # don't count the newline at the very end of the file as an empty line
+            if atEnd and lines and lines[-1] == '':
+                lines.pop()
+            atEnd = False
+
+            for curLine in reversed(lines):
+                yield curLine.rstrip('\r')
+
+        if remainder or not atEnd:
+            yield remainder.rstrip('\r')
+
+    finally:
+        logFileObj.close()
+
+def readLogBackwards():
+    """
+    Yields the lines of the log, newest first, continuing into the rotated logs once the current
+    one runs out.
+    """
+
+    if not logFile:
+        return
+
+    for curFile in [logFile] + [logFile+'.'+str(x) for x in range(1, LOG_BACKUP_COUNT + 1)]:
+
+        if not os.path.isfile(curFile):
+            continue
+
+        for curLine in _readBackwards(curFile):
+            yield curLine.decode('utf-8', 'replace')
@@ -28,6 +28,7 @@ import notifo
 import nmj
 
 from sickbeard.common import *
+from sickbeard import notify_queue
 
 xbmc_notifier = xbmc.XBMCNotifier()
 plex_notifier = plex.PLEXNotifier()
@@ -50,15 +51,80 @@ notifiers = [
     nmj_notifier,
 ]
 
+# notifier -> (the setting which turns it on, {event: the setting which turns that event on})
+_notify_settings = {
+    libnotify_notifier: ('USE_LIBNOTIFY', {NOTIFY_SNATCH: 'LIBNOTIFY_NOTIFY_ONSNATCH', NOTIFY_DOWNLOAD: 'LIBNOTIFY_NOTIFY_ONDOWNLOAD'}),
+    xbmc_notifier: ('USE_XBMC', {NOTIFY_SNATCH: 'XBMC_NOTIFY_ONSNATCH', NOTIFY_DOWNLOAD: 'XBMC_NOTIFY_ONDOWNLOAD'}),
+    plex_notifier: ('USE_PLEX', {NOTIFY_SNATCH: 'PLEX_NOTIFY_ONSNATCH', NOTIFY_DOWNLOAD: 'PLEX_NOTIFY_ONDOWNLOAD'}),
+    growl_notifier: ('USE_GROWL', {NOTIFY_SNATCH: 'GROWL_NOTIFY_ONSNATCH', NOTIFY_DOWNLOAD: 'GROWL_NOTIFY_ONDOWNLOAD'}),
+    prowl_notifier: ('USE_PROWL', {NOTIFY_SNATCH: 'PROWL_NOTIFY_ONSNATCH', NOTIFY_DOWNLOAD: 'PROWL_NOTIFY_ONDOWNLOAD'}),
+    twitter_notifier: ('USE_TWITTER', {NOTIFY_SNATCH: 'TWITTER_NOTIFY_ONSNATCH', NOTIFY_DOWNLOAD: 'TWITTER_NOTIFY_ONDOWNLOAD'}),
+    notifo_notifier: ('USE_NOTIFO', {NOTIFY_SNATCH: 'NOTIFO_NOTIFY_ONSNATCH', NOTIFY_DOWNLOAD: 'NOTIFO_NOTIFY_ONDOWNLOAD'}),
+    # starting the scanner when an episode is snatched doesn't make any sense
+    nmj_notifier: ('USE_NMJ', {NOTIFY_DOWNLOAD: 'USE_NMJ'}),
+}
+
+def _notifies_on(notifier, event):
+    """
+    Returns True if the notifier is turned on for the given NOTIFY_* event.
+    """
+
+    (use_setting, event_settings) = _notify_settings[notifier]
+
+    if event not in event_settings:
+        return False
+
+    return bool(getattr(sickbeard, use_setting) and getattr(sickbeard, event_settings[event]))
+
+def _hosts(notifier):
+    """
+    XBMC and Plex can be given a list of hosts, each of them gets its own queue item so that only
+    the ones which fail are tried again and one that's down doesn't hold back the rest. Everything
+    else is queued once, with no host.
+    """
+
+    if isinstance(notifier, xbmc.XBMCNotifier):
+        return notifier.get_hosts()
+
+    return [None]
+
+def _queue(notifier, action, args=(), key=None, delay=0, host=None):
+
+    name = notifier.__class__.__name__
+    if host:
+        name += u" on " + host
+        args = args + (host,)
+
+    # before the queue is running (or if it never will be) just do it now
+    if sickbeard.notifyQueueScheduler:
+        sickbeard.notifyQueueScheduler.action.add_item(name, action, args, key, delay)
+    else:
+        action(*args)
+
 def notify_download(ep_name):
-    for n in notifiers:
-        n.notify_download(ep_name)
-    notifo_notifier.notify_download(ep_name)
+    for n in notifiers + [notifo_notifier]:
+        if _notifies_on(n, NOTIFY_DOWNLOAD):
+            for host in _hosts(n):
+                _queue(n, n.notify_download, (ep_name,), host=host)
 
 def notify_snatch(ep_name):
-    for n in notifiers:
-        n.notify_snatch(ep_name)
-    notifo_notifier.notify_snatch(ep_name)
+    for n in notifiers + [notifo_notifier]:
+        if _notifies_on(n, NOTIFY_SNATCH):
+            for host in _hosts(n):
+                _queue(n, n.notify_snatch, (ep_name,), host=host)
+
+def update_library(show_name):
+    """
+    Asks XBMC and Plex to rescan their libraries. The updates are held for a minute so that a batch
+    of episodes only causes one update per show on each host (XBMC) or one update in total (Plex).
+    """
+
+    if sickbeard.USE_XBMC and sickbeard.XBMC_UPDATE_LIBRARY:
+        for host in xbmc_notifier.get_hosts():
+            _queue(xbmc_notifier, xbmc_notifier.update_library, (show_name,), key=('xbmc', show_name, host), delay=notify_queue.LIBRARY_UPDATE_DELAY, host=host)
+
+    if sickbeard.USE_PLEX and sickbeard.PLEX_UPDATE_LIBRARY:
+        _queue(plex_notifier, plex_notifier.update_library, key=('plex',), delay=notify_queue.LIBRARY_UPDATE_DELAY)
 
 def notify(type, message):
 
@@ -32,11 +32,11 @@ class GrowlNotifier:
 
     def notify_snatch(self, ep_name):
         if sickbeard.GROWL_NOTIFY_ONSNATCH:
-            self._sendGrowl(common.notifyStrings[common.NOTIFY_SNATCH], ep_name)
+            return self._sendGrowl(common.notifyStrings[common.NOTIFY_SNATCH], ep_name)
 
     def notify_download(self, ep_name):
         if sickbeard.GROWL_NOTIFY_ONDOWNLOAD:
-            self._sendGrowl(common.notifyStrings[common.NOTIFY_DOWNLOAD], ep_name)
+            return self._sendGrowl(common.notifyStrings[common.NOTIFY_DOWNLOAD], ep_name)
 
     def _send_growl(self, options,message=None):
     
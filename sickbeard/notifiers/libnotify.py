@@ -75,11 +75,11 @@ class LibnotifyNotifier:
 
     def notify_snatch(self, ep_name):
         if sickbeard.LIBNOTIFY_NOTIFY_ONSNATCH:
-            self._notify(common.notifyStrings[common.NOTIFY_SNATCH], ep_name)
+            return self._notify(common.notifyStrings[common.NOTIFY_SNATCH], ep_name)
 
     def notify_download(self, ep_name):
         if sickbeard.LIBNOTIFY_NOTIFY_ONDOWNLOAD:
-            self._notify(common.notifyStrings[common.NOTIFY_DOWNLOAD], ep_name)
+            return self._notify(common.notifyStrings[common.NOTIFY_DOWNLOAD], ep_name)
 
     def test_notify(self):
         return self._notify('Test notification', "This is a test notification from Sick Beard", force=True)
@@ -72,11 +72,11 @@ class NMJNotifier:
         return True
     
     def notify_snatch(self, ep_name):
-        return False
+        return None
         #Not implemented: Start the scanner when snatched does not make any sense
 
     def notify_download(self, ep_name):
-        self._notifyNMJ()
+        return self._notifyNMJ()
 
     def test_notify(self, host, database, mount):
         return self._sendNMJ(host, database, mount)
@@ -58,11 +58,11 @@ class NotifoNotifier:
 
     def notify_snatch(self, ep_name):
         if sickbeard.NOTIFO_NOTIFY_ONSNATCH:
-            self._notifyNotifo(common.notifyStrings[common.NOTIFY_SNATCH]+': '+ep_name)
+            return self._notifyNotifo(common.notifyStrings[common.NOTIFY_SNATCH]+': '+ep_name)
 
     def notify_download(self, ep_name):
         if sickbeard.NOTIFO_NOTIFY_ONDOWNLOAD:
-            self._notifyNotifo(common.notifyStrings[common.NOTIFY_DOWNLOAD]+': '+ep_name)       
+            return self._notifyNotifo(common.notifyStrings[common.NOTIFY_DOWNLOAD]+': '+ep_name)
 
     def _notifyNotifo(self, message=None, username=None, apisecret=None, force=False):
         if not sickbeard.USE_NOTIFO and not force:
@@ -76,7 +76,6 @@ class NotifoNotifier:
 
         logger.log(u"Sending notification for " + message, logger.DEBUG)
 
-        self._sendNotifo(message, username, apisecret)
-        return True
+        return self._sendNotifo(message, username, apisecret)
 
 notifier = NotifoNotifier
@@ -25,20 +25,20 @@ from sickbeard.notifiers.xbmc import XBMCNotifier
 
 class PLEXNotifier(XBMCNotifier):
 
-    def notify_snatch(self, ep_name):
+    def notify_snatch(self, ep_name, host=None):
         if sickbeard.PLEX_NOTIFY_ONSNATCH:
-            self._notifyXBMC(ep_name, common.notifyStrings[common.NOTIFY_SNATCH])
+            return self._notifyXBMC(ep_name, common.notifyStrings[common.NOTIFY_SNATCH], host)
 
-    def notify_download(self, ep_name):
+    def notify_download(self, ep_name, host=None):
         if sickbeard.PLEX_NOTIFY_ONDOWNLOAD:
-            self._notifyXBMC(ep_name, common.notifyStrings[common.NOTIFY_DOWNLOAD])
+            return self._notifyXBMC(ep_name, common.notifyStrings[common.NOTIFY_DOWNLOAD], host)
 
     def test_notify(self, host, username, password):
         return self._notifyXBMC("Testing Plex notifications from Sick Beard", "Test Notification", host, username, password, force=True)
 
     def update_library(self):
         if sickbeard.PLEX_UPDATE_LIBRARY:
-            self._update_library()
+            return self._update_library()
 
     def _username(self):
         return sickbeard.PLEX_USERNAME
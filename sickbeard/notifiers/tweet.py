@@ -44,11 +44,11 @@ class TwitterNotifier:
     
     def notify_snatch(self, ep_name):
         if sickbeard.TWITTER_NOTIFY_ONSNATCH:
-            self._notifyTwitter(common.notifyStrings[common.NOTIFY_SNATCH]+': '+ep_name)
+            return self._notifyTwitter(common.notifyStrings[common.NOTIFY_SNATCH]+': '+ep_name)
 
     def notify_download(self, ep_name):
         if sickbeard.TWITTER_NOTIFY_ONDOWNLOAD:
-            self._notifyTwitter(common.notifyStrings[common.NOTIFY_DOWNLOAD]+': '+ep_name)
+            return self._notifyTwitter(common.notifyStrings[common.NOTIFY_DOWNLOAD]+': '+ep_name)
 
     def test_notify(self):
         return self._notifyTwitter("This is a test notification from Sick Beard", force=True)
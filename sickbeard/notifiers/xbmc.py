@@ -37,25 +37,42 @@ except ImportError:
 
 class XBMCNotifier:
 
-    def notify_snatch(self, ep_name):
+    def notify_snatch(self, ep_name, host=None):
         if sickbeard.XBMC_NOTIFY_ONSNATCH:
-            self._notifyXBMC(ep_name, common.notifyStrings[common.NOTIFY_SNATCH])
+            return self._notifyXBMC(ep_name, common.notifyStrings[common.NOTIFY_SNATCH], host)
 
-    def notify_download(self, ep_name):
+    def notify_download(self, ep_name, host=None):
         if sickbeard.XBMC_NOTIFY_ONDOWNLOAD:
-            self._notifyXBMC(ep_name, common.notifyStrings[common.NOTIFY_DOWNLOAD])
+            return self._notifyXBMC(ep_name, common.notifyStrings[common.NOTIFY_DOWNLOAD], host)
 
     def test_notify(self, host, username, password):
         return self._notifyXBMC("Testing XBMC notifications from Sick Beard", "Test Notification", host, username, password, force=True)
 
-    def update_library(self, show_name):
+    def update_library(self, show_name, host=None):
+        """
+        Updates the given host, or all of them if it's None. Returns False if a host couldn't be
+        updated at all, so the update can be tried again later
+        """
+        result = True
         if sickbeard.XBMC_UPDATE_LIBRARY:
-            for curHost in [x.strip() for x in sickbeard.XBMC_HOST.split(",")]:
+            if host:
+                hosts = [host]
+            else:
+                hosts = self.get_hosts()
+            for curHost in hosts:
                 # do a per-show update first, if possible
                 if not self._update_library(curHost, showName=show_name) and sickbeard.XBMC_UPDATE_FULL:
                     # do a full update if requested
                     logger.log(u"Update of show directory failed on " + curHost + ", trying full update as requested", logger.ERROR)
-                    self._update_library(curHost)
+                    if not self._update_library(curHost):
+                        result = False
+        return result
+
+    def get_hosts(self):
+        """
+        Returns the list of hosts notifications are sent to
+        """
+        return [x.strip() for x in self._hostname().split(",") if x.strip()]
 
     def _username(self):
         return sickbeard.XBMC_USERNAME
@@ -129,11 +146,16 @@ class XBMCNotifier:
         logger.log(u"Sending notification for " + input, logger.DEBUG)
     
         fileString = title + "," + input
-    
+
+        result = True
         for curHost in [x.strip() for x in host.split(",")]:
             command = {'command': 'ExecBuiltIn', 'parameter': 'Notification(' +fileString + ')' }
             logger.log(u"Sending notification to XBMC via host: "+ curHost +"username: "+ username + " password: " + password, logger.DEBUG)
-            return self._sendToXBMC(command, curHost, username, password)
+            # _sendToXBMC gives back an empty response if the host couldn't be reached
+            if not self._sendToXBMC(command, curHost, username, password):
+                result = False
+
+        return result
 
     def _update_library(self, host, showName=None):
     
@@ -0,0 +1,149 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import with_statement
+
+import time
+import threading
+import traceback
+
+from sickbeard import logger
+
+# don't let notifications pile up forever if something is badly broken
+MAX_QUEUE_SIZE = 200
+
+# a failed notification is retried after RETRY_DELAY, 2*RETRY_DELAY, 4*RETRY_DELAY, ... seconds
+RETRY_DELAY = 30
+MAX_ATTEMPTS = 4
+
+# library updates are held this long so several episodes of a show only cause one update
+LIBRARY_UPDATE_DELAY = 60
+
+class NotifyQueueItem:
+    """
+    A single call to a notifier which will be retried if it fails.
+    """
+
+    def __init__(self, notifier_name, action, args, key=None):
+        self.notifier_name = notifier_name
+        self.action = action
+        self.args = args
+
+        # items with the same key are merged together while they're waiting
+        self.key = key
+
+        self.attempts = 0
+        self.next_try = time.time()
+
+    def __str__(self):
+        return self.notifier_name + " " + self.action.__name__
+
+class NotifyQueue:
+    """
+    Sends notifications and library updates in the background so nothing else has to wait on
+    remote hosts. Meant to be run by a Scheduler.
+    """
+
+    def __init__(self):
+        self.amActive = False
+
+        self.queue = []
+        self.lock = threading.Lock()
+
+        # notifier name -> time before which it won't be tried again
+        self.backoff = {}
+
+    def add_item(self, notifier_name, action, args=(), key=None, delay=0):
+        """
+        Queues action(*args) to be called in the background.
+
+        If key is given and an item with the same key is already waiting then nothing new is queued.
+        """
+
+        with self.lock:
+
+            if key != None and key in [x.key for x in self.queue]:
+                logger.log(u"Merging "+notifier_name+" request with one that's already queued", logger.DEBUG)
+                return
+
+            if len(self.queue) >= MAX_QUEUE_SIZE:
+                logger.log(u"Notification queue is full, dropping "+notifier_name+" notification", logger.ERROR)
+                return
+
+            item = NotifyQueueItem(notifier_name, action, args, key)
+            item.next_try += delay
+            self.queue.append(item)
+
+    def run(self):
+
+        self.amActive = True
+
+        try:
+            while True:
+                item = self._next_item()
+                if not item:
+                    break
+                self._execute(item)
+        finally:
+            self.amActive = False
+
+    def _next_item(self):
+        """
+        Takes the oldest item that's due and whose notifier isn't backing off out of the queue.
+        """
+
+        now = time.time()
+
+        with self.lock:
+            for item in self.queue:
+                if item.next_try > now or self.backoff.get(item.notifier_name, 0) > now:
+                    continue
+                self.queue.remove(item)
+                return item
+
+        return None
+
+    def _execute(self, item):
+
+        item.attempts += 1
+
+        try:
+            result = item.action(*item.args)
+        except Exception, e:
+            logger.log(u"Error sending "+str(item)+": "+str(e).decode('utf-8'), logger.DEBUG)
+            logger.log(traceback.format_exc(), logger.DEBUG)
+            result = False
+
+        # notifiers that don't report anything are assumed to have worked
+        if result != False:
+            if item.notifier_name in self.backoff:
+                del self.backoff[item.notifier_name]
+            return
+
+        if item.attempts >= MAX_ATTEMPTS:
+            logger.log(u"Giving up on "+str(item)+" after "+str(item.attempts)+" attempts", logger.ERROR)
+            return
+
+        delay = RETRY_DELAY * 2 ** (item.attempts - 1)
+        logger.log(u"Unable to send "+str(item)+", trying again in "+str(delay)+" seconds", logger.MESSAGE)
+
+        item.next_try = time.time() + delay
+        self.backoff[item.notifier_name] = item.next_try
+
+        with self.lock:
+            self.queue.append(item)
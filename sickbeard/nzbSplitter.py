@@ -17,9 +17,9 @@
 # along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
 
 import urllib2
+import StringIO
 
 import xml.etree.cElementTree as etree
-import xml.etree
 import re
 
 from name_parser.parser import NameParser, InvalidNameException
@@ -27,62 +27,120 @@ from name_parser.parser import NameParser, InvalidNameException
 from sickbeard import logger, classes, helpers
 from sickbeard.common import *
 
-def getSeasonNZBs(name, urlData, season):
+# the tag of a file in an nzb, with or without the nzb namespace
+NZB_FILE_REGEX = re.compile('^(?:\{(http:\/\/[A-Za-z0-9_\.\/]+\/nzb)\})?file$')
 
-    try:
-        showXML = etree.ElementTree(etree.XML(urlData))
-    except SyntaxError:
-        logger.log(u"Unable to parse the XML of "+name+", not splitting it", logger.ERROR)
-        return ({},'')
+def _episodeRegex(name, season):
+    """
+    Returns a compiled regex matching the episode names in the subjects of the files in a season
+    NZB, or None if the NZB's name doesn't look like a scene season name.
+    """
 
     filename = name.replace(".nzb", "")
 
-    nzbElement = showXML.getroot()
-
     regex = '([\w\._\ ]+)[\. ]S%02d[\. ]([\w\._\-\ ]+)[\- ]([\w_\-\ ]+?)' % season
 
     sceneNameMatch = re.search(regex, filename, re.I)
-    if sceneNameMatch:
-        showName, qualitySection, groupName = sceneNameMatch.groups()
-    else:
-        logger.log(u"Unable to parse "+name+" into a scene name. If it's a valid one log a bug.", logger.ERROR)
-        return ({},'')
+    if not sceneNameMatch:
+        return None
+
+    showName, qualitySection, groupName = sceneNameMatch.groups()
 
     regex = '(' + re.escape(showName) + '\.S%02d(?:[E0-9]+)\.[\w\._]+\-\w+' % season + ')'
     regex = regex.replace(' ', '.')
 
-    epFiles = {}
-    xmlns = None
+    return re.compile(regex, re.I)
 
-    for curFile in nzbElement.getchildren():
-        xmlnsMatch = re.match("\{(http:\/\/[A-Za-z0-9_\.\/]+\/nzb)\}file", curFile.tag)
-        if not xmlnsMatch:
-            continue
-        else:
-            xmlns = xmlnsMatch.group(1)
-        match = re.search(regex, curFile.get("subject"), re.I)
-        if not match:
-            #print curFile.get("subject"), "doesn't match", regex
-            continue
-        curEp = match.group(1)
-        if curEp not in epFiles:
-            epFiles[curEp] = [curFile]
+def stripNS(element, ns):
+    element.tag = element.tag.replace("{"+ns+"}", "")
+    for curChild in element.getchildren():
+        stripNS(curChild, ns)
+
+    return element
+
+class EpisodeNZB:
+    """
+    One episode's NZB, written out a file at a time as they're found.
+    """
+
+    def __init__(self, xmlns):
+        self.xmlns = xmlns
+        self.data = StringIO.StringIO()
+
+        self.data.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        if xmlns:
+            self.data.write('<nzb xmlns="'+xmlns+'">')
         else:
-            epFiles[curEp].append(curFile)
+            self.data.write('<nzb>')
+
+    def addFile(self, fileElement):
+
+        if self.xmlns:
+            stripNS(fileElement, self.xmlns)
+
+        # non-ascii characters come out as character references so this is fine in a utf-8 doc
+        self.data.write(etree.tostring(fileElement))
+
+    def getvalue(self):
+        return self.data.getvalue() + '</nzb>'
+
+def splitNZB(name, nzbFile, season, wantEpisode=None):
+    """
+    Reads a season NZB from nzbFile and splits it into one NZB per episode, going through it once
+    and only keeping one <file> in memory at a time besides the NZBs being written.
+
+    name: the name of the season NZB
+    nzbFile: a file-like object to read the NZB from
+    season: the season number
+    wantEpisode: optional function taking an episode name and returning False if it should be skipped
+
+    Returns a dict of episode name -> NZB string.
+    """
+
+    epRegex = _episodeRegex(name, season)
+    if not epRegex:
+        logger.log(u"Unable to parse "+name+" into a scene name. If it's a valid one log a bug.", logger.ERROR)
+        return {}
+
+    epNZBs = {}
+    skipped = set()
+
+    root = None
+
+    try:
+        for (event, curElement) in etree.iterparse(nzbFile, events=('start', 'end')):
+
+            if event == 'start':
+                if root == None:
+                    root = curElement
+                continue
 
-    return (epFiles, xmlns)
+            fileMatch = NZB_FILE_REGEX.match(curElement.tag)
+            if not fileMatch or curElement.get("subject") == None:
+                continue
 
-def createNZBString(fileElements, xmlns):
+            match = epRegex.search(curElement.get("subject"))
 
-    rootElement = etree.Element("nzb")
-    if xmlns:
-        rootElement.set("xmlns", xmlns)
+            if match:
+                curEp = match.group(1)
 
-    for curFile in fileElements:
-        rootElement.append(stripNS(curFile, xmlns))
+                if curEp not in epNZBs and curEp not in skipped:
+                    if wantEpisode and not wantEpisode(curEp):
+                        skipped.add(curEp)
+                    else:
+                        epNZBs[curEp] = EpisodeNZB(fileMatch.group(1))
 
-    return xml.etree.ElementTree.tostring(rootElement, 'utf-8')
+                if curEp in epNZBs:
+                    epNZBs[curEp].addFile(curElement)
 
+            # we're done with this file so don't let the tree hang on to it
+            root.clear()
+
+    except SyntaxError:
+        logger.log(u"Unable to parse the XML of "+name+", not splitting it", logger.ERROR)
+        return {}
+
+    return dict([(x, epNZBs[x].getvalue()) for x in epNZBs])
 
 def saveNZB(nzbName, nzbString):
 
@@ -90,22 +148,8 @@ def saveNZB(nzbName, nzbString):
     nzb_fh.write(nzbString)
     nzb_fh.close()
 
-def stripNS(element, ns):
-    element.tag = element.tag.replace("{"+ns+"}", "")
-    for curChild in element.getchildren():
-        stripNS(curChild, ns)
-
-    return element
-
-
 def splitResult(result):
 
-    try:
-        urlData = helpers.getURL(result.url)
-    except urllib2.URLError, e:
-        logger.log(u"Unable to load url "+result.url+", can't download season NZB", logger.ERROR)
-        return False
-
     # parse the season ep name
     try:
         np = NameParser(False)
@@ -117,11 +161,10 @@ def splitResult(result):
     # bust it up
     season = parse_result.season_number if parse_result.season_number != None else 1
 
-    separateNZBs, xmlns = getSeasonNZBs(result.name, urlData, season)
-
-    resultList = []
+    # the parsed names of the episodes we want
+    wantedEps = {}
 
-    for newNZB in separateNZBs:
+    def wantEpisode(newNZB):
 
         logger.log(u"Split out "+newNZB+" from "+result.name, logger.DEBUG)
 
@@ -136,23 +179,37 @@ def splitResult(result):
         # make sure the result is sane
         if (parse_result.season_number != None and parse_result.season_number != season) or (parse_result.season_number == None and season != 1):
             logger.log(u"Found "+newNZB+" inside "+result.name+" but it doesn't seem to belong to the same season, ignoring it", logger.WARNING)
-            continue
+            return False
         elif len(parse_result.episode_numbers) == 0:
             logger.log(u"Found "+newNZB+" inside "+result.name+" but it doesn't seem to be a valid episode NZB, ignoring it", logger.WARNING)
-            continue
+            return False
 
-        wantEp = True
         for epNo in parse_result.episode_numbers:
             if not result.extraInfo[0].wantEpisode(season, epNo, result.quality):
                 logger.log(u"Ignoring result "+newNZB+" because we don't want an episode that is "+Quality.qualityStrings[result.quality], logger.DEBUG)
-                wantEp = False
-                break
-        if not wantEp:
-            continue
+                return False
+
+        wantedEps[newNZB] = parse_result
+        return True
+
+    try:
+        nzbFile = helpers.getURLStream(result.url)
+    except (urllib2.URLError, IOError), e:
+        logger.log(u"Unable to load url "+result.url+", can't download season NZB", logger.ERROR)
+        return False
+
+    try:
+        separateNZBs = splitNZB(result.name, nzbFile, season, wantEpisode)
+    finally:
+        nzbFile.close()
+
+    resultList = []
+
+    for newNZB in sorted(separateNZBs.keys()):
 
         # get all the associated episode objects
         epObjList = []
-        for curEp in parse_result.episode_numbers:
+        for curEp in wantedEps[newNZB].episode_numbers:
             epObjList.append(result.extraInfo[0].getEpisode(season, curEp))
 
         # make a result
@@ -160,8 +217,8 @@ def splitResult(result):
         curResult.name = newNZB
         curResult.provider = result.provider
         curResult.quality = result.quality
-        curResult.extraInfo = [createNZBString(separateNZBs[newNZB], xmlns)]
+        curResult.extraInfo = [separateNZBs[newNZB]]
 
         resultList.append(curResult)
 
-    return resultList
\ No newline at end of file
+    return resultList
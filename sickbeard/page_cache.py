@@ -0,0 +1,78 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+# Holds rendered parts of web pages which are expensive to build, like the rows of the show list on
+# the home page. Each one is kept along with the resource_versions tag of the data it was built
+# from, so anything which bumps those resources (saving a show or an episode, changing a status)
+# makes it get built again the next time it's shown.
+
+from __future__ import with_statement
+
+import datetime
+import threading
+
+from sickbeard import resource_versions
+from sickbeard import episode_stats
+
+class FragmentCache:
+    """
+    Keeps the latest version of each named fragment.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        # name -> (key, value)
+        self.fragments = {}
+
+    def get(self, name, key, generator, *args):
+        """
+        Returns the value stored for name if it was stored with key, otherwise calls generator(*args)
+        to build it and stores that.
+        """
+
+        with self.lock:
+            if name in self.fragments and self.fragments[name][0] == key:
+                return self.fragments[name][1]
+
+        value = generator(*args)
+
+        with self.lock:
+            self.fragments[name] = (key, value)
+
+        return value
+
+fragments = FragmentCache()
+
+def get(name, resources, generator, *args):
+    """
+    Returns the fragment made by generator(*args), building it again only when one of resources has
+    changed, the day has changed (for anything based on airdates) or it's called with other args.
+    """
+
+    # the tag has to be taken before building so a change made meanwhile isn't stored as current
+    key = (resource_versions.getTag(resources), datetime.date.today().toordinal(), args)
+
+    return fragments.get(name, key, generator, *args)
+
+def episodeTotals():
+    """
+    Returns the (downloaded, total) episode counts shown in the footer of every page.
+    """
+
+    return get('episodeTotals', [resource_versions.EPISODES], episode_stats.episodeTotals)
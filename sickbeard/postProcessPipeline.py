@@ -0,0 +1,196 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import with_statement
+
+import os.path
+import threading
+import traceback
+import Queue
+
+from sickbeard import logger, exceptions
+
+from sickbeard import encodingKludge as ek
+
+# number of worker threads for each stage
+ANALYSIS_THREADS = 3
+TRANSFER_THREADS = 2
+FINISH_THREADS = 2
+
+class PostProcessPipeline:
+    """
+    Runs a batch of PostProcessor objects through their three stages in parallel:
+
+    analyze - name parsing and DB/TVDB lookups
+    transfer - replacing existing files and moving the new one into place
+    finish - notifications, metadata and extra scripts
+
+    Each stage has its own pool of workers so a slow lookup or notifier doesn't hold up the files
+    behind it. Transfers onto the same destination disk are done one at a time, and so are transfers of
+    the same episode.
+    """
+
+    def __init__(self, processors):
+        self.processors = processors
+
+        # one entry per processor, in the same order
+        self.results = [False] * len(processors)
+
+        self._device_locks = {}
+        self._device_lock_guard = threading.Lock()
+
+        # (tvdbid, season, episode) -> lock, and the episodes that have had a file put in place
+        self._episode_locks = {}
+        self._transferred = set()
+
+        self._analyze_queue = Queue.Queue()
+        self._transfer_queue = Queue.Queue()
+        self._finish_queue = Queue.Queue()
+
+    def run(self):
+        """
+        Processes every file and returns a list of results (True if the file was processed) in the
+        same order as the processors that were given.
+        """
+
+        # no sense starting threads for a single file
+        if len(self.processors) == 1:
+            self._analyze(0, self._transfer)
+            return self.results
+
+        stages = [(self._analyze_queue, lambda i: self._analyze(i, self._transfer_queue.put), ANALYSIS_THREADS),
+                  (self._transfer_queue, lambda i: self._transfer(i, self._finish_queue.put), TRANSFER_THREADS),
+                  (self._finish_queue, self._finish, FINISH_THREADS),
+                  ]
+
+        workers = []
+        for (cur_queue, cur_action, cur_thread_count) in stages:
+            for x in range(cur_thread_count):
+                cur_thread = threading.Thread(None, self._worker, "POSTPROCESSER-"+str(len(workers)), (cur_queue, cur_action))
+                cur_thread.setDaemon(True)
+                cur_thread.start()
+                workers.append((cur_queue, cur_thread))
+
+        for i in range(len(self.processors)):
+            self._analyze_queue.put(i)
+
+        # each stage only feeds the next one so once a queue is drained everything has moved on
+        for (cur_queue, cur_action, cur_thread_count) in stages:
+            cur_queue.join()
+
+        for (cur_queue, cur_thread) in workers:
+            cur_queue.put(None)
+        for (cur_queue, cur_thread) in workers:
+            cur_thread.join()
+
+        return self.results
+
+    def _worker(self, queue, action):
+        while True:
+            index = queue.get()
+
+            try:
+                if index == None:
+                    return
+                action(index)
+            finally:
+                queue.task_done()
+
+    def _log_exception(self, processor, e):
+        processor._log(u"Error post-processing "+processor.file_path+": "+str(e).decode('utf-8'), logger.ERROR)
+        logger.log(traceback.format_exc(), logger.DEBUG)
+
+    def _get_device_lock(self, ep_obj):
+        """
+        Returns the lock for the disk that the episode's show dir is on.
+        """
+
+        try:
+            device = ek.ek(os.stat, ep_obj.show._location).st_dev
+        except OSError:
+            device = ep_obj.show._location
+
+        with self._device_lock_guard:
+            if device not in self._device_locks:
+                self._device_locks[device] = threading.Lock()
+            return self._device_locks[device]
+
+    def _get_episode_lock(self, ep_key):
+
+        with self._device_lock_guard:
+            if ep_key not in self._episode_locks:
+                self._episode_locks[ep_key] = threading.Lock()
+            return self._episode_locks[ep_key]
+
+    def _analyze(self, index, next_stage):
+
+        processor = self.processors[index]
+
+        try:
+            result = processor.analyze()
+        except exceptions.PostProcessingFailed:
+            result = False
+        except Exception, e:
+            self._log_exception(processor, e)
+            result = False
+
+        if result:
+            next_stage(index)
+
+    def _transfer(self, index, next_stage=None):
+
+        processor = self.processors[index]
+
+        ep_key = (processor.ep_obj.show.tvdbid, processor.ep_obj.season, processor.ep_obj.episode)
+
+        try:
+            with self._get_episode_lock(ep_key):
+
+                # only the first file for a snatched episode counts as the snatched download, any
+                # others have to be better than it to replace it
+                if ep_key in self._transferred:
+                    processor.in_history = False
+
+                with self._get_device_lock(processor.ep_obj):
+                    result = processor.transfer()
+
+                if result:
+                    self._transferred.add(ep_key)
+        except exceptions.PostProcessingFailed:
+            result = False
+        except Exception, e:
+            self._log_exception(processor, e)
+            result = False
+
+        # once the file is in place the processing counts as a success, the rest is just extras
+        self.results[index] = result
+
+        if result:
+            if next_stage:
+                next_stage(index)
+            else:
+                self._finish(index)
+
+    def _finish(self, index):
+
+        processor = self.processors[index]
+
+        try:
+            processor.finish()
+        except Exception, e:
+            self._log_exception(processor, e)
@@ -69,6 +69,11 @@ class PostProcessor(object):
         self.in_history = False
         self.release_group = None
         self.is_proper = False
+
+        # filled in by analyze() for the later stages
+        self.ep_obj = None
+        self.new_ep_quality = None
+        self.priority_download = False
     
         self.log = ''
     
@@ -197,7 +202,8 @@ class PostProcessor(object):
 
             self._log(u"Moving file from "+cur_file_path+" to "+new_file_path, logger.DEBUG)
             try:
-                helpers.moveFile(cur_file_path, new_file_path)
+                transfer_result = helpers.moveFile(cur_file_path, new_file_path)
+                self._log(u"Moved "+cur_file_path+": "+helpers.transferSpeed(transfer_result), logger.DEBUG)
                 helpers.chmodAsParent(new_file_path)
             except (IOError, OSError), e:
                 self._log("Unable to move file "+cur_file_path+" to "+new_file_path+": "+str(e).decode('utf-8'), logger.ERROR)
@@ -217,8 +223,12 @@ class PostProcessor(object):
 
             self._log(u"Copying file from "+cur_file_path+" to "+new_file_path, logger.DEBUG)
             try:
-                helpers.copyFile(cur_file_path, new_file_path)
-                helpers.chmodAsParent(new_file_path)
+                transfer_result = helpers.copyFile(cur_file_path, new_file_path, sickbeard.USE_HARDLINKS)
+                self._log(u"Copied "+cur_file_path+": "+helpers.transferSpeed(transfer_result), logger.DEBUG)
+
+                # a hardlink shares its permissions with the original so leave them alone
+                if transfer_result.method != 'hardlink':
+                    helpers.chmodAsParent(new_file_path)
             except (IOError, OSError), e:
                 logger.log("Unable to copy file "+cur_file_path+" to "+new_file_path+": "+str(e).decode('utf-8'), logger.ERROR)
                 raise e
@@ -278,10 +288,8 @@ class PostProcessor(object):
         if self.folder_name:
             names.append(self.folder_name)
 
-        myDB = db.DBConnection()
-    
         for curName in names:
-            sql_results = myDB.select("SELECT * FROM history WHERE resource LIKE ?", [re.sub("[\.\-\ ]", "_", curName)])
+            sql_results = history.findByResource(curName)
     
             if len(sql_results) == 0:
                 continue
@@ -568,13 +576,14 @@ class PostProcessor(object):
             self._log(u"SB snatched this episode so I'm marking it as priority", logger.DEBUG)
             return True
         
+        old_ep_status, old_ep_quality = common.Quality.splitCompositeStatus(ep_obj.status)
+
         # if the user downloaded it manually and it's higher quality than the existing episode then it's priority
-        if new_ep_quality > ep_obj and new_ep_quality != common.Quality.UNKNOWN:
+        if new_ep_quality > old_ep_quality and new_ep_quality != common.Quality.UNKNOWN:
             self._log(u"This was manually downloaded but it appears to be better quality than what we have so I'm marking it as priority", logger.DEBUG)
             return True
         
         # if the user downloaded it manually and it appears to be a PROPER/REPACK then it's priority
-        old_ep_status, old_ep_quality = common.Quality.splitCompositeStatus(ep_obj.status)
         if self.is_proper and new_ep_quality >= old_ep_quality:
             self._log(u"This was manually downloaded but it appears to be a proper so I'm marking it as priority", logger.DEBUG)
             return True 
@@ -585,6 +594,23 @@ class PostProcessor(object):
         """
         Post-process a given file
         """
+
+        if not self.analyze():
+            return False
+
+        if not self.transfer():
+            return False
+
+        self.finish()
+
+        return True
+
+    def analyze(self):
+        """
+        Figures out which episode the file belongs to and what quality it is without touching the disk.
+        
+        Returns True if the file can be moved into place with transfer().
+        """
         
         self._log(u"Processing "+self.file_path+" ("+str(self.nzb_name)+")")
         
@@ -604,11 +630,51 @@ class PostProcessor(object):
         # get the quality of the episode we're processing
         new_ep_quality = self._get_quality(ep_obj)
         logger.log(u"Quality of the episode we're processing: "+str(new_ep_quality), logger.DEBUG)
+
+        self.ep_obj = ep_obj
+        self.new_ep_quality = new_ep_quality
+
+        return True
+
+    def _own_changes(self, func):
+        """
+        Calls func with the folder watcher told that the changes to the show dir are ours.
+        """
+
+        # avoid a circular import
+        from sickbeard import dirWatcher
+
+        show_dir = self.ep_obj.show._location
+
+        dirWatcher.startOwnChanges(show_dir)
+        try:
+            return func()
+        finally:
+            dirWatcher.endOwnChanges(show_dir)
+
+    def transfer(self):
+        """
+        Replaces any existing episode file with the new one, moves (or copies) it into the show dir and
+        updates the DB and history. Must only be called after a successful analyze().
         
-        # see if this is a priority download (is it snatched, in history, or PROPER)
-        priority_download = self._is_priority(ep_obj, new_ep_quality) 
+        Returns True if the file was put in place.
+        """
+
+        return self._own_changes(self._transfer)
+
+    def _transfer(self):
+
+        ep_obj = self.ep_obj
+        new_ep_quality = self.new_ep_quality
+
+        # see if this is a priority download (is it snatched, in history, or PROPER). This is done here
+        # rather than in analyze() so it sees the status left by any file for the same episode that was
+        # transferred before this one.
+        with ep_obj.lock:
+            priority_download = self._is_priority(ep_obj, new_ep_quality)
         self._log(u"Is ep a priority download: "+str(priority_download), logger.DEBUG)
-        
+        self.priority_download = priority_download
+
         # set the status of the episodes
         for curEp in [ep_obj] + ep_obj.relatedEps:
             curEp.status = common.Quality.compositeStatus(common.SNATCHED, new_ep_quality)
@@ -692,6 +758,19 @@ class PostProcessor(object):
         # log it to history
         history.logDownload(ep_obj, self.file_path)
 
+        return True
+
+    def finish(self):
+        """
+        Sends notifications, writes metadata and runs the extra scripts for an episode that was transferred.
+        """
+
+        self._own_changes(self._finish)
+
+    def _finish(self):
+
+        ep_obj = self.ep_obj
+
         # send notifications
         notifiers.notify_download(ep_obj.prettyName(True))
 
@@ -699,15 +778,10 @@ class PostProcessor(object):
         ep_obj.createMetaFiles()
         ep_obj.saveToDB()
 
-        # do the library update
-        notifiers.xbmc_notifier.update_library(ep_obj.show.name)
-
-        # do the library update for Plex Media Server
-        notifiers.plex_notifier.update_library()
+        # do the library update for XBMC and Plex Media Server
+        notifiers.update_library(ep_obj.show.name)
 
         # run extra_scripts
         self._run_extra_scripts(ep_obj)
-
-        return True
         
         # e
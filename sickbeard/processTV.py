@@ -20,24 +20,121 @@ from __future__ import with_statement
 
 import os, os.path
 import shutil
+import threading
 
-from sickbeard import postProcessor
-from sickbeard import db, helpers, exceptions
+from sickbeard import postProcessor, postProcessPipeline
+from sickbeard import db, helpers, exceptions, resource_versions
 
 from sickbeard import encodingKludge as ek
 
 from sickbeard import logger
 from sickbeard.common import *
 
+# held by the automatic processors so the same download isn't picked up twice at once
+processLock = threading.Lock()
+
+# the resolved, lowercased show locations, rebuilt when the show locations change
+_showDirs = set()
+_showDirsLocations = None
+_showDirsVersion = None
+_showDirsLock = threading.Lock()
+
+def _getShowDirs():
+    """
+    Returns the set of resolved show locations. The DB is only checked again after a show has been
+    saved or deleted, and the locations are only resolved again if one of them actually changed.
+    """
+
+    global _showDirs, _showDirsLocations, _showDirsVersion
+
+    with _showDirsLock:
+
+        curVersion = resource_versions.getVersion(resource_versions.SHOWS)
+        if curVersion == _showDirsVersion:
+            return _showDirs
+
+        myDB = db.DBConnection()
+        locations = sorted([x["location"] for x in myDB.select("SELECT location FROM tv_shows")])
+
+        if locations != _showDirsLocations:
+            logger.log(u"Show locations have changed, resolving all "+str(len(locations))+" of them again", logger.DEBUG)
+            _showDirs = set([ek.ek(os.path.realpath, x).lower() for x in locations])
+            _showDirsLocations = locations
+
+        _showDirsVersion = curVersion
+
+        return _showDirs
+
+def _isInShowDir(dirName):
+    """
+    Returns True if dirName is a show's location or anywhere inside one.
+    """
+
+    showDirs = _getShowDirs()
+
+    curDir = dirName.lower()
+    while True:
+        if curDir in showDirs:
+            return True
+
+        parentDir = ek.ek(os.path.dirname, curDir)
+        if parentDir == curDir:
+            return False
+        curDir = parentDir
+
 def logHelper (logMessage, logLevel=logger.MESSAGE):
     logger.log(logMessage, logLevel)
     return logMessage + u"\n"
 
 def processDir (dirName, nzbName=None, recurse=False):
+    """
+    Post-processes every video file in dirName and its subfolders.
+
+    The folders are scanned first and then all the files found are run through the post-processing
+    pipeline together, so a whole season doesn't have to wait on each episode in turn. The returned
+    log is in the same order it would be if the files were processed one at a time.
+    """
+
+    plan = []
+    _scanDir(dirName, nzbName, plan)
+
+    processors = []
+    for cur_item in plan:
+        if isinstance(cur_item, _FolderFiles):
+            processors += cur_item.processors
+
+    results = {}
+    if processors:
+        pipeline = postProcessPipeline.PostProcessPipeline(processors)
+        results = dict(zip(processors, pipeline.run()))
 
     returnStr = ''
 
-    returnStr += logHelper(u"Processing folder "+dirName, logger.DEBUG)
+    for cur_item in plan:
+        if isinstance(cur_item, _FolderFiles):
+            returnStr += _finishFolder(cur_item, results)
+        else:
+            returnStr += cur_item
+
+    return returnStr
+
+class _FolderFiles:
+    """
+    The video files found directly inside one folder.
+    """
+
+    def __init__(self, dirName, fileList, videoFiles, nzbName):
+        self.dirName = dirName
+        self.fileList = fileList
+        self.processors = [postProcessor.PostProcessor(ek.ek(os.path.join, dirName, x), nzbName) for x in videoFiles]
+
+def _scanDir (dirName, nzbName, plan):
+    """
+    Finds the video files in dirName and its subfolders without processing them. Log messages and
+    a _FolderFiles for each folder are appended to plan in the order they should be reported.
+    """
+
+    plan.append(logHelper(u"Processing folder "+dirName, logger.DEBUG))
 
     # if they passed us a real dir then assume it's the one we want
     if ek.ek(os.path.isdir, dirName):
@@ -47,31 +144,28 @@ def processDir (dirName, nzbName=None, recurse=False):
     elif sickbeard.TV_DOWNLOAD_DIR and ek.ek(os.path.isdir, sickbeard.TV_DOWNLOAD_DIR) \
             and ek.ek(os.path.normpath, dirName) != ek.ek(os.path.normpath, sickbeard.TV_DOWNLOAD_DIR):
         dirName = ek.ek(os.path.join, sickbeard.TV_DOWNLOAD_DIR, ek.ek(os.path.abspath, dirName).split(os.path.sep)[-1])
-        returnStr += logHelper(u"Trying to use folder "+dirName, logger.DEBUG)
+        plan.append(logHelper(u"Trying to use folder "+dirName, logger.DEBUG))
 
     # if we didn't find a real dir then quit
     if not ek.ek(os.path.isdir, dirName):
-        returnStr += logHelper(u"Unable to figure out what folder to process. If your downloader and Sick Beard aren't on the same PC make sure you fill out your TV download dir in the config.", logger.DEBUG)
-        return returnStr
+        plan.append(logHelper(u"Unable to figure out what folder to process. If your downloader and Sick Beard aren't on the same PC make sure you fill out your TV download dir in the config.", logger.DEBUG))
+        return
 
     # TODO: check if it's failed and deal with it if it is
     if ek.ek(os.path.basename, dirName).startswith('_FAILED_'):
-        returnStr += logHelper(u"The directory name indicates it failed to extract, cancelling", logger.DEBUG)
-        return returnStr
+        plan.append(logHelper(u"The directory name indicates it failed to extract, cancelling", logger.DEBUG))
+        return
     elif ek.ek(os.path.basename, dirName).startswith('_UNDERSIZED_'):
-        returnStr += logHelper(u"The directory name indicates that it was previously rejected for being undersized, cancelling", logger.DEBUG)
-        return returnStr
+        plan.append(logHelper(u"The directory name indicates that it was previously rejected for being undersized, cancelling", logger.DEBUG))
+        return
     elif ek.ek(os.path.basename, dirName).startswith('_UNPACK_'):
-        returnStr += logHelper(u"The directory name indicates that this release is in the process of being unpacked, skipping", logger.DEBUG)
-        return returnStr
+        plan.append(logHelper(u"The directory name indicates that this release is in the process of being unpacked, skipping", logger.DEBUG))
+        return
 
     # make sure the dir isn't inside a show dir
-    myDB = db.DBConnection()
-    sqlResults = myDB.select("SELECT * FROM tv_shows")
-    for sqlShow in sqlResults:
-        if dirName.lower().startswith(ek.ek(os.path.realpath, sqlShow["location"]).lower()+os.sep) or dirName.lower() == ek.ek(os.path.realpath, sqlShow["location"]).lower():
-            returnStr += logHelper(u"You're trying to post process an episode that's already been moved to its show dir", logger.ERROR)
-            return returnStr
+    if _isInShowDir(dirName):
+        plan.append(logHelper(u"You're trying to post process an episode that's already been moved to its show dir", logger.ERROR))
+        return
 
     fileList = ek.ek(os.listdir, dirName)
 
@@ -79,30 +173,35 @@ def processDir (dirName, nzbName=None, recurse=False):
     folders = filter(lambda x: ek.ek(os.path.isdir, ek.ek(os.path.join, dirName, x)), fileList)
     videoFiles = filter(helpers.isMediaFile, fileList)
 
-    # recursively process all the folders
+    # recursively scan all the folders
     for curFolder in folders:
-        returnStr += logHelper(u"Recursively processing a folder: "+curFolder, logger.DEBUG)
-        returnStr += processDir(ek.ek(os.path.join, dirName, curFolder), recurse=True)
+        plan.append(logHelper(u"Recursively processing a folder: "+curFolder, logger.DEBUG))
+        _scanDir(ek.ek(os.path.join, dirName, curFolder), None, plan)
+
+    plan.append(_FolderFiles(dirName, fileList, videoFiles, nzbName))
+
+def _finishFolder (folder, results):
+    """
+    Reports the results for the files in one folder and deletes the folder if we're done with it.
+    """
+
+    returnStr = ''
 
-    remainingFolders = filter(lambda x: ek.ek(os.path.isdir, ek.ek(os.path.join, dirName, x)), fileList)
+    dirName = folder.dirName
 
-    # process any files in the dir
-    for cur_video_file_path in videoFiles:
+    # subfolders have already been finished (and maybe deleted) by now
+    remainingFolders = filter(lambda x: ek.ek(os.path.isdir, ek.ek(os.path.join, dirName, x)), folder.fileList)
 
-        cur_video_file_path = ek.ek(os.path.join, dirName, cur_video_file_path)
+    for processor in folder.processors:
 
-        try:
-            processor = postProcessor.PostProcessor(cur_video_file_path, nzbName)
-            process_result = processor.process()
-        except exceptions.PostProcessingFailed:
-            process_result = False
+        cur_video_file_path = processor.file_path
 
-        returnStr += processor.log 
+        returnStr += processor.log
 
         # as long as the postprocessing was successful delete the old folder unless the config wants us not to
-        if process_result:
+        if results.get(processor):
 
-            if len(videoFiles) == 1 and not sickbeard.KEEP_PROCESSED_DIR and \
+            if len(folder.processors) == 1 and not sickbeard.KEEP_PROCESSED_DIR and \
                 ek.ek(os.path.normpath, dirName) != ek.ek(os.path.normpath, sickbeard.TV_DOWNLOAD_DIR) and \
                 len(remainingFolders) == 0:
 
@@ -119,3 +218,28 @@ def processDir (dirName, nzbName=None, recurse=False):
             returnStr += logHelper(u"Processing failed for "+cur_video_file_path)
 
     return returnStr
+
+def processFile (filePath, nzbName=None):
+    """
+    Post-processes a single video file without looking at anything else in its folder.
+    """
+
+    returnStr = ''
+
+    returnStr += logHelper(u"Processing file "+filePath, logger.DEBUG)
+
+    if not ek.ek(os.path.isfile, filePath) or not helpers.isMediaFile(ek.ek(os.path.basename, filePath)):
+        returnStr += logHelper(u"Not a video file, skipping "+filePath, logger.DEBUG)
+        return returnStr
+
+    processor = postProcessor.PostProcessor(filePath, nzbName)
+    process_result = postProcessPipeline.PostProcessPipeline([processor]).run()[0]
+
+    returnStr += processor.log
+
+    if process_result:
+        returnStr += logHelper(u"Processing succeeded for "+filePath)
+    else:
+        returnStr += logHelper(u"Processing failed for "+filePath)
+
+    return returnStr
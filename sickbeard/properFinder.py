@@ -18,6 +18,7 @@
 
 import datetime
 import operator
+import time
 
 import sickbeard
 
@@ -29,157 +30,123 @@ from sickbeard import history
 
 from sickbeard.common import *
 
-from lib.tvdb_api import tvdb_api, tvdb_exceptions
-
-from name_parser.parser import NameParser, InvalidNameException
-
+# propers are only looked at for this many days after they were found
+PROPER_DAYS = 2
 
 class ProperFinder():
+    """
+    Propers are flagged by the provider caches as they come in from the RSS feeds, so all this has
+    to do is go through the recent ones and snatch any we need. Providers which have to be searched
+    for their propers are only searched once a night.
+    """
 
     def __init__(self):
         self.updateInterval = datetime.timedelta(hours=1)
 
     def run(self):
 
+        # even when propers are turned off, so anything saved before then doesn't stay forever
+        self._prunePropers()
+
         if not sickbeard.DOWNLOAD_PROPERS:
             return
 
-        # look for propers every night at 1 AM
+        # search for propers every night at 1 AM
         updateTime = datetime.time(hour=1)
 
-        logger.log(u"Checking proper time", logger.DEBUG)
-
         hourDiff = datetime.datetime.today().time().hour - updateTime.hour
 
-        # if it's less than an interval after the update time then do an update
+        # if it's less than an interval after the update time then do a search
         if hourDiff >= 0 and hourDiff < self.updateInterval.seconds/3600:
-            logger.log(u"Beginning the search for new propers")
-        else:
-            return
+            self._searchProviders()
+
+        logger.log(u"Checking for new propers", logger.DEBUG)
 
         propers = self._getProperList()
 
         self._downloadPropers(propers)
 
-    def _getProperList(self):
+    def _searchProviders(self):
 
-        propers = {}
+        date = datetime.datetime.today() - datetime.timedelta(days=PROPER_DAYS)
 
-        # for each provider get a list of the propers
         for curProvider in providers.sortedProviderList():
 
-            if not curProvider.isActive():
+            if not curProvider.isActive() or not curProvider.searchesPropers:
                 continue
 
-            date = datetime.datetime.today() - datetime.timedelta(days=2)
-
             logger.log(u"Searching for any new PROPER releases from "+curProvider.name)
-            curPropers = curProvider.findPropers(date)
-
-            # if they haven't been added by a different provider than add the proper to the list
-            for x in curPropers:
-                name = self._genericName(x.name)
-                
-                if not name in propers:
-                    logger.log(u"Found new proper: "+x.name, logger.DEBUG)
-                    x.provider = curProvider
-                    propers[name] = x
-
-        # take the list of unique propers and get it sorted by
-        sortedPropers = sorted(propers.values(), key=operator.attrgetter('date'), reverse=True)
-        finalPropers = []
 
-        for curProper in sortedPropers:
+            for curProper in curProvider.findPropers(date):
+                curProvider.cache.addProper(curProper.name, curProper.url, curProper.date)
 
-            # parse the file name
-            try:
-                myParser = NameParser(False)
-                parse_result = myParser.parse(curProper.name)
-            except InvalidNameException:
-                logger.log(u"Unable to parse the filename "+curProper.name+" into a valid episode", logger.DEBUG)
-                continue
+    def _prunePropers(self):
 
-            if not parse_result.episode_numbers:
-                logger.log(u"Ignoring "+curProper.name+" because it's for a full season rather than specific episode", logger.DEBUG)
-                continue
-
-            # populate our Proper instance
-            if parse_result.air_by_date:
-                curProper.season == -1
-                curProper.episode = parse_result.air_date
-            else:
-                curProper.season = parse_result.season_number if parse_result.season_number != None else 1
-                curProper.episode = parse_result.episode_numbers[0]
-            curProper.quality = Quality.nameQuality(curProper.name)
+        minTime = int(time.mktime((datetime.datetime.today() - datetime.timedelta(days=PROPER_DAYS)).timetuple()))
 
-            # for each show in our list
-            for curShow in sickbeard.showList:
+        cacheDB = db.DBConnection("cache.db")
+        cacheDB.action("DELETE FROM propers WHERE time < ?", [minTime])
 
-                genericName = self._genericName(parse_result.series_name)
-
-                # get the scene name masks
-                sceneNames = set(sceneHelpers.makeSceneShowSearchStrings(curShow))
+    def _getProperList(self):
 
-                # for each scene name mask
-                for curSceneName in sceneNames:
+        cacheDB = db.DBConnection("cache.db")
+        sqlResults = cacheDB.select("SELECT * FROM propers ORDER BY time DESC")
 
-                    # if it matches
-                    if genericName == self._genericName(curSceneName):
-                        logger.log(u"Successful match! Result "+parse_result.series_name+" matched to show "+curShow.name, logger.DEBUG)
+        # if they've been found by more than one provider then use the newest one
+        propers = {}
 
-                        # set the tvdbid in the db to the show's tvdbid
-                        curProper.tvdbid = curShow.tvdbid
+        for curResult in sqlResults:
 
-                        # since we found it, break out
-                        break
+            name = self._genericName(curResult["name"])
+            if name in propers:
+                continue
 
-                # if we found something in the inner for loop break out of this one
-                if curProper.tvdbid != -1:
-                    break
+            curProvider = providers.getProviderClass(curResult["provider"])
+            if not curProvider or not curProvider.isActive():
+                continue
 
-            if curProper.tvdbid == -1:
+            episodes = [int(x) for x in curResult["episodes"].split("|") if x]
+            if not episodes:
+                logger.log(u"Ignoring "+curResult["name"]+" because it's for a full season rather than specific episode", logger.DEBUG)
                 continue
-            
-            if not sceneHelpers.filterBadReleases(curProper.name):
-                logger.log(u"Proper "+curProper.name+" isn't a valid scene release that we want, igoring it", logger.DEBUG)
+
+            if not sceneHelpers.filterBadReleases(curResult["name"]):
+                logger.log(u"Proper "+curResult["name"]+" isn't a valid scene release that we want, igoring it", logger.DEBUG)
                 continue
 
-            # if we have an air-by-date show then get the real season/episode numbers
-            if curProper.season == -1 and curProper.tvdbid:
-                showObj = helpers.findCertainShow(sickbeard.showList, curProper.tvdbid)
-                if not showObj:
-                    logger.log(u"This should never have happened, post a bug about this!", logger.ERROR)
-                    raise Exception("BAD STUFF HAPPENED")
-
-                tvdb_lang = showObj.lang
-                # There's gotta be a better way of doing this but we don't wanna
-                # change the language value elsewhere
-                ltvdb_api_parms = sickbeard.TVDB_API_PARMS.copy()
-
-                if tvdb_lang and not tvdb_lang == 'en':
-                    ltvdb_api_parms['language'] = tvdb_lang
-
-                try:
-                    t = tvdb_api.Tvdb(**ltvdb_api_parms)
-                    epObj = t[curProper.tvdbid].airedOn(curProper.episode)[0]
-                    season = int(epObj["seasonnumber"])
-                    episodes = [int(epObj["episodenumber"])]
-                except tvdb_exceptions.tvdb_episodenotfound, e:
-                    logger.log(u"Unable to find episode with date "+str(curProper.episode)+" for show "+parse_result.series_name+", skipping", logger.WARNING)
-                    continue
+            curProper = classes.Proper(curResult["name"], curResult["url"], datetime.datetime.fromtimestamp(int(curResult["time"])))
+            curProper.provider = curProvider
+            curProper.tvdbid = int(curResult["tvdbid"])
+            curProper.season = int(curResult["season"])
+            curProper.episode = episodes[0]
+            curProper.quality = int(curResult["quality"])
+
+            propers[name] = curProper
+
+        if not propers:
+            return []
+
+        # get the status of every episode the propers are for in one go
+        showIDs = list(set([x.tvdbid for x in propers.values()]))
+        sqlResults = db.DBConnection().select("SELECT showid, season, episode, status FROM tv_episodes WHERE showid IN ("+",".join(["?"] * len(showIDs))+")", showIDs)
+        epStatus = dict([((int(x["showid"]), int(x["season"]), int(x["episode"])), int(x["status"])) for x in sqlResults])
+
+        finalPropers = []
+
+        for curProper in sorted(propers.values(), key=operator.attrgetter('date'), reverse=True):
 
-            # check if we actually want this proper (if it's the right quality)
-            sqlResults = db.DBConnection().select("SELECT status FROM tv_episodes WHERE showid = ? AND season = ? AND episode = ?", [curProper.tvdbid, curProper.season, curProper.episode])
-            if not sqlResults:
+            curEp = (curProper.tvdbid, curProper.season, curProper.episode)
+            if curEp not in epStatus:
                 continue
-            oldStatus, oldQuality = Quality.splitCompositeStatus(int(sqlResults[0]["status"]))
+
+            oldStatus, oldQuality = Quality.splitCompositeStatus(epStatus[curEp])
 
             # only keep the proper if we have already retrieved the same quality ep (don't get better/worse ones)
             if oldStatus not in (DOWNLOADED, SNATCHED) or oldQuality != curProper.quality:
                 continue
 
-            # if the show is in our list and there hasn't been a proper already added for that particular episode then add it to our list of propers
-            if curProper.tvdbid != -1 and (curProper.tvdbid, curProper.season, curProper.episode) not in map(operator.attrgetter('tvdbid', 'season', 'episode'), finalPropers):
+            # if there hasn't been a proper already added for that particular episode then add it to our list of propers
+            if curEp not in map(operator.attrgetter('tvdbid', 'season', 'episode'), finalPropers):
                 logger.log(u"Found a proper that we need: "+str(curProper.name))
                 finalPropers.append(curProper)
 
@@ -187,30 +154,40 @@ class ProperFinder():
 
     def _downloadPropers(self, properList):
 
-        for curProper in properList:
+        if not properList:
+            return
 
-            historyLimit = datetime.datetime.today() - datetime.timedelta(days=30)
+        historyLimit = datetime.datetime.today() - datetime.timedelta(days=30)
+
+        # get the snatches of every show the propers are for in one go
+        showIDs = list(set([x.tvdbid for x in properList]))
+        myDB = db.DBConnection()
+        sqlResults = myDB.select(
+            "SELECT showid, season, episode, quality, resource FROM history "
+            "WHERE showid IN ("+",".join(["?"] * len(showIDs))+") AND date >= ? "
+            "AND action IN (" + ",".join([str(x) for x in Quality.SNATCHED]) + ")",
+                    showIDs + [historyLimit.strftime(history.dateFormat)])
+
+        snatches = {}
+        for curResult in sqlResults:
+            snatches.setdefault((int(curResult["showid"]), int(curResult["season"]), int(curResult["episode"]), int(curResult["quality"])), []).append(curResult["resource"])
+
+        for curProper in properList:
 
-            # make sure the episode has been downloaded before
-            myDB = db.DBConnection()
-            historyResults = myDB.select(
-                "SELECT resource FROM history "
-                "WHERE showid = ? AND season = ? AND episode = ? AND quality = ? AND date >= ? "
-                "AND action IN (" + ",".join([str(x) for x in Quality.SNATCHED]) + ")",
-                        [curProper.tvdbid, curProper.season, curProper.episode, curProper.quality, historyLimit.strftime(history.dateFormat)])
+            historyResults = snatches.get((curProper.tvdbid, curProper.season, curProper.episode, curProper.quality), [])
 
             # if we didn't download this episode in the first place we don't know what quality to use for the proper so we can't do it
             if len(historyResults) == 0:
-                logger.log(u"Unable to find an original history entry for proper "+curProper.name+" so I'm not downloading it.")
+                logger.log(u"Unable to find an original history entry for proper "+curProper.name+" so I'm not downloading it.", logger.DEBUG)
                 continue
 
             else:
 
                 # make sure that none of the existing history downloads are the same proper we're trying to download
                 isSame = False
-                for curResult in historyResults:
+                for curResource in historyResults:
                     # if the result exists in history already we need to skip it
-                    if self._genericName(curResult["resource"]) == self._genericName(curProper.name):
+                    if self._genericName(curResource) == self._genericName(curProper.name):
                         isSame = True
                         break
                 if isSame:
@@ -29,6 +29,7 @@ import xml.etree.cElementTree as etree
 import sickbeard
 
 from sickbeard import helpers, classes, exceptions, logger, db
+from sickbeard import search_limits, search_cache
 
 from sickbeard.common import *
 from sickbeard import tvcache
@@ -52,6 +53,9 @@ class GenericProvider:
 
         self.supportsBacklog = False
 
+        # providers whose propers aren't all in their RSS feed, findPropers is used to search for them
+        self.searchesPropers = False
+
         self.cache = tvcache.TVCache(self)
 
     def getID(self):
@@ -107,6 +111,8 @@ class GenericProvider:
         if not headers:
             headers = []
 
+        search_limits.waitForRequest(self)
+
         result = None
 
         try:
@@ -182,6 +188,25 @@ class GenericProvider:
     def _doSearch(self):
         return []
 
+    def _cachedSearch(self, search_params, search_func=None, **kwargs):
+        """
+        Calls _doSearch (or search_func if it's given), unless the same search was made recently in
+        which case the items it returned then are used instead.
+        """
+
+        if search_func == None:
+            search_func = self._doSearch
+
+        itemList = search_cache.getResults(self, search_params)
+        if itemList != None:
+            logger.log(u"Using the "+self.name+" results from a recent search for "+search_cache.searchKey(search_params), logger.DEBUG)
+            return itemList
+
+        itemList = search_func(search_params, **kwargs)
+        search_cache.saveResults(self, search_params, itemList)
+
+        return itemList
+
     def _get_season_search_strings(self, show, season, episode=None):
         return []
 
@@ -195,6 +220,16 @@ class GenericProvider:
             url = url.replace('&amp;','&')
         
         return (title, url)
+
+    def _get_size(self, item):
+        """
+        Returns the size in bytes from the item's enclosure, or -1 if it doesn't have one.
+        """
+
+        try:
+            return int(item.find('enclosure').get('length'))
+        except (AttributeError, TypeError, ValueError):
+            return -1
     
     def findEpisode (self, episode, manualSearch=False):
 
@@ -215,7 +250,7 @@ class GenericProvider:
         itemList = []
 
         for cur_search_string in self._get_episode_search_strings(episode):
-            itemList += self._doSearch(cur_search_string, show=episode.show)
+            itemList += self._cachedSearch(cur_search_string, show=episode.show)
 
         for item in itemList:
 
@@ -249,6 +284,7 @@ class GenericProvider:
             result.url = url
             result.name = title
             result.quality = quality
+            result.size = self._get_size(item)
 
             results.append(result)
 
@@ -259,10 +295,19 @@ class GenericProvider:
     def findSeasonResults(self, show, season):
 
         itemList = []
-        results = {}
 
         for curString in self._get_season_search_strings(show, season):
-            itemList += self._doSearch(curString)
+            itemList += self._cachedSearch(curString)
+
+        return self._parseSeasonResults(show, season, itemList)
+
+    def _parseSeasonResults(self, show, season, itemList):
+        """
+        Turns the items found for a season into results. Returns a dict of episode number (or
+        MULTI_EP_RESULT/SEASON_RESULT) -> list of results.
+        """
+
+        results = {}
 
         for item in itemList:
 
@@ -325,6 +370,7 @@ class GenericProvider:
             result.url = url
             result.name = title
             result.quality = quality
+            result.size = self._get_size(item)
 
             if len(epObj) == 1:
                 epNum = epObj[0].episode
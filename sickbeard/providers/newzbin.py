@@ -29,6 +29,7 @@ import generic
 import sickbeard.encodingKludge as ek
 from sickbeard import classes, logger, helpers, exceptions, sceneHelpers, db
 from sickbeard import tvcache
+from sickbeard import search_limits
 from sickbeard.common import *
 
 class NewzbinDownloader(urllib.FancyURLopener):
@@ -224,6 +225,8 @@ class NewzbinProvider(generic.NZBProvider):
 
     def getURL(self, url):
 
+        search_limits.waitForRequest(self)
+
         myOpener = classes.AuthURLOpener(sickbeard.NEWZBIN_USERNAME, sickbeard.NEWZBIN_PASSWORD)
         try:
             f = myOpener.openit(url)
@@ -21,6 +21,7 @@
 import urllib
 import datetime
 import re
+import time
 
 import xml.etree.cElementTree as etree
 
@@ -34,6 +35,17 @@ from sickbeard.common import *
 from sickbeard import logger
 from sickbeard import tvcache
 
+from sickbeard.name_parser.parser import NameParser, InvalidNameException
+
+# a batch search for a whole show is paged through this many results at a time
+BATCH_PAGE_SIZE = 100
+
+# and gives up after this many pages
+BATCH_MAX_PAGES = 10
+
+# how long the results of a batch search are used for the other seasons of the show
+BATCH_RESULTS_MINUTES = 30
+
 class NewznabProvider(generic.NZBProvider):
 
 	def __init__(self, name, url, key=''):
@@ -50,6 +62,9 @@ class NewznabProvider(generic.NZBProvider):
 
 		self.default = False
 
+		# tvrage id -> (time, {season: [items]}, complete) from recent batch searches
+		self._showResults = {}
+
 	def configStr(self):
 		return self.name + '|' + self.url + '|' + self.key + '|' + str(int(self.enabled))
 
@@ -112,12 +127,112 @@ class NewznabProvider(generic.NZBProvider):
 		return [params]
 
 
+	def findSeasonResults(self, show, season):
+		"""
+		In batch mode shows with a TVRage id are searched all at once and the results are split up
+		by season, so a show's backlog takes the same number of requests however many seasons it has.
+		"""
+
+		if not sickbeard.NEWZNAB_BATCH_SEARCH or not show.tvrid:
+			return generic.NZBProvider.findSeasonResults(self, show, season)
+
+		(showResults, complete) = self._getShowResults(show)
+
+		# if the batch failed or stopped before the end of the results then the season gets its own
+		# search like it would without batch mode, otherwise what the batch found is all there is
+		if not complete:
+			logger.log(u"Batch search of "+self.name+" didn't cover all of "+show.name+", searching season "+str(season)+" on its own", logger.DEBUG)
+			return generic.NZBProvider.findSeasonResults(self, show, season)
+
+		itemList = showResults.get(season, [])
+
+		logger.log(u"Batch search of "+self.name+" found "+str(len(itemList))+" results for "+show.name+" season "+str(season), logger.DEBUG)
+
+		return self._parseSeasonResults(show, season, itemList)
+
+	def _getShowResults(self, show):
+		"""
+		Returns a tuple of a dict of season (or month for air by date shows) -> items for everything
+		the provider has for the show, paging through it with as few requests as possible, and whether
+		it got to the end of the results. A failed search is remembered like any other so the other
+		seasons don't make it again.
+		"""
+
+		curTime = time.time()
+
+		for curID in self._showResults.keys():
+			if curTime - self._showResults[curID][0] > BATCH_RESULTS_MINUTES * 60:
+				del self._showResults[curID]
+
+		if show.tvrid in self._showResults:
+			return self._showResults[show.tvrid][1:]
+
+		itemList = []
+		complete = False
+
+		for curPage in range(BATCH_MAX_PAGES):
+			# the pages are cached with every item in them, so the paging works the same from the cache
+			curItems = self._cachedSearch({'rid': show.tvrid, 'limit': BATCH_PAGE_SIZE, 'offset': curPage * BATCH_PAGE_SIZE}, search_func=self._getItems)
+
+			if curItems == None:
+				break
+
+			itemList += self._usableItems(curItems)
+
+			# page on what the provider sent, not what was usable, or one bad item ends the paging early
+			if len(curItems) < BATCH_PAGE_SIZE:
+				complete = True
+				break
+
+		showResults = {}
+
+		for item in itemList:
+
+			(title, url) = self._get_title_and_url(item)
+
+			try:
+				myParser = NameParser(False)
+				parse_result = myParser.parse(title)
+			except InvalidNameException:
+				logger.log(u"Unable to parse the filename "+title+" into a valid episode", logger.DEBUG)
+				continue
+
+			if show.is_air_by_date:
+				if not parse_result.air_by_date:
+					continue
+				season = str(parse_result.air_date)[:7]
+
+			# same as findSeasonResults, results without a season are taken to be from the first
+			elif parse_result.season_number == None:
+				season = 1
+
+			else:
+				season = parse_result.season_number
+
+			showResults.setdefault(season, []).append(item)
+
+		self._showResults[show.tvrid] = (curTime, showResults, complete)
+
+		return (showResults, complete)
+
 	def _doGeneralSearch(self, search_string):
 		return self._doSearch({'q': search_string})
 
 	#def _doSearch(self, show, season=None, episode=None, search=None):
 	def _doSearch(self, search_params, show=None):
 
+		items = self._getItems(search_params)
+
+		if items == None:
+			return []
+
+		return self._usableItems(items)
+
+	def _getItems(self, search_params):
+		"""
+		Makes the API request and returns every item in the response, or None if it failed.
+		"""
+
 		params = {"t": "tvsearch",
 				  "maxage": sickbeard.USENET_RETENTION,
 				  "limit": 100,
@@ -136,7 +251,7 @@ class NewznabProvider(generic.NZBProvider):
 		data = self.getURL(searchURL)
 		
 		if not data:
-			return []
+			return None
 
 		# hack this in until it's fixed server side
 		if not data.startswith('<?xml'):
@@ -148,7 +263,7 @@ class NewznabProvider(generic.NZBProvider):
 		except Exception, e:
 			logger.log(u"Error trying to load "+self.name+" RSS feed: "+str(e).decode('utf-8'), logger.ERROR)
 			logger.log(u"RSS data: "+data, logger.DEBUG)
-			return []
+			return None
 
 		if responseSoup.getroot().tag == 'error':
 			code = responseSoup.getroot().get('code')
@@ -160,11 +275,18 @@ class NewznabProvider(generic.NZBProvider):
 				raise exceptions.AuthException("Your account isn't allowed to use the API on "+self.name+", contact the administrator")
 			else:
 				logger.log(u"Unknown error given from "+self.name+": "+responseSoup.getroot().get('description'), logger.ERROR)
-				return []
+				return None
 
 		if responseSoup.getroot().tag != 'rss':
 			logger.log(u"Resulting XML from "+self.name+" isn't RSS, not parsing it", logger.ERROR)
-			return []
+			return None
+
+		return list(items)
+
+	def _usableItems(self, items):
+		"""
+		Returns the items which have a title and a link.
+		"""
 
 		results = []
 
@@ -173,7 +295,7 @@ class NewznabProvider(generic.NZBProvider):
 			url = curItem.findtext('link')
 
 			if not title or not url:
-				logger.log(u"The XML returned from the "+self.name+" RSS feed is incomplete, this result is unusable: "+data, logger.ERROR)
+				logger.log(u"The XML returned from the "+self.name+" RSS feed is incomplete, this result is unusable: "+etree.tostring(curItem), logger.ERROR)
 				continue
 
 			url = url.replace('&amp;','&')
@@ -37,6 +37,7 @@ class NZBMatrixProvider(generic.NZBProvider):
         generic.NZBProvider.__init__(self, "NZBMatrix")
 
         self.supportsBacklog = True
+        self.searchesPropers = True
 
         self.cache = NZBMatrixCache(self)
 
@@ -40,6 +40,7 @@ class NZBsProvider(generic.NZBProvider):
 		generic.NZBProvider.__init__(self, "NZBs.org")
 
 		self.supportsBacklog = True
+		self.searchesPropers = True
 
 		self.cache = NZBsCache(self)
 
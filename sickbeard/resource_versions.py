@@ -0,0 +1,70 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+# Version counters for the data the API hands out. Anything that changes a resource bumps its
+# counter so clients can be told nothing has changed without the data being looked up again.
+
+from __future__ import with_statement
+
+import threading
+import time
+
+# resource names
+SHOWS = 'shows'
+EPISODES = 'episodes'
+QUEUE = 'queue'
+HISTORY = 'history'
+
+# counters start from zero every time we start up so this keeps old ETags from matching
+_generation = str(int(time.time()))
+
+_versions = {}
+_lock = threading.Lock()
+
+def episodesOf(showid):
+    """
+    Returns the resource name for the episode list of one show.
+    """
+    return EPISODES + '.' + str(showid)
+
+def bump(*resources):
+    """
+    Marks the given resources as changed.
+    """
+
+    with _lock:
+        for cur_resource in resources:
+            _versions[cur_resource] = _versions.get(cur_resource, 0) + 1
+
+def bumpEpisodes(showid):
+    """
+    Marks the episodes of a show as changed, along with everything built from all episodes.
+    """
+    bump(EPISODES, episodesOf(showid))
+
+def getVersion(resource):
+    with _lock:
+        return _versions.get(resource, 0)
+
+def getTag(resources):
+    """
+    Returns a string which changes whenever any of the given resources do.
+    """
+
+    with _lock:
+        return _generation + '-' + '.'.join([str(_versions.get(x, 0)) for x in resources])
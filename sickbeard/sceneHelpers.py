@@ -16,6 +16,8 @@
 # You should have received a copy of the GNU General Public License
 # along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
 
+from __future__ import with_statement
+
 from sickbeard.common import countryList
 from sickbeard import logger
 from sickbeard import db
@@ -23,6 +25,7 @@ from sickbeard import db
 import re
 import datetime
 import urllib
+import threading
 
 from name_parser.parser import NameParser, InvalidNameException
 
@@ -239,14 +242,79 @@ def isGoodResult(name, show, log=True):
         logger.log(u"Provider gave result "+name+" but that doesn't seem like a valid result for "+show.name+" so I'm ignoring it")
     return False
 
+def exception_search_name(name):
+    """
+    Returns the form of a show name that scene exceptions are looked up by, so that "Show: Name",
+    "show name" and "Show.Name" all end up the same.
+    """
+
+    return sanitizeSceneName(name).lower().replace('.',' ')
+
+# the scene exceptions are kept in memory so lookups don't have to hit cache.db every time, they're
+# loaded the first time they're needed and replaced as a whole when the list is updated
+_exception_lock = threading.Lock()
+_exceptions_by_name = None
+_exceptions_by_id = None
+
+def _build_exception_index(exception_list):
+    """
+    Takes a list of (tvdb_id, show_name, search_name) and returns the search_name -> tvdb_id and
+    tvdb_id -> [show_name, ...] dicts.
+    """
+
+    by_name = {}
+    by_id = {}
+
+    for (cur_tvdb_id, cur_name, cur_search_name) in exception_list:
+        by_id.setdefault(cur_tvdb_id, []).append(cur_name)
+
+        # the first exception listed wins if two shows claim the same name
+        for cur_key in (cur_name.lower(), cur_search_name or exception_search_name(cur_name)):
+            if cur_key not in by_name:
+                by_name[cur_key] = cur_tvdb_id
+
+    return (by_name, by_id)
+
+def _set_exception_index(exception_list):
+
+    global _exceptions_by_name, _exceptions_by_id
+
+    (by_name, by_id) = _build_exception_index(exception_list)
+
+    # swap both at once so nobody ever sees half of an update
+    with _exception_lock:
+        _exceptions_by_name, _exceptions_by_id = by_name, by_id
+
+def _get_exception_index():
+
+    with _exception_lock:
+        if _exceptions_by_name != None:
+            return (_exceptions_by_name, _exceptions_by_id)
+
+    myDB = db.DBConnection("cache.db")
+    sql_results = myDB.select("SELECT tvdb_id, show_name, search_name FROM scene_exceptions ORDER BY exception_id")
+    _set_exception_index([(int(x["tvdb_id"]), x["show_name"], x["search_name"]) for x in sql_results])
+
+    with _exception_lock:
+        return (_exceptions_by_name, _exceptions_by_id)
+
+def clear_exception_cache():
+    """
+    Forgets the in-memory scene exceptions so they're reloaded from the DB next time they're used.
+    """
+
+    global _exceptions_by_name, _exceptions_by_id
+
+    with _exception_lock:
+        _exceptions_by_name, _exceptions_by_id = None, None
+
 def get_scene_exceptions(tvdb_id):
     """
     Given a tvdb_id, return a list of all the scene exceptions.
     """
 
-    myDB = db.DBConnection("cache.db")
-    exceptions = myDB.select("SELECT show_name FROM scene_exceptions WHERE tvdb_id = ?", [tvdb_id])
-    return [cur_exception["show_name"] for cur_exception in exceptions]
+    by_id = _get_exception_index()[1]
+    return list(by_id.get(int(tvdb_id), []))
 
 def get_scene_exception_by_name(show_name):
     """
@@ -254,22 +322,17 @@ def get_scene_exception_by_name(show_name):
     is present.
     """
 
-    myDB = db.DBConnection("cache.db")
-    
-    # try the obvious case first
-    exception_result = myDB.select("SELECT tvdb_id FROM scene_exceptions WHERE LOWER(show_name) = ?", [show_name.lower()])
-    if exception_result:
-        return int(exception_result[0]["tvdb_id"])
-
-    all_exception_results = myDB.select("SELECT show_name, tvdb_id FROM scene_exceptions")
-    for cur_exception in all_exception_results:
+    by_name = _get_exception_index()[0]
 
-        cur_exception_name = cur_exception["show_name"]
-        cur_tvdb_id = int(cur_exception["tvdb_id"])
+    # try the obvious case first
+    if show_name.lower() in by_name:
+        return by_name[show_name.lower()]
 
-        if show_name.lower() in (cur_exception_name.lower(), sanitizeSceneName(cur_exception_name).lower().replace('.',' ')):
-            logger.log(u"Scene exception lookup got tvdb id "+str(cur_tvdb_id)+u", using that", logger.DEBUG)
-            return cur_tvdb_id
+    search_name = exception_search_name(show_name)
+    if search_name in by_name:
+        cur_tvdb_id = by_name[search_name]
+        logger.log(u"Scene exception lookup got tvdb id "+str(cur_tvdb_id)+u", using that", logger.DEBUG)
+        return cur_tvdb_id
 
     return None
 
@@ -294,9 +357,20 @@ def retrieve_exceptions():
         
         exception_dict[tvdb_id] = alias_list
 
+    exception_list = []
+    for cur_tvdb_id in sorted(exception_dict):
+        for cur_exception in exception_dict[cur_tvdb_id]:
+            exception_list.append((cur_tvdb_id, cur_exception, exception_search_name(cur_exception)))
+
+    # most of the time nothing has changed so don't bother rewriting the table
+    if _build_exception_index(exception_list)[1] == _get_exception_index()[1]:
+        logger.log(u"Scene exceptions haven't changed, not updating them", logger.DEBUG)
+        return
+
     myDB = db.DBConnection("cache.db")
     myDB.action("DELETE FROM scene_exceptions WHERE 1=1")
     
-    for cur_tvdb_id in exception_dict:
-        for cur_exception in exception_dict[cur_tvdb_id]:
-            myDB.action("INSERT INTO scene_exceptions (tvdb_id, show_name) VALUES (?,?)", [cur_tvdb_id, cur_exception])
+    for (cur_tvdb_id, cur_exception, cur_search_name) in exception_list:
+        myDB.action("INSERT INTO scene_exceptions (tvdb_id, show_name, search_name) VALUES (?,?,?)", [cur_tvdb_id, cur_exception, cur_search_name])
+
+    _set_exception_index(exception_list)
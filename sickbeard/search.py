@@ -30,6 +30,8 @@ from sickbeard import nzbget
 from sickbeard import history
 from sickbeard import notifiers
 from sickbeard import nzbSplitter
+from sickbeard import search_limits
+from sickbeard import search_selection
 
 from sickbeard import encodingKludge as ek
 
@@ -223,12 +225,17 @@ def findEpisode(episode, manualSearch=False):
     foundResults = []
 
     didSearch = False
+    overBudget = False
 
     for curProvider in providers.sortedProviderList():
 
         if not curProvider.isActive():
             continue
 
+        if not search_limits.canSearch(curProvider):
+            overBudget = True
+            continue
+
         try:
             curFoundResults = curProvider.findEpisode(episode, manualSearch=manualSearch)
         except exceptions.AuthException, e:
@@ -246,7 +253,7 @@ def findEpisode(episode, manualSearch=False):
 
         foundResults += curFoundResults
 
-    if not didSearch:
+    if not didSearch and not overBudget:
         logger.log(u"No NZB/Torrent providers found or enabled in the sickbeard config. Please check your settings.", logger.ERROR)
 
     bestResult = pickBestResult(foundResults)
@@ -260,12 +267,17 @@ def findSeason(show, season):
     foundResults = {}
 
     didSearch = False
+    overBudget = False
 
     for curProvider in providers.sortedProviderList():
 
         if not curProvider.isActive():
             continue
 
+        if not search_limits.canSearch(curProvider):
+            overBudget = True
+            continue
+
         try:
             curResults = curProvider.findSeasonResults(show, season)
 
@@ -290,7 +302,7 @@ def findSeason(show, season):
 
         didSearch = True
 
-    if not didSearch:
+    if not didSearch and not overBudget:
         logger.log(u"No NZB/Torrent providers found or enabled in the sickbeard config. Please check your settings.", logger.ERROR)
 
     finalResults = []
@@ -362,72 +374,13 @@ def findSeason(show, season):
                     foundResults[epNum] = [curResult]
 
 
-    # go through multi-ep results and see if we really want them or not, get rid of the rest
-    multiResults = {}
-    if MULTI_EP_RESULT in foundResults:
-        for multiResult in foundResults[MULTI_EP_RESULT]:
-
-            logger.log(u"Seeing if we want to bother with multi-episode result "+multiResult.name, logger.DEBUG)
-
-            # see how many of the eps that this result covers aren't covered by single results
-            neededEps = []
-            notNeededEps = []
-            for epObj in multiResult.episodes:
-                epNum = epObj.episode
-                # if we have results for the episode
-                if epNum in foundResults and len(foundResults[epNum]) > 0:
-                    # but the multi-ep is worse quality, we don't want it
-                    # TODO: wtf is this False for
-                    #if False and multiResult.quality <= pickBestResult(foundResults[epNum]):
-                    #    notNeededEps.append(epNum)
-                    #else:
-                    neededEps.append(epNum)
-                else:
-                    neededEps.append(epNum)
-
-            logger.log(u"Single-ep check result is neededEps: "+str(neededEps)+", notNeededEps: "+str(notNeededEps), logger.DEBUG)
-
-            if not neededEps:
-                logger.log(u"All of these episodes were covered by single nzbs, ignoring this multi-ep result", logger.DEBUG)
-                continue
-
-            # check if these eps are already covered by another multi-result
-            multiNeededEps = []
-            multiNotNeededEps = []
-            for epObj in multiResult.episodes:
-                epNum = epObj.episode
-                if epNum in multiResults:
-                    multiNotNeededEps.append(epNum)
-                else:
-                    multiNeededEps.append(epNum)
-
-            logger.log(u"Multi-ep check result is multiNeededEps: "+str(multiNeededEps)+", multiNotNeededEps: "+str(multiNotNeededEps), logger.DEBUG)
-
-            if not neededEps:
-                logger.log(u"All of these episodes were covered by another multi-episode nzbs, ignoring this multi-ep result", logger.DEBUG)
-                continue
-
-            # if we're keeping this multi-result then remember it
-            for epObj in multiResult.episodes:
-                multiResults[epObj.episode] = multiResult
-
-            # don't bother with the single result if we're going to get it with a multi result
-            for epObj in multiResult.episodes:
-                epNum = epObj.episode
-                if epNum in foundResults:
-                    logger.log(u"A needed multi-episode result overlaps with a single-episode result for ep #"+str(epNum)+", removing the single-episode results from the list", logger.DEBUG)
-                    del foundResults[epNum]
-
-    finalResults += set(multiResults.values())
-
-    # of all the single ep results narrow it down to the best one for each episode
-    for curEp in foundResults:
-        if curEp in (MULTI_EP_RESULT, SEASON_RESULT):
-            continue
-
-        if len(foundResults[curEp]) == 0:
+    # work out which of the single and multi-ep results to snatch to get every episode at its best quality
+    epResults = []
+    for curEp in sorted(foundResults.keys()):
+        if curEp == SEASON_RESULT:
             continue
+        epResults += foundResults[curEp]
 
-        finalResults.append(pickBestResult(foundResults[curEp]))
+    finalResults += search_selection.pickResults(epResults)
 
     return finalResults
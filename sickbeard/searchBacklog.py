@@ -19,23 +19,80 @@
 from __future__ import with_statement
 
 import datetime
+import math
 import threading
 import time
 
 from sickbeard import db, exceptions, helpers, search, scheduler
-from sickbeard import search_queue
+from sickbeard import search_queue, search_limits, providers
 from sickbeard import logger
 from sickbeard import ui
 from sickbeard.common import *
 
+# turns an episode's airdate ordinal into its sqlite julian day number
+_JULIAN_DAY_OFFSET = 1721424.5
+
+def _highestBestQualitySQL(qualityColumn):
+    """
+    Returns an SQL expression giving the highest of the best qualities in a show's quality setting,
+    the same as max(Quality.splitQuality(quality)[1]) or 0 if there aren't any.
+    """
+
+    cases = ["WHEN ("+qualityColumn+" >> 16) & "+str(x)+" THEN "+str(x) for x in sorted(Quality.qualityStrings.keys(), reverse=True) if x]
+    return "(CASE " + " ".join(cases) + " ELSE 0 END)"
+
+def planBacklog(fromDate, showIDs=None):
+    """
+    Works out which segments (seasons, or months for air by date shows) of which shows have episodes
+    that are wanted or could be upgraded to one of the show's best qualities, in a single query.
+
+    Only segments with an episode airing after fromDate are included and paused shows are left out.
+
+    fromDate: a datetime.date
+    showIDs: optional list of tvdb ids to limit it to
+
+    Returns a list of (showid, segment, number of episodes needed, latest airdate ordinal), the segments
+    needing the most episodes first and the most recent first after that.
+    """
+
+    wantedSQL = "(ep.status = ? OR (ep.status % 100 IN (?, ?) AND ep.status / 100 < "+_highestBestQualitySQL("show.quality")+"))"
+
+    sql = "SELECT ep.showid AS showid, show.air_by_date AS air_by_date, " \
+          "CASE WHEN show.air_by_date THEN substr(date(ep.airdate + ?), 1, 7) ELSE ep.season END AS segment, " \
+          "SUM(CASE WHEN "+wantedSQL+" THEN 1 ELSE 0 END) AS needed, MAX(ep.airdate) AS latest " \
+          "FROM tv_episodes ep, tv_shows show " \
+          "WHERE ep.showid = show.tvdb_id AND show.paused = 0 AND ep.season > 0 "
+    args = [_JULIAN_DAY_OFFSET, WANTED, DOWNLOADED, SNATCHED]
+
+    if showIDs != None:
+        sql += "AND ep.showid IN ("+",".join(["?"] * len(showIDs))+") "
+        args += showIDs
+
+    sql += "GROUP BY ep.showid, segment HAVING needed > 0 AND latest > ? ORDER BY needed DESC, latest DESC"
+    args.append(fromDate.toordinal())
+
+    myDB = db.DBConnection()
+    sqlResults = myDB.select(sql, args)
+
+    results = []
+    for curResult in sqlResults:
+        if int(curResult["air_by_date"]):
+            segment = str(curResult["segment"])
+        else:
+            segment = int(curResult["segment"])
+        results.append((int(curResult["showid"]), segment, int(curResult["needed"]), int(curResult["latest"])))
+
+    return results
+
 class BacklogSearchScheduler(scheduler.Scheduler):
 
     def forceSearch(self):
         self.action._set_lastBacklog(1)
+        self.action._pending = set()
         self.lastRun = datetime.datetime.fromordinal(1)
 
     def nextRun(self):
-        if self.action._lastBacklog <= 1:
+        if self.action._lastBacklog <= 1 or self.action._pending:
             return datetime.date.today()
         else:
             return datetime.date.fromordinal(self.action._lastBacklog + self.action.cycleTime)
@@ -51,6 +108,14 @@ class BacklogSearcher:
         self.amPaused = False
         self.amWaiting = False
 
+        # (showid, segment) of everything in the current full backlog that hasn't been queued yet
+        self._pending = set()
+        self._planSize = 0
+
+        # how many segments of the full backlog were queued on which day, for spreading it out
+        self._queuedDate = None
+        self._queuedToday = 0
+
         self._resetPI()
 
     def _resetPI(self):
@@ -67,6 +132,32 @@ class BacklogSearcher:
         logger.log(u"amWaiting: "+str(self.amWaiting)+", amActive: "+str(self.amActive), logger.DEBUG)
         return (not self.amWaiting) and self.amActive
 
+    def numPending(self):
+        return len(self._pending)
+
+    def _backlogQuota(self, curDate, fullBacklog):
+        """
+        Returns how many segments can be queued now, or None if there's no limit. A full backlog is
+        spread over the backlog cycle if we're set to, and nothing is queued that would go over what
+        the providers have left of their daily budgets.
+        """
+
+        quota = None
+
+        if fullBacklog and sickbeard.BACKLOG_MODE == search_limits.BACKLOG_SPREAD:
+            if self._queuedDate != curDate:
+                self._queuedDate = curDate
+                self._queuedToday = 0
+
+            perDay = int(math.ceil(float(self._planSize) / self.cycleTime))
+            quota = max(perDay - self._queuedToday, 0)
+
+        remaining = search_limits.remainingBacklogSearches(providers.sortedProviderList())
+        if remaining != None and (quota == None or remaining < quota):
+            quota = remaining
+
+        return quota
+
     def searchBacklog(self, which_shows=None):
 
         if which_shows:
@@ -83,55 +174,74 @@ class BacklogSearcher:
         curDate = datetime.date.today().toordinal()
         fromDate = datetime.date.fromordinal(1)
 
-        if not which_shows and not curDate - self._lastBacklog >= self.cycleTime:
+        if not which_shows and not self._pending and not curDate - self._lastBacklog >= self.cycleTime:
             logger.log(u"Running limited backlog on recently missed episodes only")
             fromDate = datetime.date.today() - datetime.timedelta(days=7)
 
+        fullBacklog = not which_shows and fromDate == datetime.date.fromordinal(1)
+
         self.amActive = True
         self.amPaused = False
 
-        myDB = db.DBConnection()
-        numSeasonResults = myDB.select("SELECT DISTINCT(season), showid FROM tv_episodes ep, tv_shows show WHERE season != 0 AND ep.showid = show.tvdb_id AND show.paused = 0 AND ep.airdate > ?", [fromDate.toordinal()])
+        shows = dict([(x.tvdbid, x) for x in show_list])
 
-        # get separate lists of the season/date shows
-        season_shows = [x for x in show_list if not x.is_air_by_date]
-        air_by_date_shows = [x for x in show_list if x.is_air_by_date]
+        if which_shows:
+            plan = planBacklog(fromDate, shows.keys())
+        else:
+            plan = planBacklog(fromDate)
+
+        # segments with recently missed episodes that aren't part of the backlog we're working through
+        recent = []
+
+        if fullBacklog:
+            if self._pending:
+                # carry on with the backlog we started before, minus anything that's been found since, and
+                # search anything missed in the last week right away like the limited backlog would
+                recentDate = (datetime.date.today() - datetime.timedelta(days=7)).toordinal()
+                recent = [x for x in plan if (x[0], x[1]) not in self._pending and x[3] > recentDate]
+                plan = [x for x in plan if (x[0], x[1]) in self._pending]
+            else:
+                self._planSize = len(plan)
+                self._pending = set([(x[0], x[1]) for x in plan])
 
-        # figure out how many segments of air by date shows we're going to do
-        air_by_date_segments = []
-        for cur_id in [x.tvdbid for x in air_by_date_shows]:
-            air_by_date_segments += self._get_air_by_date_segments(cur_id, fromDate) 
+        logger.log(u"Found "+str(len(plan))+" seasons with episodes to search for", logger.DEBUG)
 
-        logger.log(u"Air-by-date segments: "+str(air_by_date_segments), logger.DEBUG)
+        # searches for certain shows are asked for by the user so they aren't held back
+        if not which_shows:
+            quota = self._backlogQuota(curDate, fullBacklog)
+            if quota != None and quota < len(plan):
+                logger.log(u"Searching "+str(quota)+" of the "+str(len(plan))+" seasons in the backlog now, the rest will be searched later")
+                plan = plan[:quota]
 
-        totalSeasons = float(len(numSeasonResults) + len(air_by_date_segments))
-        numSeasonsDone = 0.0
+        if recent:
+            logger.log(u"Also searching "+str(len(recent))+" seasons with recently missed episodes")
+            plan = recent + plan
 
-        # go through non air-by-date shows and see if they need any episodes
-        for curShow in show_list:
+        for (numDone, (cur_id, cur_segment, cur_needed, cur_latest)) in enumerate(plan):
 
-            if curShow.paused:
+            wasPending = (cur_id, cur_segment) in self._pending
+            self._pending.discard((cur_id, cur_segment))
+
+            if cur_id not in shows:
                 continue
 
-            if curShow.is_air_by_date:
-                segments = [x[1] for x in self._get_air_by_date_segments(curShow.tvdbid, fromDate)]
-            else:
-                segments = self._get_season_segments(curShow.tvdbid, fromDate)
+            curShow = shows[cur_id]
 
-            for cur_segment in segments:
+            self.currentSearchInfo = {'title': curShow.name + " Season "+str(cur_segment)}
+            self.percentDone = int(float(numDone) / len(plan) * 100)
 
-                self.currentSearchInfo = {'title': curShow.name + " Season "+str(cur_segment)}
+            logger.log(u"Need "+str(cur_needed)+" episodes from "+curShow.name+" season "+str(cur_segment), logger.DEBUG)
 
-                backlog_queue_item = search_queue.BacklogQueueItem(curShow, cur_segment)
+            # the plan already knows there's something worth searching for
+            backlog_queue_item = search_queue.BacklogQueueItem(curShow, cur_segment, wantSeason=True)
+            sickbeard.searchQueueScheduler.action.add_item(backlog_queue_item)
 
-                if not backlog_queue_item.wantSeason:
-                    logger.log(u"Nothing in season "+str(cur_segment)+" needs to be downloaded, skipping this season", logger.DEBUG)
-                else:
-                    sickbeard.searchQueueScheduler.action.add_item(backlog_queue_item)
+            if fullBacklog and wasPending:
+                self._queuedToday += 1
 
         # don't consider this an actual backlog search if we only did recent eps
-        # or if we only did certain shows
-        if fromDate == datetime.date.fromordinal(1) or not which_shows:
+        # or if we only did certain shows, or if there's still some of it left to do
+        if fullBacklog and not self._pending:
             self._set_lastBacklog(curDate)
 
         self.amActive = False
@@ -154,30 +264,6 @@ class BacklogSearcher:
         self._lastBacklog = lastBacklog
         return self._lastBacklog
 
-    def _get_season_segments(self, tvdb_id, fromDate):
-        myDB = db.DBConnection()
-        sqlResults = myDB.select("SELECT DISTINCT(season) as season FROM tv_episodes WHERE showid = ? AND season > 0 and airdate > ?", [tvdb_id, fromDate.toordinal()])
-        return [int(x["season"]) for x in sqlResults]
-
-    def _get_air_by_date_segments(self, tvdb_id, fromDate):
-        # query the DB for all dates for this show
-        myDB = db.DBConnection()
-        num_air_by_date_results = myDB.select("SELECT airdate, showid FROM tv_episodes ep, tv_shows show WHERE season != 0 AND ep.showid = show.tvdb_id AND show.paused = 0 ANd ep.airdate > ? AND ep.showid = ?",
-                                 [fromDate.toordinal(), tvdb_id])
-
-        # break them apart into month/year strings
-        air_by_date_segments = []
-        for cur_result in num_air_by_date_results:
-            cur_date = datetime.date.fromordinal(int(cur_result["airdate"]))
-            cur_date_str = str(cur_date)[:7]
-            cur_tvdb_id = int(cur_result["showid"])
-            
-            cur_result_tuple = (cur_tvdb_id, cur_date_str)
-            if cur_result_tuple not in air_by_date_segments:
-                air_by_date_segments.append(cur_result_tuple)
-        
-        return air_by_date_segments
-
     def _set_lastBacklog(self, when):
 
         logger.log(u"Setting the last backlog in the DB to " + str(when), logger.DEBUG)
@@ -0,0 +1,92 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+# Remembers what provider searches returned for a while, so making the same search again soon after
+# (searching an episode twice, the backlog queueing a season again) doesn't go back to the provider.
+# The items each search returned are kept as XML in cache.db so they come back the same as they went in.
+
+import time
+
+import xml.etree.cElementTree as etree
+
+import sickbeard
+
+from sickbeard import db, logger, search_limits
+
+def _text(value):
+    if type(value) == str:
+        return value.decode('utf-8', 'replace')
+    return unicode(value)
+
+def searchKey(search_params):
+    """
+    Returns the same string for any two searches with the same parameters, whether they're given
+    as a search string or as a dict of URL parameters.
+    """
+
+    if isinstance(search_params, dict):
+        return u'&'.join([_text(x) + u'=' + _text(search_params[x]) for x in sorted(search_params.keys())])
+
+    return u' '.join(_text(search_params).split())
+
+def getResults(provider, search_params):
+    """
+    Returns the items a search returned if it was made within the last SEARCH_CACHE_TTL minutes,
+    otherwise None.
+    """
+
+    if sickbeard.SEARCH_CACHE_TTL <= 0:
+        return None
+
+    minTime = int(time.time()) - sickbeard.SEARCH_CACHE_TTL * 60
+
+    myDB = db.DBConnection("cache.db")
+    sqlResults = myDB.select("SELECT items FROM search_cache WHERE provider = ? AND params = ? AND time > ?",
+                             [provider.getID(), searchKey(search_params), minTime])
+
+    items = None
+
+    if sqlResults:
+        try:
+            items = etree.XML(sqlResults[0]["items"].encode('utf-8')).getchildren()
+        except SyntaxError, e:
+            logger.log(u"Unable to read the cached "+provider.name+" results, searching again: "+str(e).decode('utf-8'), logger.DEBUG)
+
+    search_limits.recordCacheLookup(provider, items != None)
+
+    return items
+
+def saveResults(provider, search_params, items):
+    """
+    Keeps the items a search returned. Nothing is kept for searches that didn't return anything
+    since that's also what a failed request looks like.
+    """
+
+    if sickbeard.SEARCH_CACHE_TTL <= 0 or not items:
+        return
+
+    curTime = int(time.time())
+
+    # tostring gives plain ascii with everything else as character references
+    data = '<items>' + ''.join([etree.tostring(x) for x in items]) + '</items>'
+
+    myDB = db.DBConnection("cache.db")
+    myDB.action("DELETE FROM search_cache WHERE time <= ?", [curTime - sickbeard.SEARCH_CACHE_TTL * 60])
+    myDB.upsert("search_cache",
+                {'time': curTime, 'items': data},
+                {'provider': provider.getID(), 'params': searchKey(search_params)})
@@ -0,0 +1,309 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+# Keeps us inside the API limits of the providers. Every request to a provider waits its turn in a
+# token bucket for that provider and searches stop once a provider has used its requests for the
+# day. What each provider used, what was held back and how often the search cache saved a request
+# is counted in memory and written to cache.db every so often.
+
+from __future__ import with_statement
+
+import copy
+import datetime
+import threading
+import time
+
+import sickbeard
+
+from sickbeard import db, logger
+
+# ways to run the backlog: all of it at once, or a bit each day over the backlog cycle
+BACKLOG_BURST = 'burst'
+BACKLOG_SPREAD = 'spread'
+
+# how many requests can go out back to back before the rate limit kicks in
+BUCKET_SIZE = 5
+
+# days of usage to keep in the DB
+USAGE_DAYS = 30
+
+# how often the usage counts are written to the DB
+USAGE_FLUSH_SECONDS = 60
+
+class TokenBucket:
+    """
+    Lets requests through at an average of rate per minute, allowing up to size of them at once
+    after a quiet spell.
+    """
+
+    def __init__(self, rate, size=BUCKET_SIZE):
+        self.rate = rate
+        self.size = size
+
+        self.tokens = float(size)
+        self.last = time.time()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """
+        Waits until another request is allowed. Returns the number of seconds it waited.
+        """
+
+        with self.lock:
+            now = time.time()
+            self.tokens = min(float(self.size), self.tokens + (now - self.last) * self.rate / 60.0)
+            self.last = now
+
+            # the token is taken now so anybody else waiting lines up behind us
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+
+            wait = -self.tokens * 60.0 / self.rate
+
+        time.sleep(wait)
+        return wait
+
+class ProviderUsage:
+    """
+    The requests a provider made on one day.
+    """
+
+    def __init__(self, provider, day, requests=0, throttled=0, skipped=0, wait_time=0, cache_hits=0, cache_misses=0):
+        self.provider = provider
+        self.day = day
+
+        # requests made
+        self.requests = requests
+
+        # requests which had to wait for the rate limit
+        self.throttled = throttled
+
+        # searches which weren't made because the daily budget was used up
+        self.skipped = skipped
+
+        # seconds spent waiting for the rate limit
+        self.wait_time = wait_time
+
+        # searches answered from the search cache, and ones which had to go to the provider
+        self.cache_hits = cache_hits
+        self.cache_misses = cache_misses
+
+    @staticmethod
+    def fromRow(row):
+        return ProviderUsage(row["provider"], int(row["day"]), int(row["requests"]), int(row["throttled"]), int(row["skipped"]),
+                             float(row["wait_time"]), int(row["cache_hits"]), int(row["cache_misses"]))
+
+_buckets = {}
+_usage = {}
+_lock = threading.Lock()
+
+# providers whose usage has changed since it was last written to the DB
+_dirty = set()
+_lastFlush = time.time()
+
+def requestsPerMinute(provider):
+    """
+    Providers can set requestsPerMinute to their own limit, otherwise the config setting is used.
+    0 means no limit.
+    """
+
+    rate = getattr(provider, 'requestsPerMinute', None)
+    if rate == None:
+        rate = sickbeard.PROVIDER_REQUESTS_PER_MINUTE
+    return rate
+
+def dailyBudget(provider):
+    """
+    Providers can set dailyBudget to their own limit, otherwise the config setting is used.
+    0 means no limit.
+    """
+
+    budget = getattr(provider, 'dailyBudget', None)
+    if budget == None:
+        budget = sickbeard.PROVIDER_DAILY_BUDGET
+    return budget
+
+def _getUsage(providerID):
+    """
+    Returns today's usage for the provider, loading it from the DB when we haven't seen it yet
+    today. Must be called with the lock held.
+    """
+
+    today = datetime.date.today().toordinal()
+
+    if providerID in _usage and _usage[providerID].day == today:
+        return _usage[providerID]
+
+    # don't lose the end of yesterday's counts
+    if providerID in _dirty:
+        _saveUsage(_usage[providerID])
+        _dirty.discard(providerID)
+
+    myDB = db.DBConnection("cache.db")
+    sqlResults = myDB.select("SELECT * FROM provider_usage WHERE provider = ? AND day = ?", [providerID, today])
+
+    if sqlResults:
+        usage = ProviderUsage.fromRow(sqlResults[0])
+    else:
+        usage = ProviderUsage(providerID, today)
+        myDB.action("DELETE FROM provider_usage WHERE day < ?", [today - USAGE_DAYS])
+
+    _usage[providerID] = usage
+    return usage
+
+def _changedUsage(usage):
+    """
+    Marks the usage as needing to be written to the DB. Must be called with the lock held.
+    """
+    _dirty.add(usage.provider)
+
+def _flushIfDue():
+    if time.time() - _lastFlush >= USAGE_FLUSH_SECONDS:
+        flushUsage()
+
+def flushUsage():
+    """
+    Writes the usage counts that have changed to the DB.
+    """
+
+    global _lastFlush
+
+    with _lock:
+        toSave = [copy.copy(_usage[x]) for x in _dirty if x in _usage]
+        _dirty.clear()
+        _lastFlush = time.time()
+
+    for curUsage in toSave:
+        _saveUsage(curUsage)
+
+def _saveUsage(usage):
+
+    myDB = db.DBConnection("cache.db")
+    myDB.upsert("provider_usage",
+                {'requests': usage.requests, 'throttled': usage.throttled, 'skipped': usage.skipped, 'wait_time': usage.wait_time,
+                 'cache_hits': usage.cache_hits, 'cache_misses': usage.cache_misses},
+                {'provider': usage.provider, 'day': usage.day})
+
+def waitForRequest(provider):
+    """
+    Waits until the provider's rate limit allows another request and counts it. Called for every
+    request made to a provider, including downloads.
+    """
+
+    providerID = provider.getID()
+    rate = requestsPerMinute(provider)
+
+    with _lock:
+        if rate <= 0:
+            bucket = None
+        else:
+            if providerID not in _buckets or _buckets[providerID].rate != rate:
+                _buckets[providerID] = TokenBucket(rate)
+            bucket = _buckets[providerID]
+
+    wait = 0
+    if bucket:
+        wait = bucket.take()
+        if wait:
+            logger.log(u"Waited "+str(round(wait, 1))+" seconds for the "+provider.name+" rate limit", logger.DEBUG)
+
+    with _lock:
+        usage = _getUsage(providerID)
+        usage.requests += 1
+        if wait:
+            usage.throttled += 1
+            usage.wait_time += wait
+        _changedUsage(usage)
+
+    _flushIfDue()
+
+def remainingRequests(provider):
+    """
+    Returns how many more requests the provider is allowed today, or None if it has no budget.
+    """
+
+    budget = dailyBudget(provider)
+    if budget <= 0:
+        return None
+
+    with _lock:
+        return max(budget - _getUsage(provider.getID()).requests, 0)
+
+def canSearch(provider):
+    """
+    Returns False, and records the skipped search, if the provider has used up today's budget.
+    """
+
+    if remainingRequests(provider) != 0:
+        return True
+
+    logger.log(u"Daily request budget for "+provider.name+" is used up, not searching it until tomorrow", logger.DEBUG)
+
+    with _lock:
+        usage = _getUsage(provider.getID())
+        usage.skipped += 1
+        _changedUsage(usage)
+
+    _flushIfDue()
+
+    return False
+
+def recordCacheLookup(provider, hit):
+    """
+    Counts a search which was, or wasn't, found in the search cache.
+    """
+
+    with _lock:
+        usage = _getUsage(provider.getID())
+        if hit:
+            usage.cache_hits += 1
+        else:
+            usage.cache_misses += 1
+        _changedUsage(usage)
+
+    _flushIfDue()
+
+def remainingBacklogSearches(providerList):
+    """
+    Returns how many more backlog searches can be made today, taking each one to cost a request
+    to every provider that does backlog searches, so the provider with the fewest requests left is
+    the limit. None means there's no limit.
+    """
+
+    remaining = [remainingRequests(x) for x in providerList if x.isActive() and x.supportsBacklog]
+    remaining = [x for x in remaining if x != None]
+
+    if not remaining:
+        return None
+
+    return min(remaining)
+
+def usageToday():
+    """
+    Returns a list of ProviderUsage for every provider that has made requests today.
+    """
+
+    today = datetime.date.today().toordinal()
+
+    flushUsage()
+
+    myDB = db.DBConnection("cache.db")
+    sqlResults = myDB.select("SELECT * FROM provider_usage WHERE day = ? ORDER BY requests DESC", [today])
+
+    return [ProviderUsage.fromRow(x) for x in sqlResults]
@@ -25,6 +25,7 @@ import sickbeard
 from sickbeard import db, logger, common, exceptions, helpers
 from sickbeard import generic_queue
 from sickbeard import search
+from sickbeard import coming_episodes
 
 BACKLOG_SEARCH = 10
 RSS_SEARCH = 20
@@ -74,6 +75,9 @@ class RSSSearchQueueItem(generic_queue.QueueItem):
 
         self._changeMissingEpisodes()
 
+        # bring the next airings on the coming episodes page up to date now the day may have changed
+        coming_episodes.updateNextAirings()
+
         logger.log(u"Beginning search for new episodes on RSS")
 
         foundResults = search.searchForNeededEpisodes()
@@ -117,13 +121,18 @@ class RSSSearchQueueItem(generic_queue.QueueItem):
                 ep.saveToDB()
 
 class BacklogQueueItem(generic_queue.QueueItem):
-    def __init__(self, show, segment):
+    def __init__(self, show, segment, wantSeason=None):
         generic_queue.QueueItem.__init__(self, 'Backlog', BACKLOG_SEARCH)
         self.thread_name = 'BACKLOG-'+str(show.tvdbid)
         
         self.show = show
         self.segment = segment
 
+        # the caller may already know (eg. searchBacklog.planBacklog)
+        if wantSeason != None:
+            self.wantSeason = wantSeason
+            return
+
         logger.log(u"Seeing if we need any episodes from "+self.show.name+" season "+str(self.segment))
 
         myDB = db.DBConnection()
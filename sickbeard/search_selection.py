@@ -0,0 +1,120 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+# Picks what to snatch out of the single and multi-episode results found for a season. Each result
+# is treated as the set of episodes it covers and the set is covered greedily: every episode ends up
+# with the best quality any result offers for it, using as few downloads as we can and never
+# downloading the same episode twice unless that's the only way to get it at its best quality.
+
+from sickbeard import logger
+from sickbeard.common import Quality
+
+class Candidate:
+    """
+    A result along with the episodes it covers and how it ranks against the others.
+    """
+
+    def __init__(self, result, index):
+        self.result = result
+        self.episodes = frozenset([x.episode for x in result.episodes])
+
+        # the quality without UNKNOWN beating everything else
+        if result.quality == Quality.UNKNOWN:
+            self.quality = -1
+        else:
+            self.quality = result.quality
+
+        lowerName = result.name.lower()
+        self.isProper = "proper" in lowerName or "repack" in lowerName
+        self.isInternal = "internal" in lowerName
+
+        # the size per episode, so we can go for the smallest download when all else is equal
+        size = getattr(result, 'size', -1)
+        if size > 0:
+            self.epSize = float(size) / len(self.episodes)
+        else:
+            self.epSize = None
+
+        # where it was in the list we were given, so ties always go the same way
+        self.index = index
+
+    def score(self, uncovered, covered, bestQuality):
+        """
+        Returns a key to compare this against the other candidates with, bigger is better, or None if
+        it doesn't get any of the uncovered episodes at their best quality.
+        """
+
+        newEps = len([x for x in self.episodes & uncovered if self.quality >= bestQuality[x]])
+        if not newEps:
+            return None
+
+        overlap = len(self.episodes & covered)
+
+        if self.epSize == None:
+            sizeKey = (0, 0)
+        else:
+            sizeKey = (1, -self.epSize)
+
+        return (overlap == 0, newEps, self.isProper, not self.isInternal, sizeKey, -self.index)
+
+def pickResults(results):
+    """
+    Takes a list of single and multi-episode results for one season and returns the ones to snatch,
+    ordered by their first episode.
+    """
+
+    candidates = [Candidate(x, i) for (i, x) in enumerate(results) if x.episodes]
+
+    # the best quality available for every episode
+    bestQuality = {}
+    for curCandidate in candidates:
+        for curEp in curCandidate.episodes:
+            if curEp not in bestQuality or curCandidate.quality > bestQuality[curEp]:
+                bestQuality[curEp] = curCandidate.quality
+
+    uncovered = set(bestQuality.keys())
+    covered = set()
+    picked = []
+
+    # there's always a candidate which gets an uncovered episode at its best quality (the one that
+    # set it in bestQuality) so this covers every episode
+    while uncovered:
+
+        bestScore = None
+        bestCandidate = None
+
+        for curCandidate in candidates:
+            curScore = curCandidate.score(uncovered, covered, bestQuality)
+            if curScore != None and (bestScore == None or curScore > bestScore):
+                bestScore = curScore
+                bestCandidate = curCandidate
+
+        logger.log(u"Picked "+bestCandidate.result.name+" for episodes "+str(sorted(bestCandidate.episodes & uncovered)), logger.DEBUG)
+
+        picked.append(bestCandidate)
+        candidates.remove(bestCandidate)
+
+        uncovered -= bestCandidate.episodes
+        covered |= bestCandidate.episodes
+
+        # anything left that doesn't have an uncovered episode will never be picked
+        candidates = [x for x in candidates if x.episodes & uncovered]
+
+    picked.sort(key=lambda x: (min(x.episodes), x.index))
+
+    return [x.result for x in picked]
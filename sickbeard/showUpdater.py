@@ -23,6 +23,7 @@ from sickbeard.common import *
 from sickbeard import logger
 from sickbeard import exceptions
 from sickbeard import ui
+from sickbeard import tvrage
 
 class ShowUpdater():
 
@@ -44,6 +45,9 @@ class ShowUpdater():
         else:
             return
 
+        # match up any shows without a TVRage ID all at once rather than one at a time during their updates
+        tvrage.resolveAll()
+
         piList = []
 
         for curShow in sickbeard.showList:
@@ -29,6 +29,9 @@ from sickbeard.common import *
 from sickbeard.tv import TVShow
 from sickbeard import exceptions, helpers, logger, ui, db
 from sickbeard import generic_queue
+from sickbeard import episode_stats
+from sickbeard import coming_episodes
+from sickbeard import resource_versions
 
 class ShowQueue(generic_queue.GenericQueue):
 
@@ -277,6 +280,9 @@ class QueueItemAdd(ShowQueueItem):
             logger.log(u"Setting all episodes to the specified default status: "+str(self.default_status))
             myDB = db.DBConnection();
             myDB.action("UPDATE tv_episodes SET status = ? WHERE status = ? AND showid = ? AND season != 0", [self.default_status, SKIPPED, self.show.tvdbid])
+            episode_stats.reloadShow(self.show.tvdbid)
+            coming_episodes.refreshShow(self.show.tvdbid)
+            resource_versions.bumpEpisodes(self.show.tvdbid)
 
         # if they started with WANTED eps then run the backlog
         if self.default_status == WANTED:
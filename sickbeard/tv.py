@@ -37,6 +37,9 @@ from sickbeard import helpers, exceptions, logger
 from sickbeard import tvrage
 from sickbeard import config
 from sickbeard import image_cache
+from sickbeard import episode_stats
+from sickbeard import coming_episodes
+from sickbeard import resource_versions
 
 from sickbeard import encodingKludge as ek
 
@@ -657,15 +660,16 @@ class TVShow(object):
         myDB = db.DBConnection()
         myDB.action("DELETE FROM tv_episodes WHERE showid = ?", [self.tvdbid])
         myDB.action("DELETE FROM tv_shows WHERE tvdb_id = ?", [self.tvdbid])
+        episode_stats.removeShow(self.tvdbid)
+        coming_episodes.refreshShow(self.tvdbid)
+        resource_versions.bump(resource_versions.SHOWS)
+        resource_versions.bumpEpisodes(self.tvdbid)
 
         # remove self from show list
         sickbeard.showList = [x for x in sickbeard.showList if x.tvdbid != self.tvdbid]
         
         # clear the cache
-        image_cache_dir = ek.ek(os.path.join, sickbeard.CACHE_DIR, 'images')
-        for cache_file in ek.ek(glob.glob, ek.ek(os.path.join, image_cache_dir, str(self.tvdbid)+'.*')):
-            logger.log(u"Deleting cache file "+cache_file)
-            os.remove(cache_file)
+        image_cache.ImageCache().delete_images(self.tvdbid)
 
     def populateCache(self):
         cache_inst = image_cache.ImageCache()
@@ -812,6 +816,8 @@ class TVShow(object):
 
         myDB.upsert("tv_shows", newValueDict, controlValueDict)
 
+        resource_versions.bump(resource_versions.SHOWS)
+
 
     def __str__(self):
         toReturn = ""
@@ -935,6 +941,9 @@ class TVEpisode(object):
         # setting any of the above sets the dirty flag
         self.dirty = True
 
+        # the airdate and status as they are in the DB, None if we don't know
+        self._savedAiring = None
+
         self.show = show
         self._location = file
 
@@ -1045,6 +1054,8 @@ class TVEpisode(object):
 
             self.tvdbid = int(sqlResults[0]["tvdbid"])
 
+            self._savedAiring = (self.airdate, self.status)
+
             self.dirty = False
             return True
 
@@ -1300,6 +1311,9 @@ class TVEpisode(object):
         myDB = db.DBConnection()
         sql = "DELETE FROM tv_episodes WHERE showid="+str(self.show.tvdbid)+" AND season="+str(self.season)+" AND episode="+str(self.episode)
         myDB.action(sql)
+        episode_stats.removeEpisode(self.show.tvdbid, self.season, self.episode)
+        coming_episodes.refreshShow(self.show.tvdbid)
+        resource_versions.bumpEpisodes(self.show.tvdbid)
 
         raise exceptions.EpisodeDeletedException()
 
@@ -1328,6 +1342,15 @@ class TVEpisode(object):
         # use a custom update/insert method to get the data into the DB
         myDB.upsert("tv_episodes", newValueDict, controlValueDict)
 
+        # keep the episode counts on the web pages up to date
+        episode_stats.updateEpisode(self.show.tvdbid, self.season, self.episode, self.status, self.airdate.toordinal(), self.location)
+        resource_versions.bumpEpisodes(self.show.tvdbid)
+
+        # the show's next airing can change with any airdate or status, not only upcoming ones
+        if (self.airdate, self.status) != self._savedAiring:
+            coming_episodes.refreshShow(self.show.tvdbid)
+            self._savedAiring = (self.airdate, self.status)
+
 
     def fullPath (self):
         if self.location == None or self.location == "":
@@ -19,6 +19,7 @@
 import time
 import datetime
 import sqlite3
+import re
 
 import sickbeard
 
@@ -35,6 +36,13 @@ from lib.tvdb_api import tvdb_api, tvdb_exceptions
 
 from name_parser.parser import NameParser, InvalidNameException
 
+def isProper(name):
+    """
+    Returns True if the name is a PROPER or REPACK release.
+    """
+
+    return re.search('(^|[\. _-])(proper|repack)([\. _-]|$)', name, re.I) != None
+
 
 class CacheDBConnection(db.DBConnection):
 
@@ -114,7 +122,8 @@ class TVCache():
             items = responseSoup.getiterator('item')
         except Exception, e:
             logger.log(u"Error trying to load "+self.provider.name+" RSS feed: "+str(e).decode('utf-8'), logger.ERROR)
-            logger.log(u"Feed contents: "+repr(data), logger.DEBUG)
+            if logger.isEnabledFor(logger.DEBUG):
+                logger.log(u"Feed contents: "+repr(data), logger.DEBUG)
             return []
 
         if responseSoup.getroot().tag != 'rss':
@@ -178,7 +187,56 @@ class TVCache():
 
     def _addCacheEntry(self, name, url, season=None, episodes=None, tvdb_id=0, tvrage_id=0, quality=None, extraNames=[]):
 
+        entry = self._classifyEntry(name, url, season, episodes, tvdb_id, tvrage_id, quality, extraNames)
+        if not entry:
+            return False
+
+        (season, episodeText, tvrage_id, tvdb_id, quality) = entry
+
+        # get the current timestamp
+        curTimestamp = int(time.mktime(datetime.datetime.today().timetuple()))
+
+        myDB = self._getDB()
+        myDB.action("INSERT INTO "+self.providerID+" (name, season, episodes, tvrid, tvdbid, url, time, quality) VALUES (?,?,?,?,?,?,?,?)",
+                    [name, season, episodeText, tvrage_id, tvdb_id, url, curTimestamp, quality])
+
+        if isProper(name):
+            self._addProper(name, url, season, episodeText, tvdb_id, quality, curTimestamp)
+
+    def addProper(self, name, url, date):
+        """
+        Records a proper which was found some other way than the RSS feed, eg. by searching for it.
+        """
+
+        entry = self._classifyEntry(name, url)
+        if not entry:
+            return
+
+        (season, episodeText, tvrage_id, tvdb_id, quality) = entry
+
+        self._addProper(name, url, season, episodeText, tvdb_id, quality, int(time.mktime(date.timetuple())))
+
+    def _addProper(self, name, url, season, episodeText, tvdb_id, quality, curTimestamp):
+        """
+        Keeps a proper for one of our shows in the propers table, which outlives the provider's
+        cache so the proper finder can go through everything found over the last few days.
+        """
+
+        # nothing would ever look at it
+        if not tvdb_id or not sickbeard.DOWNLOAD_PROPERS:
+            return
+
+        logger.log(u"Found proper "+name+" for show "+str(tvdb_id), logger.DEBUG)
+
         myDB = self._getDB()
+        myDB.action("INSERT OR IGNORE INTO propers (provider, name, url, tvdbid, season, episodes, quality, time) VALUES (?,?,?,?,?,?,?,?)",
+                    [self.providerID, name, url, tvdb_id, season, episodeText, quality, curTimestamp])
+
+    def _classifyEntry(self, name, url, season=None, episodes=None, tvdb_id=0, tvrage_id=0, quality=None, extraNames=[]):
+        """
+        Works out which show and episodes a result is for. Returns (season, episodeText, tvrage_id,
+        tvdb_id, quality) or False if it can't be worked out.
+        """
 
         parse_result = None
 
@@ -225,8 +283,20 @@ class TVCache():
             # if they're both empty then fill out as much info as possible by searching the show name
             else:
 
-                showResult = helpers.searchDBForShow(parse_result.series_name)
-                if showResult:
+                # scene exceptions are kept in memory so they're the cheapest thing to check
+                scene_id = sceneHelpers.get_scene_exception_by_name(parse_result.series_name)
+                if scene_id and not helpers.findCertainShow(sickbeard.showList, scene_id):
+                    scene_id = None
+
+                showResult = None
+                if not scene_id:
+                    showResult = helpers.searchDBForShow(parse_result.series_name)
+
+                if scene_id:
+                    logger.log(parse_result.series_name+" is a scene exception for show "+str(scene_id), logger.DEBUG)
+                    tvdb_id = scene_id
+
+                elif showResult:
                     logger.log(parse_result.series_name+" was found to be show "+showResult[1]+" ("+str(showResult[0])+") in our DB.", logger.DEBUG)
                     tvdb_id = showResult[0]
 
@@ -274,17 +344,12 @@ class TVCache():
 
         episodeText = "|"+"|".join(map(str, episodes))+"|"
 
-
-        # get the current timestamp
-        curTimestamp = int(time.mktime(datetime.datetime.today().timetuple()))
-
         if not quality:
             quality = self.getQuality(name, season, episodeText, tvrage_id, tvdb_id, url)
 
-        myDB.action("INSERT INTO "+self.providerID+" (name, season, episodes, tvrid, tvdbid, url, time, quality) VALUES (?,?,?,?,?,?,?,?)",
-                    [name, season, episodeText, tvrage_id, tvdb_id, url, curTimestamp, quality])
+        return (season, episodeText, tvrage_id, tvdb_id, quality)
 
-    def getQuality(name, season, episodeText, tvrid, tvdbid):
+    def getQuality(self, name, season, episodeText, tvrid, tvdbid, url):
         return Quality.nameQuality(name)
 
     def searchCache(self, episode, manualSearch=False):
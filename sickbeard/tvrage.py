@@ -16,10 +16,11 @@
 # You should have received a copy of the GNU General Public License
 # along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
 
-
+from __future__ import with_statement
 
 import urllib, urllib2
 import datetime
+import time
 import traceback
 
 import sickbeard
@@ -28,13 +29,137 @@ from sickbeard import logger
 from sickbeard.common import *
 
 from sickbeard import db
-from sickbeard import exceptions, helpers
+from sickbeard import exceptions, helpers, episode_stats, coming_episodes, resource_versions
 
 from lib.tvdb_api import tvdb_api, tvdb_exceptions
 
+QUICKINFO_URL = "http://services.tvrage.com/tools/quickinfo.php?"
+
+# after a show fails to match we wait this long before trying again, doubling with every failure
+RETRY_HOURS = 6
+MAX_RETRY_DAYS = 28
+
+# how many shows resolveAll looks up on TVRage at once
+RESOLVE_THREADS = 4
+
+def _getCachedMatches(tvdbids):
+    """
+    Returns a dict of TVDB ID -> tvrage_cache row for the given shows.
+    """
+
+    if not tvdbids:
+        return {}
+
+    myDB = db.DBConnection("cache.db")
+    sqlResults = myDB.select("SELECT * FROM tvrage_cache WHERE tvdb_id IN ("+",".join(["?"]*len(tvdbids))+")", tvdbids)
+
+    return dict([(int(x["tvdb_id"]), x) for x in sqlResults])
+
+def _retryTime(cacheRow):
+    """
+    Returns the time after which a show that failed to match can be tried again.
+    """
+
+    wait = min(RETRY_HOURS * 3600 * 2 ** (int(cacheRow["failures"]) - 1), MAX_RETRY_DAYS * 86400)
+    return int(cacheRow["last_attempt"]) + wait
+
+def _saveMatch(tvdbid, tvrid, tvrname):
+
+    myDB = db.DBConnection("cache.db")
+    myDB.upsert("tvrage_cache",
+                {'tvr_id': tvrid, 'tvr_name': tvrname, 'last_attempt': int(time.time()), 'failures': 0},
+                {'tvdb_id': tvdbid})
+
+def _saveFailure(tvdbid):
+
+    myDB = db.DBConnection("cache.db")
+    sqlResults = myDB.select("SELECT failures FROM tvrage_cache WHERE tvdb_id = ?", [tvdbid])
+
+    if sqlResults:
+        failures = int(sqlResults[0]["failures"]) + 1
+    else:
+        failures = 1
+
+    myDB.upsert("tvrage_cache",
+                {'tvr_id': 0, 'tvr_name': None, 'last_attempt': int(time.time()), 'failures': failures},
+                {'tvdb_id': tvdbid})
+
+def _seasonPremieres(tvdbids):
+    """
+    Returns a dict of TVDB ID -> {season: airdate of episode 1} for the given shows, from the episodes
+    we already have in the DB.
+    """
+
+    premieres = {}
+
+    if not tvdbids:
+        return premieres
+
+    myDB = db.DBConnection()
+    sqlResults = myDB.select("SELECT showid, season, airdate FROM tv_episodes WHERE episode = 1 AND season > 0 AND airdate > 1 AND showid IN ("+",".join(["?"]*len(tvdbids))+")", tvdbids)
+
+    for curResult in sqlResults:
+        premieres.setdefault(int(curResult["showid"]), {})[int(curResult["season"])] = datetime.date.fromordinal(int(curResult["airdate"]))
+
+    return premieres
+
+def _resolveShow(show, premieres):
+
+    with show.lock:
+        if show.tvrid != 0:
+            return
+
+    # the show is only locked to store the ID, not for the whole lookup
+    try:
+        tvr = TVRage(show, premieres, save=False)
+    except exceptions.TVRageException, e:
+        logger.log(u"Couldn't get the TVRage ID for "+show.name+": "+str(e).decode('utf-8'), logger.DEBUG)
+        return
+
+    with show.lock:
+        # something else may have matched it while we were looking
+        if show.tvrid != 0:
+            return
+        tvr.saveToShow()
+
+def resolveAll(showList=None):
+    """
+    Looks for the TVRage ID of every show that doesn't have one yet, except the ones waiting to be
+    retried. The air dates come out of the DB in one go and the TVRage lookups are done in parallel.
+    """
+
+    if showList == None:
+        showList = sickbeard.showList
+
+    unmatched = [x for x in showList if x.tvrid == 0]
+    cachedMatches = _getCachedMatches([x.tvdbid for x in unmatched])
+
+    toResolve = []
+    for curShow in unmatched:
+        cacheRow = cachedMatches.get(curShow.tvdbid)
+        if cacheRow and not int(cacheRow["tvr_id"]) and time.time() < _retryTime(cacheRow):
+            continue
+        toResolve.append(curShow)
+
+    if not toResolve:
+        return
+
+    logger.log(u"Looking for the TVRage IDs of "+str(len(toResolve))+" shows")
+
+    premieres = _seasonPremieres([x.tvdbid for x in toResolve])
+
+    pool = helpers.DownloadPool(RESOLVE_THREADS, RESOLVE_THREADS)
+    for curShow in toResolve:
+        pool.add(QUICKINFO_URL, _resolveShow, curShow, premieres.get(curShow.tvdbid, {}))
+    pool.run()
+
 class TVRage:
 
-    def __init__(self, show):
+    def __init__(self, show, premieres=None, save=True):
+        """
+        premieres: optional dict of season -> airdate of episode 1, to use instead of looking them up
+        save: if False the TVRage ID is only looked up, saveToShow() has to be called to store it
+        """
 
         self.show = show
 
@@ -45,110 +170,150 @@ class TVRage:
         self._tvrname = None
 
         if self.show.tvrid == 0:
+            self._resolveID(premieres)
 
-            # if it's the right show then use the tvrage ID that the last lookup found (cached in self._trvid)
-            show_is_right = self.confirmShow() or self.checkSync()
-
-            if not show_is_right:
-                raise exceptions.TVRageException("Shows aren't the same, aborting")
+        if save:
+            self.saveToShow()
 
-            if self._tvrid == 0 or self._tvrname == None:
-                raise exceptions.TVRageException("We confirmed sync but got invalid data (no ID/name)")
+    def saveToShow(self):
+        """
+        Gives the show the TVRage ID and name that were found, if it doesn't have them yet.
+        """
 
-            if show_is_right:
+        if self.show.tvrid == 0:
 
-                logger.log(u"Setting TVRage ID for "+show.name+" to "+str(self._tvrid))
-                self.show.tvrid = self._tvrid
-                self.show.saveToDB()
+            logger.log(u"Setting TVRage ID for "+self.show.name+" to "+str(self._tvrid))
+            self.show.tvrid = self._tvrid
+            self.show.saveToDB()
 
         if not self.show.tvrname:
 
             if self._tvrname == None:
                 self._getTVRageInfo()
 
-            logger.log(u"Setting TVRage Show Name for "+show.name+" to "+self._tvrname)
+            logger.log(u"Setting TVRage Show Name for "+self.show.name+" to "+self._tvrname)
             self.show.tvrname = self._tvrname
             self.show.saveToDB()
 
 
-    def confirmShow(self, force=False):
+    def _resolveID(self, premieres=None):
+        """
+        Finds the TVRage ID and name for the show, using the one we matched before if there is one.
+        Failures are remembered in cache.db and the show isn't tried again until its retry time.
+        """
 
-        if self.show.tvrid != 0 and not force:
-            logger.log(u"We already have a TVRage ID, skipping confirmation", logger.DEBUG)
-            return True
+        cacheRow = _getCachedMatches([self.show.tvdbid]).get(self.show.tvdbid)
 
-        logger.log(u"Checking the first episode of each season to see if the air dates match between TVDB and TVRage")
+        if cacheRow and int(cacheRow["tvr_id"]):
+            logger.log(u"Using the TVRage ID we matched "+self.show.name+" with before", logger.DEBUG)
+            self._tvrid = int(cacheRow["tvr_id"])
+            self._tvrname = cacheRow["tvr_name"]
+            return
+
+        if cacheRow and time.time() < _retryTime(cacheRow):
+            raise exceptions.TVRageException("Couldn't match the show with TVRage last time, not trying again until "+time.strftime("%Y-%m-%d %H:%M", time.localtime(_retryTime(cacheRow))))
+
+        try:
+            # if it's the right show then use the tvrage ID that the last lookup found (cached in self._trvid)
+            show_is_right = self.confirmShow(premieres=premieres) or self.checkSync()
+
+            if not show_is_right:
+                raise exceptions.TVRageException("Shows aren't the same, aborting")
+
+            if self._tvrid == 0 or self._tvrname == None:
+                raise exceptions.TVRageException("We confirmed sync but got invalid data (no ID/name)")
+
+        except exceptions.TVRageException:
+            _saveFailure(self.show.tvdbid)
+            raise
+
+        self._tvrid = int(self._tvrid)
+        _saveMatch(self.show.tvdbid, self._tvrid, self._tvrname)
+
+    def _tvdbPremieres(self):
+        """
+        Returns a dict of season -> airdate of episode 1 from TVDB, or None if TVDB can't be reached.
+        """
 
         tvdb_lang = self.show.lang
 
         try:
+            # There's gotta be a better way of doing this but we don't wanna
+            # change the language value elsewhere
+            ltvdb_api_parms = sickbeard.TVDB_API_PARMS.copy()
 
-            try:
-                # There's gotta be a better way of doing this but we don't wanna
-                # change the language value elsewhere
-                ltvdb_api_parms = sickbeard.TVDB_API_PARMS.copy()
+            if tvdb_lang and not tvdb_lang == 'en':
+                ltvdb_api_parms['language'] = tvdb_lang
 
-                if tvdb_lang and not tvdb_lang == 'en':
-                    ltvdb_api_parms['language'] = tvdb_lang
+            t = tvdb_api.Tvdb(**ltvdb_api_parms)
 
-                t = tvdb_api.Tvdb(**ltvdb_api_parms)
-            except tvdb_exceptions.tvdb_exception, e:
-                logger.log(u"Currently this doesn't work with TVDB down but with some DB magic it can be added", logger.DEBUG)
-                return None
+            premieres = {}
 
-            # check the first episode of every season
             for curSeason in t[self.show.tvdbid]:
 
-                logger.log(u"Checking TVDB and TVRage sync for season "+str(curSeason), logger.DEBUG)
+                # don't do specials and don't do seasons with no episode 1
+                if curSeason == 0 or 1 not in t[self.show.tvdbid][curSeason]:
+                    continue
 
-                airdate = None
+                ep = t[self.show.tvdbid][curSeason][1]
 
-                try:
+                # make sure we have a date to compare with
+                if ep["firstaired"] == "" or ep["firstaired"] == None:
+                    continue
 
-                    # don't do specials and don't do seasons with no episode 1
-                    if curSeason == 0 or 1 not in t[self.show.tvdbid]:
-                        continue
+                rawAirdate = [int(x) for x in ep["firstaired"].split("-")]
+                premieres[curSeason] = datetime.date(rawAirdate[0], rawAirdate[1], rawAirdate[2])
 
-                    # get the episode info from TVDB
-                    ep = t[self.show.tvdbid][curSeason][1]
+        except tvdb_exceptions.tvdb_exception, e:
+            logger.log(u"Unable to get the season premieres from TVDB: "+str(e).decode('utf-8'), logger.DEBUG)
+            return None
 
-                    # make sure we have a date to compare with
-                    if ep["firstaired"] == "" or ep["firstaired"] == None:
-                        continue
+        return premieres
 
-                    # get a datetime object
-                    rawAirdate = [int(x) for x in ep["firstaired"].split("-")]
-                    airdate = datetime.date(rawAirdate[0], rawAirdate[1], rawAirdate[2])
+    def confirmShow(self, force=False, premieres=None):
+        """
+        premieres: optional dict of season -> airdate of episode 1, otherwise they come from the DB
+        or from TVDB if the DB doesn't have any
+        """
 
-                    # get the episode info from TVRage
-                    info = self._getTVRageInfo(curSeason, 1)
+        if self.show.tvrid != 0 and not force:
+            logger.log(u"We already have a TVRage ID, skipping confirmation", logger.DEBUG)
+            return True
+
+        logger.log(u"Checking the first episode of each season to see if the air dates match between TVDB and TVRage")
+
+        try:
 
-                    # make sure we have enough info
-                    if info == None or not info.has_key('Episode Info'):
-                        logger.log(u"TVRage doesn't have the episode info, skipping it", logger.DEBUG)
-                        continue
+            if not premieres:
+                premieres = _seasonPremieres([self.show.tvdbid]).get(self.show.tvdbid)
 
-                    # parse the episode info
-                    curEpInfo = self._getEpInfo(info['Episode Info'])
+            if not premieres:
+                premieres = self._tvdbPremieres()
 
-                    # make sure we got some info back
-                    if curEpInfo == None:
-                        continue
+            if premieres == None:
+                return None
+
+            # check the first episode of every season
+            for curSeason in sorted(premieres.keys()):
+
+                logger.log(u"Checking TVDB and TVRage sync for season "+str(curSeason), logger.DEBUG)
 
-                # if we couldn't compare with TVDB try comparing it with the local database
-                except tvdb_exceptions.tvdb_exception, e:
-                    logger.log(u"Unable to check TVRage info against TVDB: "+str(e).decode('utf-8'))
+                airdate = premieres[curSeason]
 
-                    logger.log(u"Trying against DB instead", logger.DEBUG)
+                # get the episode info from TVRage
+                info = self._getTVRageInfo(curSeason, 1)
 
-                    myDB = db.DBConnection()
-                    sqlResults = myDB.select("SELECT * FROM tv_episodes WHERE showid = ? AND season = ? and episode = ?", [self.show.tvdbid, self.lastEpInfo['season'], self.lastEpInfo['episode']])
+                # make sure we have enough info
+                if info == None or not info.has_key('Episode Info'):
+                    logger.log(u"TVRage doesn't have the episode info, skipping it", logger.DEBUG)
+                    continue
 
-                    if len(sqlResults) == 0:
-                        raise exceptions.EpisodeNotFoundException("Unable to find episode in DB")
-                    else:
-                        airdate = datetime.date.fromordinal(int(sqlResults[0]["airdate"]))
+                # parse the episode info
+                curEpInfo = self._getEpInfo(info['Episode Info'])
 
+                # make sure we got some info back
+                if curEpInfo == None:
+                    continue
 
                 # check if TVRage and TVDB have the same airdate for this episode
                 if curEpInfo['airdate'] == airdate:
@@ -224,7 +389,7 @@ class TVRage:
 
     def _getTVRageInfo(self, season=None, episode=None, full=False):
 
-        url = "http://services.tvrage.com/tools/quickinfo.php?"
+        url = QUICKINFO_URL
 
         # if we need full info OR if we don't have a tvrage id, use show name
         if full == True or self.show.tvrid == 0:
@@ -328,6 +493,9 @@ class TVRage:
         # insert it
         myDB.action("INSERT INTO tv_episodes (showid, tvdbid, name, season, episode, description, airdate, hasnfo, hastbn, status, location) VALUES (?,?,?,?,?,?,?,?,?,?,?)", \
                     [self.show.tvdbid, -1, self.nextEpInfo['name'], self.nextEpInfo['season'], self.nextEpInfo['episode'], '', self.nextEpInfo['airdate'].toordinal(), 0, 0, UNAIRED, ''])
+        episode_stats.updateEpisode(self.show.tvdbid, self.nextEpInfo['season'], self.nextEpInfo['episode'], UNAIRED, self.nextEpInfo['airdate'].toordinal(), '')
+        coming_episodes.refreshShow(self.show.tvdbid)
+        resource_versions.bumpEpisodes(self.show.tvdbid)
 
         # once it's in the DB make an object and return it
         ep = None
@@ -38,7 +38,8 @@ class ProgressIndicator():
 class ProgressIndicators():
     _pi = {'massUpdate': [],
            'massAdd': [],
-           'dailyUpdate': []
+           'dailyUpdate': [],
+           'imageCache': []
            }
 
     @staticmethod
@@ -40,6 +40,11 @@ from sickbeard import logger, helpers, exceptions, classes, db
 from sickbeard import encodingKludge as ek
 from sickbeard import search_queue
 from sickbeard import image_cache
+from sickbeard import episode_stats
+from sickbeard import coming_episodes
+from sickbeard import resource_versions
+from sickbeard import page_cache
+from sickbeard import search_limits
 
 from sickbeard.notifiers import xbmc
 from sickbeard.notifiers import plex
@@ -61,11 +66,59 @@ import sickbeard
 from sickbeard import browser
 
 
-class PageTemplate (Template):
+# compiled template classes, (path, base class) -> (mtime, class)
+_templateClasses = {}
+_templateLock = threading.Lock()
+
+def _compileTemplate(path, baseclass=Template):
+    """
+    Returns the class for the template at path, only parsing and compiling it again if the file
+    has changed since the last time.
+    """
+
+    mtime = ek.ek(os.path.getmtime, path)
+
+    with _templateLock:
+        if (path, baseclass) in _templateClasses and _templateClasses[(path, baseclass)][0] == mtime:
+            return _templateClasses[(path, baseclass)][1]
+
+    logger.log(u"Compiling template "+path, logger.DEBUG)
+    templateClass = Template.compile(file=path, baseclass=baseclass)
+
+    with _templateLock:
+        _templateClasses[(path, baseclass)] = (mtime, templateClass)
+
+    return templateClass
+
+def staticURL(path):
+    """
+    Returns the URL of a file in data/ with the file's mtime added so the browser can cache it
+    forever and will still get the new one when it changes, eg. staticURL("js/config.js")
+    """
+
+    try:
+        version = int(ek.ek(os.path.getmtime, ek.ek(os.path.join, sickbeard.PROG_DIR, 'data', path)))
+    except OSError:
+        return sickbeard.WEB_ROOT + '/' + path
+
+    return sickbeard.WEB_ROOT + '/' + path + '?v=' + str(version)
+
+class _IncludeCompiler:
+    """
+    Used by Cheetah to compile #include'd files so that inc_top.tmpl etc. come from the cache too.
+    """
+
+    @staticmethod
+    def compile(source=None, file=None):
+        if isinstance(file, basestring):
+            return _compileTemplate(file)
+        return Template.compile(source=source, file=file)
+
+class BasePageTemplate (Template):
     def __init__(self, *args, **KWs):
-        KWs['file'] = os.path.join(sickbeard.PROG_DIR, "data/interfaces/default/", KWs['file'])
-        super(PageTemplate, self).__init__(*args, **KWs)
+        super(BasePageTemplate, self).__init__(*args, **KWs)
         self.sbRoot = sickbeard.WEB_ROOT
+        self.staticURL = staticURL
         self.projectHomePage = "http://code.google.com/p/sickbeard/"
 
         logPageTitle = 'Logs &amp; Errors'
@@ -83,6 +136,17 @@ class PageTemplate (Template):
         ]
         self.flash = ui.Flash()
 
+    def _getTemplateAPIClassForIncludeDirectiveCompilation(self, source, file):
+        return _IncludeCompiler
+
+def PageTemplate(*args, **KWs):
+    """
+    Makes a new page from one of the templates in data/interfaces/default, eg. PageTemplate(file="home.tmpl")
+    """
+
+    templateClass = _compileTemplate(os.path.join(sickbeard.PROG_DIR, "data/interfaces/default/", KWs.pop('file')), BasePageTemplate)
+    return templateClass(*args, **KWs)
+
 def redirect(abspath, *args, **KWs):
     assert abspath[0] == '/'
     raise cherrypy.HTTPRedirect(sickbeard.WEB_ROOT + abspath, *args, **KWs)
@@ -142,6 +206,8 @@ class ManageSearches:
         t.backlogPaused = sickbeard.searchQueueScheduler.action.is_backlog_paused()
         t.backlogRunning = sickbeard.searchQueueScheduler.action.is_backlog_in_progress()
         t.searchStatus = sickbeard.currentSearchScheduler.action.amActive
+        t.backlogPending = sickbeard.backlogSearchScheduler.action.numPending()
+        t.providerUsage = search_limits.usageToday()
         t.submenu = ManageMenu
 
         return _munge(t)
@@ -312,21 +378,18 @@ class Manage:
 
         for curShow in sickbeard.showList:
 
-            epCounts = {}
+            epCounts = episode_stats.overviewCounts(curShow)
             epCats = {}
-            epCounts[Overview.SKIPPED] = 0
-            epCounts[Overview.WANTED] = 0
-            epCounts[Overview.QUAL] = 0
-            epCounts[Overview.GOOD] = 0
-            epCounts[Overview.UNAIRED] = 0
+            sqlResults = []
 
-            sqlResults = myDB.select("SELECT * FROM tv_episodes WHERE showid = ? ORDER BY season*1000+episode DESC", [curShow.tvdbid])
+            # only the wanted and low quality episodes are listed so don't bother loading the rest
+            backlogStatuses = [status for (status, overview) in episode_stats.statusOverviews(curShow).items() if overview in (Overview.WANTED, Overview.QUAL)]
 
-            for curResult in sqlResults:
+            if backlogStatuses:
+                sqlResults = myDB.select("SELECT * FROM tv_episodes WHERE showid = ? AND status IN ("+",".join(["?"] * len(backlogStatuses))+") ORDER BY season*1000+episode DESC", [curShow.tvdbid] + backlogStatuses)
 
-                curEpCat = curShow.getOverview(int(curResult["status"]))
-                epCats[str(curResult["season"])+"x"+str(curResult["episode"])] = curEpCat
-                epCounts[curEpCat] += 1
+            for curResult in sqlResults:
+                epCats[str(curResult["season"])+"x"+str(curResult["episode"])] = curShow.getOverview(int(curResult["status"]))
 
             showCounts[curShow.tvdbid] = epCounts
             showCats[curShow.tvdbid] = epCats
@@ -553,15 +616,42 @@ class Manage:
 class History:
 
     @cherrypy.expose
-    def index(self):
+    def index(self, before=None, show=None, action=None, provider=None):
 
-        myDB = db.DBConnection()
+        actionMap = {'snatched': Quality.SNATCHED + Quality.SNATCHED_PROPER,
+                     'downloaded': Quality.DOWNLOADED}
+
+        try:
+            showid = int(show)
+        except (TypeError, ValueError):
+            showid = None
 
-#        sqlResults = myDB.select("SELECT h.*, show_name, name FROM history h, tv_shows s, tv_episodes e WHERE h.showid=s.tvdb_id AND h.showid=e.showid AND h.season=e.season AND h.episode=e.episode ORDER BY date DESC LIMIT "+str(numPerPage*(p-1))+", "+str(numPerPage))
-        sqlResults = myDB.select("SELECT h.*, show_name FROM history h, tv_shows s WHERE h.showid=s.tvdb_id ORDER BY date DESC")
+        if action not in actionMap:
+            action = None
+
+        sqlResults, nextKey = history.getHistory(before=before, showid=showid, actions=actionMap.get(action), provider=provider)
+
+        # the filters are kept when going from page to page
+        filterArgs = {}
+        if showid:
+            filterArgs['show'] = showid
+        if action:
+            filterArgs['action'] = action
+        if provider:
+            filterArgs['provider'] = provider.encode('utf-8')
 
         t = PageTemplate(file="history.tmpl")
         t.historyResults = sqlResults
+        t.showFilter = showid
+        t.actionFilter = action
+        t.providerFilter = provider
+        t.isFirstPage = not before
+        t.newestURL = "?" + urllib.urlencode(filterArgs)
+        if nextKey:
+            filterArgs['before'] = nextKey
+            t.olderURL = "?" + urllib.urlencode(filterArgs)
+        else:
+            t.olderURL = None
         t.submenu = [
             { 'title': 'Clear History', 'path': 'history/clearHistory' },
             { 'title': 'Trim History',  'path': 'history/trimHistory'  },
@@ -575,6 +665,7 @@ class History:
 
         myDB = db.DBConnection()
         myDB.action("DELETE FROM history WHERE 1=1")
+        resource_versions.bump(resource_versions.HISTORY)
         ui.flash.message('History cleared')
         redirect("/history")
 
@@ -584,6 +675,7 @@ class History:
 
         myDB = db.DBConnection()
         myDB.action("DELETE FROM history WHERE date < "+str((datetime.datetime.today()-datetime.timedelta(days=30)).strftime(history.dateFormat)))
+        resource_versions.bump(resource_versions.HISTORY)
         ui.flash.message('Removed history entries greater than 30 days old')
         redirect("/history")
 
@@ -636,9 +728,9 @@ class ConfigGeneral:
 
     
     @cherrypy.expose
-    def saveGeneral(self, log_dir=None, web_port=None, web_log=None, web_ipv6=None,
+    def saveGeneral(self, log_dir=None, debug_logging=None, web_port=None, web_log=None, web_ipv6=None,
                     launch_browser=None, web_username=None,
-                    web_password=None, version_notify=None):
+                    web_password=None, version_notify=None, web_thread_pool=None, web_socket_queue=None):
 
         results = []
 
@@ -652,6 +744,11 @@ class ConfigGeneral:
         else:
             web_log = 0
 
+        if debug_logging == "on":
+            debug_logging = 1
+        else:
+            debug_logging = 0
+
         if launch_browser == "on":
             launch_browser = 1
         else:
@@ -667,12 +764,25 @@ class ConfigGeneral:
 
         sickbeard.LAUNCH_BROWSER = launch_browser
 
+        sickbeard.DEBUG_LOGGING = debug_logging
+        logger.setDebugLogging(debug_logging)
+
         sickbeard.WEB_PORT = int(web_port)
         sickbeard.WEB_IPV6 = web_ipv6
         sickbeard.WEB_LOG = web_log
         sickbeard.WEB_USERNAME = web_username
         sickbeard.WEB_PASSWORD = web_password
 
+        try:
+            sickbeard.WEB_THREAD_POOL = max(int(web_thread_pool), 1)
+        except (TypeError, ValueError):
+            results += ["Invalid number of web server threads, not changed."]
+
+        try:
+            sickbeard.WEB_SOCKET_QUEUE = max(int(web_socket_queue), 1)
+        except (TypeError, ValueError):
+            results += ["Invalid web server connection queue size, not changed."]
+
         config.change_VERSION_NOTIFY(version_notify)
 
         sickbeard.save_config()
@@ -700,7 +810,9 @@ class ConfigSearch:
     @cherrypy.expose
     def saveSearch(self, use_nzbs=None, use_torrents=None, nzb_dir=None, sab_username=None, sab_password=None,
                        sab_apikey=None, sab_category=None, sab_host=None, nzbget_password=None, nzbget_category=None, nzbget_host=None,
-                       torrent_dir=None, nzb_method=None, usenet_retention=None, search_frequency=None, download_propers=None):
+                       torrent_dir=None, nzb_method=None, usenet_retention=None, search_frequency=None, download_propers=None,
+                       backlog_mode=None, provider_requests_per_minute=None, provider_daily_budget=None, search_cache_ttl=None,
+                       newznab_batch_search=None):
 
         results = []
 
@@ -722,6 +834,11 @@ class ConfigSearch:
         else:
             use_nzbs = 0
 
+        if newznab_batch_search == "on":
+            newznab_batch_search = 1
+        else:
+            newznab_batch_search = 0
+
         if use_torrents == "on":
             use_torrents = 1
         else:
@@ -738,6 +855,22 @@ class ConfigSearch:
 
         sickbeard.DOWNLOAD_PROPERS = download_propers
 
+        sickbeard.NEWZNAB_BATCH_SEARCH = newznab_batch_search
+
+        if backlog_mode in (search_limits.BACKLOG_BURST, search_limits.BACKLOG_SPREAD):
+            sickbeard.BACKLOG_MODE = backlog_mode
+
+        try:
+            sickbeard.PROVIDER_REQUESTS_PER_MINUTE = max(int(provider_requests_per_minute), 0)
+            sickbeard.PROVIDER_DAILY_BUDGET = max(int(provider_daily_budget), 0)
+        except (TypeError, ValueError):
+            results += ["Provider limits must be whole numbers, limits not changed."]
+
+        try:
+            sickbeard.SEARCH_CACHE_TTL = max(int(search_cache_ttl), 0)
+        except (TypeError, ValueError):
+            results += ["Search cache time must be a whole number, not changed."]
+
         sickbeard.SAB_USERNAME = sab_username
         sickbeard.SAB_PASSWORD = sab_password
         sickbeard.SAB_APIKEY = sab_apikey.strip()
@@ -783,7 +916,7 @@ class ConfigPostProcessing:
                     naming_sep_type=None, naming_quality=None, naming_dates=None,
                     xbmc_data=None, mediabrowser_data=None, sony_ps3_data=None, wdtv_data=None, use_banner=None,
                     keep_processed_dir=None, process_automatically=None, rename_episodes=None,
-                    move_associated_files=None, tv_download_dir=None):
+                    move_associated_files=None, tv_download_dir=None, use_dir_watcher=None, use_hardlinks=None):
 
         results = []
 
@@ -840,8 +973,20 @@ class ConfigPostProcessing:
         else:
             move_associated_files = 0
 
+        if use_dir_watcher == "on":
+            use_dir_watcher = 1
+        else:
+            use_dir_watcher = 0
+
+        if use_hardlinks == "on":
+            use_hardlinks = 1
+        else:
+            use_hardlinks = 0
+
         sickbeard.PROCESS_AUTOMATICALLY = process_automatically
+        sickbeard.USE_DIR_WATCHER = use_dir_watcher
         sickbeard.KEEP_PROCESSED_DIR = keep_processed_dir
+        sickbeard.USE_HARDLINKS = use_hardlinks
         sickbeard.RENAME_EPISODES = rename_episodes
         sickbeard.MOVE_ASSOCIATED_FILES = move_associated_files
 
@@ -1746,12 +1891,14 @@ class ErrorLogs:
         t.submenu = ErrorLogsMenu
 
         minLevel = int(minLevel)
+        maxLines = int(maxLines)
 
-        data = []
-        if os.path.isfile(logger.logFile):
-            f = ek.ek(open, logger.logFile)
-            data = f.readlines()
-            f.close()
+        # recent messages come straight out of memory, the log file is only read if there aren't enough of them
+        records = logger.logBuffer.get(minLevel, limit=maxLines)
+        if len(records) >= maxLines:
+            t.logLines = u"".join([unicode(x) + u"\n" for x in records])
+            t.minLevel = minLevel
+            return _munge(t)
 
         regex =  "^(\w{3})\-(\d\d)\s*(\d\d)\:(\d\d):(\d\d)\s*([A-Z]+)\s*(.+?)\s*\:\:\s*(.*)$"
 
@@ -1759,11 +1906,12 @@ class ErrorLogs:
 
         numLines = 0
         lastLine = False
-        numToShow = min(maxLines, len(data))
+        numToShow = maxLines
 
-        for x in reversed(data):
+        # only as much of the log as is needed to fill the page gets read
+        for x in logger.readLogBackwards():
 
-            x = x.decode('utf-8')
+            x += "\n"
             match = re.match(regex, x)
 
             if match:
@@ -1794,6 +1942,26 @@ class ErrorLogs:
 
         return _munge(t)
 
+    @cherrypy.expose
+    def logRecords(self, minLevel=logger.DEBUG, thread=None, limit=100, after=None):
+        """
+        Returns the most recent log messages as JSON, newest first. Pass the highest id seen as after
+        to only get the messages logged since then.
+        """
+
+        try:
+            minLevel = int(minLevel)
+            limit = int(limit)
+            if after != None:
+                after = int(after)
+        except ValueError:
+            return json.dumps({'error': 'Invalid parameters'})
+
+        records = logger.logBuffer.get(minLevel, thread, limit, after)
+
+        cherrypy.response.headers['Content-Type'] = 'application/json'
+        return json.dumps([x.toDict() for x in records])
+
 
 class Home:
 
@@ -1802,8 +1970,13 @@ class Home:
 
         t = PageTemplate(file="home.tmpl")
         t.submenu = HomeMenu()
+        t.showListRows = page_cache.get('showListRows', [resource_versions.SHOWS, resource_versions.EPISODES], self._showListRows, sickbeard.WEB_ROOT)
         return _munge(t)
 
+    def _showListRows(self, webRoot):
+        # webRoot isn't used here but the rows link with it so it's part of the cache key
+        return unicode(PageTemplate(file="home_showListRows.tmpl"))
+
     addShows = NewHomeAddShows()
 
     postprocess = HomePostProcess()
@@ -1996,19 +2169,17 @@ class Home:
         t.sqlResults = sqlResults
         t.seasonResults = seasonResults
 
-        epCounts = {}
+        epCounts = episode_stats.overviewCounts(showObj)
         epCats = {}
-        epCounts[Overview.SKIPPED] = 0
-        epCounts[Overview.WANTED] = 0
-        epCounts[Overview.QUAL] = 0
-        epCounts[Overview.GOOD] = 0
-        epCounts[Overview.UNAIRED] = 0
 
-        for curResult in sqlResults:
+        # every episode with the same status is in the same category so only work each one out once
+        statusOverviews = episode_stats.statusOverviews(showObj)
 
-            curEpCat = showObj.getOverview(int(curResult["status"]))
-            epCats[str(curResult["season"])+"x"+str(curResult["episode"])] = curEpCat
-            epCounts[curEpCat] += 1
+        for curResult in sqlResults:
+            curStatus = int(curResult["status"])
+            if curStatus not in statusOverviews:
+                statusOverviews[curStatus] = showObj.getOverview(curStatus)
+            epCats[str(curResult["season"])+"x"+str(curResult["episode"])] = statusOverviews[curStatus]
 
         def titler(x):
             if not x:
@@ -2375,6 +2546,173 @@ class Home:
 
 
 
+class Api:
+    """
+    Read only JSON versions of the show, episode, queue and history data. Each response has an ETag
+    made from the versions of the data in it so clients polling with If-None-Match get a 304 without
+    anything being looked up again.
+    """
+
+    # the last response for each set of arguments, used as long as the data hasn't changed since
+    _responses = {}
+    _responsesLock = threading.Lock()
+    _maxResponses = 200
+
+    def _respond(self, name, args, resources, builder, extraTag=''):
+
+        etag = '"' + resource_versions.getTag(resources) + extraTag + '"'
+
+        cherrypy.response.headers['Content-Type'] = 'application/json'
+        cherrypy.response.headers['Cache-Control'] = 'no-cache'
+        cherrypy.response.headers['ETag'] = etag
+
+        # raises a 304 if the client already has this version
+        cherrypy.lib.cptools.validate_etags()
+
+        key = (name,) + tuple(args)
+
+        with Api._responsesLock:
+            if key in Api._responses and Api._responses[key][0] == etag:
+                return Api._responses[key][1]
+
+        body = json.dumps(builder())
+
+        with Api._responsesLock:
+            if len(Api._responses) >= Api._maxResponses:
+                Api._responses.clear()
+            Api._responses[key] = (etag, body)
+
+        return body
+
+    def _error(self, message):
+        cherrypy.response.headers['Content-Type'] = 'application/json'
+        return json.dumps({'error': message})
+
+    @cherrypy.expose
+    def shows(self):
+
+        def build():
+            showProgress = episode_stats.showProgress()
+
+            results = []
+            for curShow in sickbeard.showList:
+                downloaded, total = showProgress.get(curShow.tvdbid, (0, 0))
+                results.append({'tvdbid': curShow.tvdbid,
+                                'tvrid': curShow.tvrid,
+                                'name': curShow.name,
+                                'network': curShow.network,
+                                'status': curShow.status,
+                                'location': curShow._location,
+                                'quality': curShow.quality,
+                                'language': curShow.lang,
+                                'paused': bool(curShow.paused),
+                                'air_by_date': bool(curShow.air_by_date),
+                                'season_folders': bool(curShow.seasonfolders),
+                                'downloaded': downloaded,
+                                'total': total,
+                                })
+
+            return {'shows': sorted(results, key=operator.itemgetter('name'))}
+
+        # the episode counts only include what has aired so they change from day to day too
+        return self._respond('shows', [], [resource_versions.SHOWS, resource_versions.EPISODES], build,
+                             '-' + str(datetime.date.today().toordinal()))
+
+    @cherrypy.expose
+    def episodes(self, show=None):
+
+        try:
+            showObj = sickbeard.helpers.findCertainShow(sickbeard.showList, int(show))
+        except (TypeError, ValueError):
+            showObj = None
+
+        if showObj == None:
+            return self._error('Invalid show ID')
+
+        def build():
+            myDB = db.DBConnection()
+            sqlResults = myDB.select("SELECT season, episode, name, airdate, status, location FROM tv_episodes WHERE showid = ? ORDER BY season, episode", [showObj.tvdbid])
+
+            results = []
+            for curResult in sqlResults:
+                if int(curResult["airdate"]) > 1:
+                    airdate = datetime.date.fromordinal(int(curResult["airdate"])).isoformat()
+                else:
+                    airdate = None
+
+                status, quality = Quality.splitCompositeStatus(int(curResult["status"]))
+
+                results.append({'season': int(curResult["season"]),
+                                'episode': int(curResult["episode"]),
+                                'name': curResult["name"],
+                                'airdate': airdate,
+                                'status': statusStrings[status],
+                                'quality': Quality.qualityStrings[quality],
+                                'location': curResult["location"],
+                                })
+
+            return {'tvdbid': showObj.tvdbid, 'episodes': results}
+
+        return self._respond('episodes', [showObj.tvdbid], [resource_versions.episodesOf(showObj.tvdbid)], build)
+
+    @cherrypy.expose
+    def queue(self):
+
+        def queueItems(queueObj):
+            results = []
+            for curItem in [queueObj.currentItem] + queueObj.queue:
+                if curItem == None:
+                    continue
+                curShow = getattr(curItem, 'show', None)
+                results.append({'action': curItem.name,
+                                'show': getattr(curShow, 'tvdbid', None),
+                                'in_progress': curItem == queueObj.currentItem,
+                                'priority': curItem.priority,
+                                })
+            return results
+
+        def build():
+            return {'show_queue': queueItems(sickbeard.showQueueScheduler.action),
+                    'search_queue': queueItems(sickbeard.searchQueueScheduler.action),
+                    }
+
+        return self._respond('queue', [], [resource_versions.QUEUE, resource_versions.SHOWS], build)
+
+    @cherrypy.expose
+    def history(self, limit=None, before=None, show=None):
+
+        try:
+            limit = max(1, min(int(limit), 1000))
+        except (TypeError, ValueError):
+            limit = history.PAGE_SIZE
+
+        try:
+            showid = int(show)
+        except (TypeError, ValueError):
+            showid = None
+
+        def build():
+            sqlResults, nextKey = history.getHistory(limit=limit, before=before, showid=showid)
+
+            results = []
+            for curResult in sqlResults:
+                status, quality = Quality.splitCompositeStatus(int(curResult["action"]))
+                results.append({'date': datetime.datetime.strptime(str(curResult["date"]), history.dateFormat).isoformat(),
+                                'show': int(curResult["showid"]),
+                                'show_name': curResult["show_name"],
+                                'season': int(curResult["season"]),
+                                'episode': int(curResult["episode"]),
+                                'action': statusStrings[status],
+                                'quality': Quality.qualityStrings[quality],
+                                'resource': curResult["resource"],
+                                'provider': curResult["provider"],
+                                })
+
+            return {'history': results, 'before': nextKey}
+
+        return self._respond('history', [limit, before, showid], [resource_versions.HISTORY, resource_versions.SHOWS], build)
+
+
 class WebInterface:
 
     @cherrypy.expose
@@ -2383,7 +2721,7 @@ class WebInterface:
         redirect("/home")
 
     @cherrypy.expose
-    def showPoster(self, show=None, which=None):
+    def showPoster(self, show=None, which=None, v=None):
 
         if which == 'poster':
             default_image_name = 'poster.png'
@@ -2402,48 +2740,56 @@ class WebInterface:
         cache_obj = image_cache.ImageCache()
         
         if which == 'poster':
-            image_file_name = cache_obj.poster_path(showObj.tvdbid)
+            img_type = cache_obj.POSTER
         # this is for 'banner' but also the default case
         else:
-            image_file_name = cache_obj.banner_path(showObj.tvdbid)
+            img_type = cache_obj.BANNER
 
-        if ek.ek(os.path.isfile, image_file_name):
-            try:
-                from PIL import Image
-                from cStringIO import StringIO
-            except ImportError: # PIL isn't installed
-                return cherrypy.lib.static.serve_file(image_file_name, content_type="image/jpeg")
-            else:
-                im = Image.open(image_file_name)
-                if im.mode == 'P': # Convert GIFs to RGB
-                    im = im.convert('RGB')
-                if which == 'banner':
-                    size = 600, 112
-                elif which == 'poster':
-                    size = 136, 200
-                else:
-                    return cherrypy.lib.static.serve_file(image_file_name, content_type="image/jpeg")
-                im.thumbnail(size, Image.ANTIALIAS)
-                buffer = StringIO()
-                im.save(buffer, 'JPEG')
-                return buffer.getvalue()
-        else:
+        image_file_name = cache_obj.image_path(showObj.tvdbid, img_type)
+
+        if not ek.ek(os.path.isfile, image_file_name):
             return cherrypy.lib.static.serve_file(default_image_path, content_type="image/jpeg")
 
+        if which not in ('poster', 'banner'):
+            return cherrypy.lib.static.serve_file(image_file_name, content_type="image/jpeg")
+
+        # normally made when the image was cached, this only does anything the first time for older caches
+        thumbnail_file_name = cache_obj.make_thumbnail(showObj.tvdbid, img_type)
+
+        # PIL isn't installed or the image couldn't be read
+        if not thumbnail_file_name:
+            return cherrypy.lib.static.serve_file(image_file_name, content_type="image/jpeg")
+
+        # the thumbnail name has the image's mtime in it so it changes whenever the image does
+        cherrypy.response.headers['ETag'] = '"' + ek.ek(os.path.basename, thumbnail_file_name)[:-4] + '"'
+
+        # links with the current version in them can be cached forever, anything else has to be checked
+        if v != None and v == str(cache_obj.image_version(showObj.tvdbid, img_type)):
+            cherrypy.response.headers['Cache-Control'] = 'public, max-age=31536000'
+            cherrypy.response.headers['Expires'] = cherrypy.lib.httputil.HTTPDate(time.time() + 31536000)
+        else:
+            cherrypy.response.headers['Cache-Control'] = 'public, max-age=0, must-revalidate'
+
+        cherrypy.lib.cptools.validate_etags()
+
+        return cherrypy.lib.static.serve_file(thumbnail_file_name, content_type="image/jpeg")
+
     @cherrypy.expose
     def setComingEpsLayout(self, layout):
         if layout not in ('poster', 'banner', 'list'):
             layout = 'banner'
         
         sickbeard.COMING_EPS_LAYOUT = layout
-        
+        sickbeard.save_config_later()
+
         redirect("/comingEpisodes")
 
     @cherrypy.expose
     def toggleComingEpsDisplayPaused(self):
         
         sickbeard.COMING_EPS_DISPLAY_PAUSED = not sickbeard.COMING_EPS_DISPLAY_PAUSED
-        
+        sickbeard.save_config_later()
+
         redirect("/comingEpisodes")
 
     @cherrypy.expose
@@ -2452,41 +2798,18 @@ class WebInterface:
             sort = 'date'
         
         sickbeard.COMING_EPS_SORT = sort
-        
+        sickbeard.save_config_later()
+
         redirect("/comingEpisodes")
 
     @cherrypy.expose
     def comingEpisodes(self, layout="None"):
 
-        myDB = db.DBConnection()
-        
         today = datetime.date.today().toordinal()
         next_week = (datetime.date.today() + datetime.timedelta(days=7)).toordinal()
-        recently = (datetime.date.today() - datetime.timedelta(days=3)).toordinal()
-
-        done_show_list = []
-        qualList = Quality.DOWNLOADED + Quality.SNATCHED + [ARCHIVED, IGNORED]
-        sql_results = myDB.select("SELECT *, tv_shows.status as show_status FROM tv_episodes, tv_shows WHERE season != 0 AND airdate >= ? AND airdate < ? AND tv_shows.tvdb_id = tv_episodes.showid AND tv_episodes.status NOT IN ("+','.join(['?']*len(qualList))+")", [today, next_week] + qualList)
-        for cur_result in sql_results:
-            done_show_list.append(int(cur_result["showid"]))
-
-        more_sql_results = myDB.select("SELECT *, tv_shows.status as show_status FROM tv_episodes outer_eps, tv_shows WHERE season != 0 AND showid NOT IN ("+','.join(['?']*len(done_show_list))+") AND tv_shows.tvdb_id = outer_eps.showid AND airdate = (SELECT airdate FROM tv_episodes inner_eps WHERE inner_eps.showid = outer_eps.showid AND inner_eps.airdate >= ? ORDER BY inner_eps.airdate ASC LIMIT 1) AND outer_eps.status NOT IN ("+','.join(['?']*len(Quality.DOWNLOADED+Quality.SNATCHED))+")", done_show_list + [next_week] + Quality.DOWNLOADED + Quality.SNATCHED)
-        sql_results += more_sql_results
 
-        more_sql_results = myDB.select("SELECT *, tv_shows.status as show_status FROM tv_episodes, tv_shows WHERE season != 0 AND tv_shows.tvdb_id = tv_episodes.showid AND airdate < ? AND airdate >= ? AND tv_episodes.status = ? AND tv_episodes.status NOT IN ("+','.join(['?']*len(qualList))+")", [today, recently, WANTED] + qualList)
-        sql_results += more_sql_results
-
-        #epList = sickbeard.comingList
-
-        # sort by air date
-        sorts = {
-            'date': (lambda x, y: cmp(int(x["airdate"]), int(y["airdate"]))),
-            'show': (lambda a, b: cmp(a["show_name"], b["show_name"])),
-            'network': (lambda a, b: cmp(a["network"], b["network"])),
-        }
-
-        #epList.sort(sorts[sort])
-        sql_results.sort(sorts[sickbeard.COMING_EPS_SORT])
+        # comes back already sorted
+        sql_results = coming_episodes.getComingEpisodes(sickbeard.COMING_EPS_SORT)
 
         t = PageTemplate(file="comingEpisodes.tmpl")
         paused_item = { 'title': '', 'path': 'toggleComingEpsDisplayPaused' }
@@ -2528,3 +2851,5 @@ class WebInterface:
     browser = browser.WebFileBrowser()
 
     errorlogs = ErrorLogs()
+
+    api = Api()
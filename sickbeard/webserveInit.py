@@ -19,10 +19,29 @@
 import cherrypy
 import cherrypy.lib.auth_basic
 import os.path
+import time
 
 from sickbeard import logger
 from sickbeard.webserve import WebInterface
 
+# static files whose URLs have their version in them (see webserve.staticURL) can be cached this long
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+
+# everything text based is compressed, it's a big win for the larger pages over slow links
+GZIP_MIME_TYPES = ['text/html', 'text/plain', 'text/css', 'text/javascript',
+                   'application/javascript', 'application/x-javascript', 'application/json']
+
+def static_cache_headers():
+        """
+        Lets browsers keep versioned static files forever. Files requested without a version are
+        left with just the Last-Modified header like before.
+        """
+        if 'v' in cherrypy.request.params:
+                cherrypy.response.headers['Cache-Control'] = 'public, max-age=%d' % STATIC_MAX_AGE
+                cherrypy.response.headers['Expires'] = cherrypy.lib.httputil.HTTPDate(time.time() + STATIC_MAX_AGE)
+
+cherrypy.tools.static_cache = cherrypy.Tool('before_finalize', static_cache_headers)
+
 def initWebServer(options = {}):
         options.setdefault('port',      8081)
         options.setdefault('host',      '0.0.0.0')
@@ -30,6 +49,8 @@ def initWebServer(options = {}):
         options.setdefault('username',    '')
         options.setdefault('password',    '')
         options.setdefault('web_root',   '/')
+        options.setdefault('thread_pool', 20)
+        options.setdefault('socket_queue_size', 30)
         assert isinstance(options['port'], int)
         assert 'data_root' in options
 
@@ -37,6 +58,8 @@ def initWebServer(options = {}):
         cherrypy.config.update({
                 'server.socket_port': options['port'],
                 'server.socket_host': options['host'],
+                'server.thread_pool': options['thread_pool'],
+                'server.socket_queue_size': options['socket_queue_size'],
                 'log.screen':         False,
         })
 
@@ -61,18 +84,23 @@ def initWebServer(options = {}):
                                 'tools.staticdir.root': options['data_root'],
                                 'tools.encode.on': True,
                                 'tools.encode.encoding': 'utf-8',
+                                'tools.gzip.on': True,
+                                'tools.gzip.mime_types': GZIP_MIME_TYPES,
                         },
                         '/images': {
                                 'tools.staticdir.on':  True,
-                                'tools.staticdir.dir': 'images'
+                                'tools.staticdir.dir': 'images',
+                                'tools.static_cache.on': True
                         },
                         '/js':     {
                                 'tools.staticdir.on':  True,
-                                'tools.staticdir.dir': 'js'
+                                'tools.staticdir.dir': 'js',
+                                'tools.static_cache.on': True
                         },
                         '/css':    {
                                 'tools.staticdir.on':  True,
-                                'tools.staticdir.dir': 'css'
+                                'tools.staticdir.dir': 'css',
+                                'tools.static_cache.on': True
                         },
         }
         app = cherrypy.tree.mount(WebInterface(), options['web_root'], conf)
@@ -0,0 +1,123 @@
+import unittest
+
+import sys, os.path
+sys.path.append(os.path.abspath('..'))
+
+import resource
+import StringIO
+import tempfile
+import time
+
+import xml.etree.cElementTree as etree
+
+from sickbeard import nzbSplitter
+
+NZB_NS = 'http://www.newzbin.com/DTD/2003/nzb'
+
+def makeSeasonNZB(show='Show.Name', season=2, episodes=10, files=5, segments=20, extra_files=0):
+    """
+    Makes a season NZB like the ones posted for season packs: every episode has a few rar files,
+    each with a bunch of segments.
+    """
+
+    nzb = StringIO.StringIO()
+    nzb.write('<?xml version="1.0" encoding="iso-8859-1" ?>\n')
+    nzb.write('<nzb xmlns="'+NZB_NS+'">\n<head><meta type="title">'+show+'.S%02d.HDTV.XviD-GRP</meta></head>\n' % season)
+
+    subjects = []
+    for curEp in range(1, episodes+1):
+        for curFile in range(files):
+            subjects.append('%s.S%02dE%02d.HDTV.XviD-GRP [%d/%d] - "grp-%s-s%02de%02d.r%02d" yEnc (1/%d)' % (show, season, curEp, curFile+1, files, show.lower(), season, curEp, curFile, segments))
+    for curFile in range(extra_files):
+        subjects.append('%s.S%02d.HDTV.XviD-GRP - "grp-%s.nfo" yEnc (1/1)' % (show, season, show.lower()))
+
+    for (num, curSubject) in enumerate(subjects):
+        nzb.write('<file poster="poster@example.com" date="1300000000" subject="'+curSubject.replace('"', '&quot;')+'">\n')
+        nzb.write('<groups><group>alt.binaries.teevee</group></groups>\n<segments>\n')
+        for curSegment in range(segments):
+            nzb.write('<segment bytes="397000" number="%d">part%dof%d.%d.%d@example.com</segment>\n' % (curSegment+1, curSegment+1, segments, num, curSegment))
+        nzb.write('</segments>\n</file>\n')
+
+    nzb.write('</nzb>\n')
+
+    return nzb.getvalue()
+
+class NZBSplitterTests(unittest.TestCase):
+
+    def test_split(self):
+        data = makeSeasonNZB(episodes=3, files=4, segments=5, extra_files=2)
+        result = nzbSplitter.splitNZB('Show.Name.S02.HDTV.XviD-GRP', StringIO.StringIO(data), 2)
+
+        self.assertEqual(sorted(result.keys()), ['Show.Name.S02E01.HDTV.XviD-GRP', 'Show.Name.S02E02.HDTV.XviD-GRP', 'Show.Name.S02E03.HDTV.XviD-GRP'])
+
+        for (curName, curNZB) in result.items():
+            root = etree.XML(curNZB)
+            self.assertEqual(root.tag, '{'+NZB_NS+'}nzb')
+
+            files = root.findall('{'+NZB_NS+'}file')
+            self.assertEqual(len(files), 4)
+            for curFile in files:
+                self.assertTrue(curFile.get('subject').startswith(curName))
+                self.assertEqual(len(curFile.findall('{'+NZB_NS+'}segments/{'+NZB_NS+'}segment')), 5)
+
+    def test_want_episode(self):
+        data = makeSeasonNZB(episodes=4, files=2, segments=2)
+        asked = []
+
+        def wantEpisode(name):
+            asked.append(name)
+            return name.startswith('Show.Name.S02E02')
+
+        result = nzbSplitter.splitNZB('Show.Name.S02.HDTV.XviD-GRP', StringIO.StringIO(data), 2, wantEpisode)
+
+        self.assertEqual(result.keys(), ['Show.Name.S02E02.HDTV.XviD-GRP'])
+        self.assertEqual(len(asked), 4)
+
+    def test_no_namespace(self):
+        data = makeSeasonNZB(episodes=2, files=1, segments=1).replace(' xmlns="'+NZB_NS+'"', '')
+        result = nzbSplitter.splitNZB('Show.Name.S02.HDTV.XviD-GRP', StringIO.StringIO(data), 2)
+
+        self.assertEqual(len(result), 2)
+        self.assertEqual(etree.XML(result.values()[0]).tag, 'nzb')
+
+    def test_bad_name(self):
+        data = makeSeasonNZB(episodes=1, files=1, segments=1)
+        self.assertEqual(nzbSplitter.splitNZB('not a scene name', StringIO.StringIO(data), 2), {})
+
+    def test_bad_xml(self):
+        data = makeSeasonNZB(episodes=2, files=1, segments=1)
+        self.assertEqual(nzbSplitter.splitNZB('Show.Name.S02.HDTV.XviD-GRP', StringIO.StringIO(data[:-200]), 2), {})
+
+def benchmark(episodes=24, files=40, segments=250):
+    """
+    Splits a big synthetic season NZB and prints how long it took and how much memory it used,
+    then does the same for just parsing the whole thing into a tree.
+    """
+
+    nzbFile = tempfile.TemporaryFile()
+    nzbFile.write(makeSeasonNZB(episodes=episodes, files=files, segments=segments))
+    print "Season NZB: %d episodes, %d files, %.1f MB" % (episodes, episodes*files, nzbFile.tell() / 1048576.0)
+
+    def measure(description, func):
+        nzbFile.seek(0)
+        startMem = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        startTime = time.time()
+        func()
+        print "%s: %.2f seconds, peak memory grew by %d KB" % (description, time.time() - startTime, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - startMem)
+
+    # only the first episode is wanted, like when most of the season is already downloaded
+    measure("Split out one episode", lambda: nzbSplitter.splitNZB('Show.Name.S02.HDTV.XviD-GRP', nzbFile, 2, lambda x: 'E01' in x))
+    measure("Split out every episode", lambda: nzbSplitter.splitNZB('Show.Name.S02.HDTV.XviD-GRP', nzbFile, 2))
+    measure("Parse the whole tree", lambda: etree.parse(nzbFile))
+
+    nzbFile.close()
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        benchmark()
+    elif len(sys.argv) > 1:
+        suite = unittest.TestLoader().loadTestsFromName('nzb_splitter_tests.NZBSplitterTests.test_'+sys.argv[1])
+        unittest.TextTestRunner(verbosity=2).run(suite)
+    else:
+        suite = unittest.TestLoader().loadTestsFromTestCase(NZBSplitterTests)
+        unittest.TextTestRunner(verbosity=2).run(suite)
@@ -65,6 +65,7 @@ class SceneTests(unittest.TestCase):
         #common.sceneExceptions[-1] = ['Exception Test']
         myDB = db.DBConnection("cache.db")
         myDB.action("INSERT INTO scene_exceptions (tvdb_id, show_name) VALUES (?,?)", [-1, 'Exception Test'])
+        sceneHelpers.clear_exception_cache()
         common.countryList['Full Country Name'] = 'FCN'
         
         self._test_allPossibleShowNames('Show Name', expected=['Show Name'])
@@ -0,0 +1,138 @@
+import unittest
+
+import sys, os.path
+sys.path.append(os.path.abspath('..'))
+
+import random
+import time
+
+from sickbeard import search_selection
+from sickbeard.common import Quality
+
+class Episode:
+    def __init__(self, episode):
+        self.episode = episode
+
+class Result:
+    def __init__(self, name, episodes, quality=Quality.HDTV, size=-1):
+        self.name = name
+        self.episodes = [Episode(x) for x in episodes]
+        self.quality = quality
+        self.size = size
+
+class SearchSelectionTests(unittest.TestCase):
+
+    def _names(self, results):
+        return [x.name for x in search_selection.pickResults(results)]
+
+    def test_singles(self):
+        results = [Result('Show.S01E01.HDTV', [1], Quality.HDTV),
+                   Result('Show.S01E01.720p', [1], Quality.HDWEBDL),
+                   Result('Show.S01E02.HDTV', [2], Quality.HDTV),
+                   ]
+        self.assertEqual(self._names(results), ['Show.S01E01.720p', 'Show.S01E02.HDTV'])
+
+    def test_multi_covers_singles(self):
+        results = [Result('Show.S01E01', [1]),
+                   Result('Show.S01E02', [2]),
+                   Result('Show.S01E01E02', [1, 2]),
+                   Result('Show.S01E03', [3]),
+                   ]
+        self.assertEqual(self._names(results), ['Show.S01E01E02', 'Show.S01E03'])
+
+    def test_multi_worse_quality(self):
+        results = [Result('Show.S01E01.720p', [1], Quality.HDWEBDL),
+                   Result('Show.S01E02.720p', [2], Quality.HDWEBDL),
+                   Result('Show.S01E01E02', [1, 2], Quality.SDTV),
+                   ]
+        self.assertEqual(self._names(results), ['Show.S01E01.720p', 'Show.S01E02.720p'])
+
+    def test_multi_partly_better(self):
+        # the multi is only needed for the episode nothing else has at 720p
+        results = [Result('Show.S01E01.720p', [1], Quality.HDWEBDL),
+                   Result('Show.S01E01E02.720p', [1, 2], Quality.HDWEBDL),
+                   Result('Show.S01E02', [2], Quality.SDTV),
+                   ]
+        self.assertEqual(self._names(results), ['Show.S01E01E02.720p'])
+
+    def test_unknown_quality(self):
+        results = [Result('Show.S01E01.Unknown', [1], Quality.UNKNOWN),
+                   Result('Show.S01E01', [1], Quality.SDTV),
+                   ]
+        self.assertEqual(self._names(results), ['Show.S01E01'])
+
+    def test_no_overlap(self):
+        # singles are picked over a multi which would get an episode twice
+        results = [Result('Show.S01E01E02E03', [1, 2, 3]),
+                   Result('Show.S01E03E04', [3, 4]),
+                   Result('Show.S01E04', [4]),
+                   ]
+        self.assertEqual(self._names(results), ['Show.S01E01E02E03', 'Show.S01E04'])
+
+    def test_overlap_for_quality(self):
+        results = [Result('Show.S01E01E02', [1, 2], Quality.HDTV),
+                   Result('Show.S01E02E03.720p', [2, 3], Quality.HDWEBDL),
+                   ]
+        self.assertEqual(self._names(results), ['Show.S01E01E02', 'Show.S01E02E03.720p'])
+
+    def test_ties(self):
+        results = [Result('Show.S01E01.GRP', [1]),
+                   Result('Show.S01E01.INTERNAL', [1]),
+                   Result('Show.S01E01.PROPER', [1]),
+                   Result('Show.S01E02.big', [2], size=400000000),
+                   Result('Show.S01E02.small', [2], size=350000000),
+                   Result('Show.S01E03.first', [3]),
+                   Result('Show.S01E03.second', [3]),
+                   ]
+        self.assertEqual(self._names(results), ['Show.S01E01.PROPER', 'Show.S01E02.small', 'Show.S01E03.first'])
+
+    def test_deterministic(self):
+        rand = random.Random(1)
+        results = []
+        for i in range(200):
+            start = rand.randint(1, 24)
+            results.append(Result('Result.%d' % i, range(start, min(start + rand.randint(1, 3), 25)),
+                                  rand.choice((Quality.SDTV, Quality.HDTV, Quality.HDWEBDL)), rand.randint(-1, 1000)))
+
+        picked = search_selection.pickResults(results)
+        self.assertEqual([x.name for x in picked], self._names(results))
+
+        # every episode is there once, at the best quality anything had for it
+        bestQuality = {}
+        for curResult in results:
+            for curEp in curResult.episodes:
+                bestQuality[curEp.episode] = max(bestQuality.get(curEp.episode, 0), curResult.quality)
+
+        for curEp in bestQuality:
+            having = [x for x in picked if curEp in [y.episode for y in x.episodes]]
+            self.assertTrue(having)
+            self.assertEqual(max([x.quality for x in having]), bestQuality[curEp])
+
+    def test_empty(self):
+        self.assertEqual(search_selection.pickResults([]), [])
+
+def benchmark(num_results=500, num_episodes=26):
+    """
+    Times picking from a season's worth of overlapping single and multi-episode results.
+    """
+
+    rand = random.Random(0)
+    results = []
+    for i in range(num_results):
+        start = rand.randint(1, num_episodes)
+        results.append(Result('Result.%d' % i, range(start, min(start + rand.randint(1, 4), num_episodes + 1)),
+                              rand.choice((Quality.SDTV, Quality.HDTV, Quality.HDWEBDL, Quality.HDBLURAY)), rand.randint(-1, 2000000000)))
+
+    startTime = time.time()
+    picked = search_selection.pickResults(results)
+    print "Picked %d out of %d results in %.3f seconds" % (len(picked), num_results, time.time() - startTime)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        benchmark()
+    elif len(sys.argv) > 1:
+        suite = unittest.TestLoader().loadTestsFromName('search_selection_tests.SearchSelectionTests.test_'+sys.argv[1])
+        unittest.TextTestRunner(verbosity=2).run(suite)
+    else:
+        suite = unittest.TestLoader().loadTestsFromTestCase(SearchSelectionTests)
+        unittest.TextTestRunner(verbosity=2).run(suite)